@@ -0,0 +1,581 @@
+"""
+allocation_optimizer.py
+=======================
+Allocates DisasterBudgetEnvelope balances across all open disasters at
+once, instead of one disaster at a time by hand.
+Lesotho Disaster Management Authority.
+
+  1. Price : every open disaster is priced through the funding model in one
+             batch call. Optionally each price gets an interval from the
+             spread of the training targets in its leaf, and the plan can
+             be made against the upper bound.
+  2. Solve : maximise covered households (or weighted need in LSL) within
+             the envelope balances. A disaster draws on the envelopes of
+             its own type first, then on the strategic reserve.
+             With that structure the fractional relaxation is solved
+             exactly by a greedy pass in order of value per LSL. Each type's
+             own pool and the shared reserve are consumed through prefix
+             sums, so the whole pass is vectorised.
+  3. Round : coverage is rounded down to whole households, and the freed
+             money is spent greedily on further households in the same
+             order. The LP value is reported as an upper bound, so the
+             rounding gap is visible.
+  4. Explain: one row per disaster with its rank, price, value per LSL,
+             funding by source and the reason it stopped where it did. One
+             row per envelope with its drawdown and its pool's cut-off
+             value per LSL (what one more LSL in that pool would buy).
+
+Re-solves are warm-started. The priced incidents and their sort order are
+kept. A balance change only re-clips the prefix sums. A single incident
+change re-prices one row and moves it within the existing order.
+
+Inputs (mongoexport --jsonArray or JSON lines):
+  disasters.json : Disaster documents; closed ones are ignored
+  envelopes.json : DisasterBudgetEnvelope documents; only Approved, not voided
+
+Usage:
+  python allocation_optimizer.py solve disasters.json envelopes.json
+  python allocation_optimizer.py solve disasters.json envelopes.json \
+      --objective need --weights weights.json --price upper --csv plan.csv
+  python allocation_optimizer.py benchmark --incidents 5000 --envelopes 2000
+"""
+
+import sys
+import json
+import time
+import pickle
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from predict import load_district_profiles, build_feature_matrix
+from mongo_export import read_export, plain
+
+
+MODEL_PATH    = "disaster_model.pkl"
+ENCODERS_PATH = "disaster_encoders.pkl"
+
+# Disaster / envelope enums → model vocabulary
+DISASTER_TYPES = {"drought": "Drought", "heavy_rainfall": "Heavy Rainfall", "strong_winds": "Strong Winds"}
+SEVERITIES     = {"low": "Low", "medium": "Moderate", "high": "Critical"}
+RESERVE        = "strategic_reserve"
+POOLS          = list(DISASTER_TYPES) + [RESERVE]
+
+# Lesotho (southern hemisphere) seasons by month
+SEASONS = {12: "Summer", 1: "Summer", 2: "Summer", 3: "Autumn", 4: "Autumn", 5: "Autumn",
+           6: "Winter", 7: "Winter", 8: "Winter", 9: "Spring", 10: "Spring", 11: "Spring"}
+
+# householdDamageDetails[].damageLevel → model damage level
+DAMAGE_LEVELS        = {"partial": 2.0, "severe": 3.0, "destroyed": 4.0}
+DEFAULT_DAMAGE_LEVEL = 2.5
+
+INTERVAL_Z = 1.645   # two-sided 90% interval
+OBJECTIVES = ("households", "need")
+
+_DISTRICTS = {name.lower(): name for name in load_district_profiles()}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 1: INCIDENTS AND ENVELOPES
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _date(value):
+    value = plain(value)
+    if not value:
+        return None
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def incident_row(record, weights=None):
+    """
+    Maps one Disaster document to model inputs. Returns (row, None) or
+    (None, reason) when it cannot be priced.
+    """
+    disaster_type = DISASTER_TYPES.get(record.get("type"))
+    district      = _DISTRICTS.get(" ".join(str(record.get("district", "")).split()).lower().replace("’", "'"))
+    details       = record.get("householdDamageDetails") or []
+    households    = int(plain(record.get("numberOfHouseholdsAffected")) or
+                        plain(record.get("totalAffectedHouseholds")) or len(details))
+    when          = _date(record.get("occurrenceDate")) or _date(record.get("date"))
+
+    if disaster_type is None:
+        return None, f"unknown type {record.get('type')!r}"
+    if district is None:
+        return None, f"unknown district {record.get('district')!r}"
+    if households <= 0:
+        return None, "no affected households recorded"
+
+    levels = [DAMAGE_LEVELS[d["damageLevel"]] for d in details if d.get("damageLevel") in DAMAGE_LEVELS]
+    record_id = str(plain(record.get("_id")))
+    return {
+        "id":            record_id,
+        "title":         record.get("incidentTitle") or "",
+        "pool":          record["type"],
+        "disaster_type": disaster_type,
+        "district":      district,
+        "severity":      SEVERITIES.get(record.get("severity"), "Moderate"),
+        "season":        SEASONS[when.month] if when else "Winter",
+        "households":    households,
+        "damage_level":  float(np.mean(levels)) if levels else DEFAULT_DAMAGE_LEVEL,
+        "weight":        float((weights or {}).get(record_id, record.get("priorityWeight") or 1.0)),
+    }, None
+
+
+def load_incidents(path, weights=None):
+    rows, skipped = [], []
+    for record in read_export(path):
+        if record.get("status") == "closed":
+            continue
+        row, reason = incident_row(record, weights)
+        if row:
+            rows.append(row)
+        else:
+            skipped.append((str(plain(record.get("_id"))), reason))
+    return pd.DataFrame(rows), skipped
+
+
+def load_envelopes(path):
+    rows = []
+    for record in read_export(path):
+        if record.get("approvalStatus") != "Approved" or record.get("isVoided"):
+            continue
+        rows.append({
+            "id":          str(plain(record.get("_id"))),
+            "pool":        record["disasterType"],
+            "fiscal_year": record.get("fiscalYear", ""),
+            "balance":     max(0.0, float(plain(record.get("remainingAmount")) or 0.0)),
+        })
+    return pd.DataFrame(rows, columns=["id", "pool", "fiscal_year", "balance"])
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 2: BATCH PRICING
+# ─────────────────────────────────────────────────────────────────────────────
+
+def load_model(model_path=MODEL_PATH, encoders_path=ENCODERS_PATH):
+    with open(model_path, "rb") as f:
+        model = pickle.load(f)
+    with open(encoders_path, "rb") as f:
+        encoders = pickle.load(f)
+    return model, encoders
+
+
+def feature_matrix(incidents, encoders):
+    profiles = pd.DataFrame.from_dict(load_district_profiles(), orient="index").loc[incidents["district"]]
+    rows     = pd.concat([
+        incidents[["disaster_type", "severity", "season"]].reset_index(drop=True),
+        incidents[["households", "damage_level"]].set_axis(
+            ["num_households", "avg_damage_level"], axis=1).reset_index(drop=True),
+        profiles.reset_index(drop=True),
+    ], axis=1)
+    return build_feature_matrix(encoders, rows)
+
+
+def price_incidents(model, encoders, incidents, intervals=False):
+    """
+    One predict() call for all incidents. With intervals, the leaf variance
+    of a DecisionTreeRegressor (its MSE impurity) gives point ± z·sd.
+    Returns {"point", "lower", "upper"} arrays (lower/upper only with intervals).
+    """
+    X      = feature_matrix(incidents, encoders)
+    point  = np.maximum(0.0, model.predict(X))
+    prices = {"point": point}
+    if intervals:
+        if not hasattr(model, "tree_"):
+            raise ValueError("Intervals need a single DecisionTreeRegressor")
+        sd = np.sqrt(model.tree_.impurity[model.apply(X)])
+        prices["lower"] = np.maximum(0.0, point - INTERVAL_Z * sd)
+        prices["upper"] = point + INTERVAL_Z * sd
+    return prices
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 3: SOLVER
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _exclusive_cumsum(values):
+    out = np.zeros_like(values)
+    np.cumsum(values[:-1], out=out[1:])
+    return out
+
+
+class AllocationOptimizer:
+    """
+    Holds priced incidents in value-per-LSL order so re-solves after a
+    balance or single-incident change skip pricing and the full sort.
+    """
+
+    def __init__(self, incidents, cost, balances, objective="households"):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"objective must be one of {OBJECTIVES}")
+        self.objective  = objective
+        self.ids        = incidents["id"].to_numpy()
+        self.pool       = np.array([POOLS.index(p) for p in incidents["pool"]], dtype=np.int64)
+        self.households = incidents["households"].to_numpy(dtype=np.float64)
+        self.weight     = incidents["weight"].to_numpy(dtype=np.float64)
+        self.cost       = np.asarray(cost, dtype=np.float64).copy()
+        self.balances   = {pool: float(balances.get(pool, 0.0)) for pool in POOLS}
+        self.order      = np.argsort(-self.density(), kind="stable")
+
+    def density(self, rows=slice(None)):
+        """Objective value per LSL spent on each incident."""
+        cost  = np.maximum(self.cost[rows], 1.0)
+        value = self.weight[rows] * (self.households[rows] if self.objective == "households" else cost)
+        return value / cost
+
+    # --- warm-start updates ---------------------------------------------------
+
+    def set_balance(self, pool, amount):
+        self.balances[pool] = float(amount)
+
+    def update_incident(self, incident_id, cost=None, weight=None, households=None):
+        """Changes one incident and moves it to its new rank in the kept order."""
+        row = int(np.flatnonzero(self.ids == incident_id)[0])
+        if cost is not None:
+            self.cost[row] = cost
+        if weight is not None:
+            self.weight[row] = weight
+        if households is not None:
+            self.households[row] = households
+
+        rest    = self.order[self.order != row]
+        keys    = -self.density(rest)
+        at      = np.searchsorted(keys, -self.density(row), side="right")
+        self.order = np.insert(rest, at, row)
+
+    # --- solve ----------------------------------------------------------------
+
+    def relax(self):
+        """
+        Exact fractional optimum. In rank order each incident takes what is
+        left of its own type's pool, then what is left of the reserve.
+        Own-pool use never depends on the reserve, so both are prefix sums.
+        """
+        order = self.order
+        pool  = self.pool[order]
+        need  = self.cost[order]
+
+        own = np.zeros_like(need)
+        for p in range(len(POOLS) - 1):
+            rows = np.flatnonzero(pool == p)
+            before    = _exclusive_cumsum(need[rows])
+            own[rows] = np.clip(self.balances[POOLS[p]] - before, 0.0, need[rows])
+
+        overflow = need - own
+        reserve  = np.clip(self.balances[RESERVE] - _exclusive_cumsum(overflow), 0.0, overflow)
+
+        funded_own     = np.empty_like(own)
+        funded_reserve = np.empty_like(own)
+        funded_own[order], funded_reserve[order] = own, reserve
+        return funded_own, funded_reserve
+
+    def solve(self):
+        """Relaxation, then rounding to whole households. Returns a Solution."""
+        relaxed      = self.relax()
+        own, reserve = relaxed
+        lp_value     = float((self.density() * (own + reserve)).sum())
+
+        per_household = self.cost / np.maximum(self.households, 1.0)
+        covered       = np.floor((own + reserve) / np.maximum(per_household, 1e-9) + 1e-9)
+        covered       = np.minimum(covered, self.households)
+        spend         = covered * per_household
+
+        # Give back the fractional remainder: own pool first, then reserve
+        own     = np.minimum(own, spend)
+        reserve = spend - own
+        left    = {p: self.balances[POOLS[p]] - own[self.pool == p].sum() for p in range(len(POOLS) - 1)}
+        left_reserve = self.balances[RESERVE] - reserve.sum()
+
+        # Greedy fill: more whole households, in rank order
+        for row in self.order[covered[self.order] < self.households[self.order]]:
+            unit = per_household[row]
+            room = left[self.pool[row]] + left_reserve
+            if unit > room:
+                continue
+            extra = min(self.households[row] - covered[row], np.floor(room / unit))
+            take  = extra * unit
+            from_own = min(take, left[self.pool[row]])
+            left[self.pool[row]] -= from_own
+            left_reserve         -= take - from_own
+            own[row]     += from_own
+            reserve[row] += take - from_own
+            covered[row] += extra
+
+        return Solution(self, own, reserve, covered, relaxed, lp_value)
+
+
+class Solution:
+    def __init__(self, optimizer, own, reserve, covered, relaxed, lp_value):
+        self.optimizer = optimizer
+        self.relaxed   = relaxed
+        self.own       = own
+        self.reserve   = reserve
+        self.covered   = covered
+        self.lp_value  = lp_value
+        self.value     = float((optimizer.density() * (own + reserve)).sum())
+
+    def incident_table(self, incidents, prices=None):
+        opt     = self.optimizer
+        rank    = np.empty(len(opt.order), dtype=np.int64)
+        rank[opt.order] = np.arange(1, len(opt.order) + 1)
+        funded  = self.own + self.reserve
+        table   = pd.DataFrame({
+            "rank":            rank,
+            "id":              opt.ids,
+            "title":           incidents["title"].to_numpy(),
+            "district":        incidents["district"].to_numpy(),
+            "type":            incidents["disaster_type"].to_numpy(),
+            "severity":        incidents["severity"].to_numpy(),
+            "households":      opt.households.astype(np.int64),
+            "weight":          opt.weight,
+            "price":           opt.cost,
+            "value_per_lsl":   opt.density(),
+            "from_envelope":   self.own,
+            "from_reserve":    self.reserve,
+            "funded":          funded,
+            "households_covered": self.covered.astype(np.int64),
+            "coverage":        np.divide(funded, opt.cost, out=np.ones_like(funded), where=opt.cost > 0),
+        })
+        if prices is not None and "lower" in prices:
+            table.insert(9, "price_lower", prices["lower"])
+            table.insert(10, "price_upper", prices["upper"])
+        table["reason"] = [self._reason(row) for row in range(len(table))]
+        return table.sort_values("rank").reset_index(drop=True)
+
+    def _reason(self, row):
+        opt   = self.optimizer
+        pool  = POOLS[opt.pool[row]]
+        if self.covered[row] >= opt.households[row]:
+            sources = [name for name, amount in ((pool, self.own[row]), ("reserve", self.reserve[row])) if amount > 0]
+            return "fully funded from " + " + ".join(sources or [pool])
+        if opt.balances[pool] > 0:
+            state = f"{pool} envelope and strategic reserve used up by higher-ranked incidents"
+        else:
+            state = f"no approved {pool} envelope; strategic reserve used up by higher-ranked incidents"
+        if self.covered[row] > 0:
+            return f"partially funded: {state}"
+        return f"not funded: {state}"
+
+    def envelope_table(self, envelopes):
+        """Draws each pool down across its envelopes in fiscal-year order."""
+        opt    = self.optimizer
+        used   = {POOLS[p]: self.own[opt.pool == p].sum() for p in range(len(POOLS) - 1)}
+        used[RESERVE] = self.reserve.sum()
+        cutoff = self.cutoffs()
+
+        table = envelopes.sort_values(["pool", "fiscal_year", "id"]).reset_index(drop=True)
+        drawn = np.zeros(len(table))
+        for pool, rows in table.groupby("pool").indices.items():
+            balance     = table["balance"].to_numpy()[rows]
+            before      = _exclusive_cumsum(balance)
+            drawn[rows] = np.clip(used.get(pool, 0.0) - before, 0.0, balance)
+        table["drawn"]     = drawn
+        table["remaining"] = table["balance"] - drawn
+        table["cutoff_value_per_lsl"] = table["pool"].map(cutoff)
+        return table
+
+    def cutoffs(self):
+        """
+        Lowest value per LSL each pool funded in the relaxation, i.e. what
+        one more LSL in that pool is worth; 0 if the pool has money left.
+        """
+        opt, out = self.optimizer, {}
+        density  = opt.density()
+        own, reserve = self.relaxed
+        for p, pool in enumerate(POOLS):
+            drew  = reserve if pool == RESERVE else np.where(opt.pool == p, own, 0.0)
+            short = opt.balances[pool] - drew.sum() <= 1e-9 * max(1.0, opt.balances[pool])
+            out[pool] = float(density[drew > 0].min()) if short and (drew > 0).any() else 0.0
+        return out
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 4: REPORT
+# ─────────────────────────────────────────────────────────────────────────────
+
+def print_report(solution, incidents_table, envelope_table, objective, skipped=(), top=25):
+    print("=" * 62)
+    print(f"BUDGET ALLOCATION — maximise {'covered households' if objective == 'households' else 'weighted need'}")
+    print("=" * 62)
+
+    funded = incidents_table["funded"].sum()
+    print(f"\n  Incidents           : {len(incidents_table):,}  ({len(skipped)} could not be priced)")
+    print(f"  Requested (priced)  : LSL {incidents_table['price'].sum():,.0f}")
+    print(f"  Allocated           : LSL {funded:,.0f}")
+    print(f"  Households covered  : {incidents_table['households_covered'].sum():,} "
+          f"of {incidents_table['households'].sum():,}")
+    gap = 1 - solution.value / solution.lp_value if solution.lp_value else 0.0
+    print(f"  Objective           : {solution.value:,.1f}  (LP bound {solution.lp_value:,.1f}, gap {gap:.3%})\n")
+
+    print(f"  {'#':>4}  {'District':<14} {'Type':<14} {'Price (LSL)':>13}  {'Value/LSL':>10}  "
+          f"{'Funded':>13}  {'HH':>9}  Reason")
+    for r in incidents_table.head(top).itertuples():
+        print(f"  {r.rank:>4}  {r.district:<14} {r.type:<14} {r.price:>13,.0f}  {r.value_per_lsl:>10.2e}  "
+              f"{r.funded:>13,.0f}  {r.households_covered:>4}/{r.households:<4}  {r.reason}")
+    if len(incidents_table) > top:
+        print(f"  … {len(incidents_table) - top:,} more (use --csv for the full table)")
+
+    print(f"\n  {'Pool':<18} {'Balance (LSL)':>15}  {'Drawn (LSL)':>15}  {'Cut-off value/LSL':>18}")
+    for pool, rows in envelope_table.groupby("pool", sort=False):
+        print(f"  {pool:<18} {rows['balance'].sum():>15,.0f}  {rows['drawn'].sum():>15,.0f}  "
+              f"{rows['cutoff_value_per_lsl'].iloc[0]:>18.2e}")
+    for record_id, reason in skipped:
+        print(f"  skipped {record_id}: {reason}")
+    print()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 5: BENCHMARK
+# ─────────────────────────────────────────────────────────────────────────────
+
+def synthetic_problem(n_incidents, n_envelopes, encoders, seed=42):
+    rng       = np.random.default_rng(seed)
+    districts = list(load_district_profiles())
+    types     = list(DISASTER_TYPES)
+    incidents = pd.DataFrame({
+        "id":            [f"INC-{i:05d}" for i in range(n_incidents)],
+        "title":         "",
+        "pool":          rng.choice(types, n_incidents),
+        "district":      rng.choice(districts, n_incidents),
+        "severity":      rng.choice(list(SEVERITIES.values()), n_incidents),
+        "season":        rng.choice(sorted(set(SEASONS.values())), n_incidents),
+        "households":    rng.integers(10, 600, n_incidents),
+        "damage_level":  rng.uniform(1.0, 4.0, n_incidents).round(2),
+        "weight":        rng.choice([1.0, 1.5, 2.0], n_incidents),
+    })
+    incidents["disaster_type"] = incidents["pool"].map(DISASTER_TYPES)
+    envelopes = pd.DataFrame({
+        "id":          [f"ENV-{i:05d}" for i in range(n_envelopes)],
+        "pool":        rng.choice(POOLS, n_envelopes),
+        "fiscal_year": rng.choice(["2025/26", "2026/27"], n_envelopes),
+        "balance":     rng.uniform(1e5, 5e6, n_envelopes).round(-3),
+    })
+    return incidents, envelopes
+
+
+def lp_reference(optimizer):
+    """Same relaxation through scipy's HiGHS LP solver, for checking."""
+    from scipy.optimize import linprog
+    from scipy.sparse   import coo_matrix, vstack, hstack, identity
+
+    n       = len(optimizer.cost)
+    density = optimizer.density()
+    # Variables: own-pool LSL then reserve LSL per incident
+    c       = -np.concatenate([density, density])
+    pools   = coo_matrix((np.ones(n), (optimizer.pool, np.arange(n))), shape=(len(POOLS) - 1, n))
+    A       = vstack([
+        hstack([pools, coo_matrix((len(POOLS) - 1, n))]),
+        hstack([coo_matrix((1, n)), coo_matrix(np.ones((1, n)))]),
+        hstack([identity(n), identity(n)]),
+    ]).tocsr()
+    b = np.concatenate([[optimizer.balances[p] for p in POOLS], optimizer.cost])
+    result = linprog(c, A_ub=A, b_ub=b, bounds=(0, None), method="highs")
+    return -result.fun
+
+
+def run_benchmark(n_incidents, n_envelopes, objective="households"):
+    model, encoders = load_model()
+    incidents, envelopes = synthetic_problem(n_incidents, n_envelopes, encoders)
+    balances = envelopes.groupby("pool")["balance"].sum().to_dict()
+
+    t0 = time.perf_counter()
+    prices = price_incidents(model, encoders, incidents, intervals=True)
+    t1 = time.perf_counter()
+    # Budget for roughly half of the requested funding
+    scale    = 0.5 * prices["point"].sum() / sum(balances.values())
+    balances = {pool: amount * scale for pool, amount in balances.items()}
+    envelopes["balance"] *= scale
+
+    optimizer = AllocationOptimizer(incidents, prices["point"], balances, objective)
+    solution  = optimizer.solve()
+    t2 = time.perf_counter()
+    solution.incident_table(incidents, prices)
+    solution.envelope_table(envelopes)
+    t3 = time.perf_counter()
+
+    optimizer.set_balance("drought", balances["drought"] * 1.1)
+    optimizer.solve()
+    t4 = time.perf_counter()
+    changed = incidents["id"].iloc[n_incidents // 2]
+    row     = incidents.iloc[[n_incidents // 2]].assign(households=incidents["households"].iloc[n_incidents // 2] * 2)
+    optimizer.update_incident(changed, cost=price_incidents(model, encoders, row)["point"][0],
+                              households=row["households"].iloc[0])
+    warm = optimizer.solve()
+    t5 = time.perf_counter()
+
+    cold = AllocationOptimizer(incidents.assign(households=optimizer.households), optimizer.cost,
+                               optimizer.balances, objective).solve()
+    reference = lp_reference(optimizer)
+
+    print("=" * 62)
+    print(f"ALLOCATION OPTIMIZER BENCHMARK ({n_incidents:,} incidents, {n_envelopes:,} envelopes)")
+    print("=" * 62)
+    print(f"\n  Batch pricing (with intervals) : {t1 - t0:.3f}s")
+    print(f"  Cold solve                     : {t2 - t1:.3f}s")
+    print(f"  Explain tables                 : {t3 - t2:.3f}s")
+    print(f"  Warm re-solve, balance change  : {t4 - t3:.3f}s")
+    print(f"  Warm re-solve, incident change : {t5 - t4:.3f}s")
+    print(f"\n  LP bound (greedy)  : {warm.lp_value:,.3f}")
+    print(f"  LP bound (HiGHS)   : {reference:,.3f}")
+    print(f"  Rounded objective  : {warm.value:,.3f}  (gap {1 - warm.value / warm.lp_value:.4%})")
+    print(f"  Warm == cold       : {np.allclose(warm.own + warm.reserve, cold.own + cold.reserve)}\n")
+    return abs(warm.lp_value - reference) <= 1e-5 * max(1.0, reference)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COMMAND LINE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Budget-constrained allocation across open disasters")
+    sub    = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("solve")
+    p.add_argument("disasters")
+    p.add_argument("envelopes")
+    p.add_argument("--objective", choices=OBJECTIVES, default="households")
+    p.add_argument("--weights", help='JSON {"<disaster _id>": weight}; default priorityWeight or 1')
+    p.add_argument("--price", choices=("point", "lower", "upper"), default="point",
+                   help="Plan against the point estimate or an interval bound")
+    p.add_argument("--csv", help="Write the full incident table here")
+    p.add_argument("--top", type=int, default=25)
+
+    p = sub.add_parser("benchmark")
+    p.add_argument("--incidents", type=int, default=5000)
+    p.add_argument("--envelopes", type=int, default=2000)
+    p.add_argument("--objective", choices=OBJECTIVES, default="households")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "benchmark":
+        return 0 if run_benchmark(args.incidents, args.envelopes, args.objective) else 1
+
+    weights = None
+    if args.weights:
+        with open(args.weights) as f:
+            weights = json.load(f)
+    incidents, skipped = load_incidents(args.disasters, weights)
+    envelopes          = load_envelopes(args.envelopes)
+    if incidents.empty:
+        print("No open disasters could be priced.")
+        return 1
+
+    model, encoders = load_model()
+    prices    = price_incidents(model, encoders, incidents, intervals=args.price != "point")
+    balances  = envelopes.groupby("pool")["balance"].sum().to_dict()
+    optimizer = AllocationOptimizer(incidents, prices[args.price], balances, args.objective)
+    solution  = optimizer.solve()
+
+    incident_table = solution.incident_table(incidents, prices)
+    envelope_table = solution.envelope_table(envelopes)
+    print_report(solution, incident_table, envelope_table, args.objective, skipped, args.top)
+    if args.csv:
+        incident_table.to_csv(args.csv, index=False)
+        print(f"Saved {args.csv}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
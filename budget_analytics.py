@@ -0,0 +1,1158 @@
+"""
+budget_analytics.py
+===================
+Precomputed budget analytics for the financial endpoints, built from
+exports of the budget collections instead of per-request database queries.
+Lesotho Disaster Management Authority.
+
+getBudgetBreakdownByDisaster, getEnvelopeStatus, getAllocationBudgetImpact,
+getBudgetHealthAlerts and checkBudgetAvailability each recompute their
+totals with several round-trips and JS reductions on every request. This
+job loads mongoexports of
+
+  budgets                   national budget per fiscal year      (Budget)
+  budgetallocations         category budgets per disaster        (BudgetAllocation)
+  disasterbudgetenvelopes   envelopes per disaster type and year (DisasterBudgetEnvelope)
+  aid_allocation_requests   household allocations                (AidAllocationRequest)
+
+into columnar tables and computes with group-by aggregations
+
+  per disaster      : category breakdown, committed vs disbursed, utilization,
+                      burn rate, days to exhaustion, allocation status summary
+  per envelope      : utilization, burn rate over deductionHistory, days to exhaustion
+  per fiscal year   : national budget status, envelope totals, health alerts
+  per disaster type : the envelope and reserve headroom checkBudgetAvailability reads
+
+then atomically publishes budget_store/budget_snapshot.json, which
+GET /api/budgets/analytics/snapshot serves as is. Fields named after the JS
+responses reproduce them exactly, including totalSpent, which the helpers
+fix at 0 since the Expense model was removed; `verify` runs the helpers
+themselves on the same fixtures and compares.
+
+Budget records are not append-only (statuses change, envelopes are debited),
+so unlike district_features the store keeps one row per _id rather than
+running sums: an ingest parses only the records of the new export, upserts
+them by _id, and the group-bys rerun over the stored columns. Export just
+the changed records, e.g.
+  mongoexport -c aid_allocation_requests -q '{"updatedAt": {"$gt": {"$date": "<last>"}}}'
+with the last updatedAt per collection printed by `show`.
+
+Usage:
+  python budget_analytics.py ingest --requests requests.json --envelopes envelopes.json
+  python budget_analytics.py ingest --budgets b.json --allocations a.json --envelopes e.json --requests r.json
+  python budget_analytics.py rebuild --budgets b.json ...     # from an empty store
+  python budget_analytics.py show
+  python budget_analytics.py show --disaster <disasterId>
+  python budget_analytics.py verify                           # golden check against the JS helpers (needs node)
+  python budget_analytics.py benchmark
+"""
+
+import os
+import sys
+import copy
+import json
+import math
+import time
+import pickle
+import shutil
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from decimal import Decimal, ROUND_HALF_UP
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+import pandas as pd
+
+from mongo_export import plain
+from district_features import iter_chunks
+
+
+STORE_DIR        = "budget_store"
+TABLES_PATH      = os.path.join(STORE_DIR, "tables.pkl")
+SNAPSHOT_PATH    = os.path.join(STORE_DIR, "budget_snapshot.json")
+
+API_DIR          = Path(__file__).resolve().parent / "dmis-api"
+
+BURN_WINDOW_DAYS = 30
+COMMITTED        = ["Approved", "Disbursed"]      # trackAllocationBudgetImpact
+RESERVE          = "strategic_reserve"
+
+# getEnvelopeName in budgetDeductionUtils.js
+ENVELOPE_NAMES = {
+    "drought":           "Drought Envelope",
+    "heavy_rainfall":    "Heavy Rainfall Envelope",
+    "strong_winds":      "Strong Winds Envelope",
+    "strategic_reserve": "Strategic Reserve",
+}
+
+# column → (path in the exported document, kind)
+SPECS = {
+    "budgets": {
+        "fiscal_year":     (("fiscalYear",),                          "raw"),
+        "allocated":       (("allocatedBudget",),                     "num"),
+        "committed":       (("committedFunds",),                      "num"),
+        "spent":           (("spentFunds",),                          "num"),
+        "remaining":       (("remainingBudget",),                     "num"),
+        "updated_at":      (("updatedAt",),                           "date"),
+    },
+    "allocations": {
+        "disaster_id":     (("disasterId",),                          "str"),
+        "category":        (("category",),                            "str"),
+        "allocated":       (("allocatedAmount",),                     "num"),
+        "approval_status": (("approvalStatus",),                      "str"),
+        "voided":          (("isVoided",),                            "flag"),
+        "fiscal_year":     (("fiscalYear",),                          "str"),
+        "updated_at":      (("updatedAt",),                           "date"),
+    },
+    "envelopes": {
+        "disaster_type":   (("disasterType",),                        "str"),
+        "allocated":       (("allocatedAmount",),                     "num"),
+        "deducted":        (("amountDeducted",),                      "num"),
+        "remaining":       (("remainingAmount",),                     "num"),
+        "pct_remaining":   (("percentageRemaining",),                 "num"),
+        "reserve_used":    (("amountUsedFromReserve",),               "num"),
+        "approval_status": (("approvalStatus",),                      "str"),
+        "voided":          (("isVoided",),                            "flag"),
+        "fiscal_year":     (("fiscalYear",),                          "str"),
+        "updated_at":      (("updatedAt",),                           "date"),
+    },
+    "requests": {
+        "disaster_id":     (("disasterId",),                          "str"),
+        "status":          (("status",),                              "str"),
+        "estimated":       (("totalEstimatedCost",),                  "num"),
+        "disbursed":       (("disbursementData", "disbursedAmount"),  "num"),
+        "disbursed_date":  (("disbursementData", "disbursedDate"),    "date"),
+        "updated_at":      (("updatedAt",),                           "date"),
+    },
+}
+
+# Model each collection is read through in the API
+MODELS = {
+    "budgets":     "Budget",
+    "allocations": "BudgetAllocation",
+    "envelopes":   "DisasterBudgetEnvelope",
+    "requests":    "AidAllocationRequest",
+}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 1: EXPORT → COLUMNS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _get(record, path):
+    for key in path:
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return plain(record)
+
+
+def _number(value):
+    if isinstance(value, bool) or value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _dates(values):
+    """Extended JSON dates: ISO strings or {"$numberLong": epoch ms}."""
+    text = []
+    for v in values:
+        v = plain(v)
+        if isinstance(v, (int, float, str)) and not isinstance(v, bool) and str(v).lstrip("-").isdigit():
+            v = datetime.fromtimestamp(int(v) / 1000, timezone.utc).isoformat()
+        text.append(v if isinstance(v, str) else None)
+    return pd.to_datetime(pd.Series(text, dtype=object), utc=True, errors="coerce", format="ISO8601")
+
+
+def _column(values, kind):
+    if kind == "num":
+        return np.array([_number(v) for v in values], dtype=np.float64)
+    if kind == "flag":
+        # Mongo matches isVoided: false only where the field is stored as false
+        return np.array([{True: 1.0, False: 0.0}.get(v, np.nan) if isinstance(v, bool) else np.nan
+                         for v in values], dtype=np.float64)
+    if kind == "date":
+        return _dates(values).array
+    if kind == "str":
+        return np.array([None if v is None else str(v) for v in values], dtype=object)
+    return np.array(values, dtype=object)
+
+
+def records_to_frame(kind, records):
+    """
+    One chunk of an export as (table, deductions); deductions only for
+    envelopes, with the row of the envelope they came from.
+    """
+    columns = {"id": [str(plain(r.get("_id")) or "") for r in records]}
+    for name, (path, col_kind) in SPECS[kind].items():
+        columns[name] = _column([_get(r, path) for r in records], col_kind)
+    frame = pd.DataFrame(columns)
+
+    if kind != "envelopes":
+        return frame, None
+    rows = [(i, envelope_id, d.get("deductedAmount"), d.get("deductedDate"), d.get("fromReserve"))
+            for i, (envelope_id, r) in enumerate(zip(columns["id"], records))
+            for d in (r.get("deductionHistory") or []) if isinstance(d, dict)]
+    row, ids, amounts, dates, reserve = zip(*rows) if rows else ((), (), (), (), ())
+    deductions = pd.DataFrame({
+        "row":          np.array(row, dtype=np.int64),
+        "envelope_id":  np.array(ids, dtype=object),
+        "amount":       _column([plain(a) for a in amounts], "num"),
+        "date":         _column(dates, "date"),
+        "from_reserve": _column([plain(f) for f in reserve], "flag"),
+    })
+    return frame, deductions
+
+
+def empty_table(kind):
+    if kind == "deductions":
+        return records_to_frame("envelopes", [])[1].drop(columns="row")
+    frame, _ = records_to_frame(kind, [])
+    return frame.assign(seq=np.empty(0, dtype=np.int64))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 2: COLUMNAR STORE
+# ─────────────────────────────────────────────────────────────────────────────
+
+class BudgetStore:
+    """
+    One row per document and collection, in first-seen order (the natural
+    order findOne walks). A re-exported document replaces its row in place.
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root          = root
+        self.tables_path   = os.path.join(root, os.path.basename(TABLES_PATH))
+        self.snapshot_path = os.path.join(root, os.path.basename(SNAPSHOT_PATH))
+
+        self.tables = {}
+        if os.path.exists(self.tables_path):
+            with open(self.tables_path, "rb") as f:
+                self.tables = pickle.load(f)
+        for kind in [*SPECS, "deductions"]:
+            self.tables.setdefault(kind, empty_table(kind))
+
+    def ingest(self, kind, path):
+        """Upserts the documents of an export; returns (added, updated)."""
+        added = updated = 0
+        for chunk in iter_chunks(path):
+            frame, deductions = records_to_frame(kind, chunk)
+            a, u   = self._upsert(kind, frame, deductions)
+            added   += a
+            updated += u
+        return added, updated
+
+    def _upsert(self, kind, frame, deductions=None):
+        current = self.tables[kind]
+        # A document exported twice in one batch keeps its last version
+        last    = ~((frame["id"] != "") & frame["id"].duplicated(keep="last")).to_numpy()
+        frame   = frame[last].reset_index(drop=True)
+
+        keyed   = current[current["id"] != ""]
+        pos     = pd.Index(keyed["id"]).get_indexer(frame["id"])
+        pos[(frame["id"] == "").to_numpy()] = -1
+        seen    = pos >= 0
+        start   = int(current["seq"].max()) + 1 if len(current) else 0
+        seq     = np.where(seen, keyed["seq"].to_numpy()[np.maximum(pos, 0)] if len(keyed) else 0,
+                           start + np.cumsum(~seen) - 1)
+        frame   = frame.assign(seq=seq.astype(np.int64))
+
+        kept    = current[~current["id"].isin(frame.loc[seen, "id"])]
+        self.tables[kind] = pd.concat([kept, frame], ignore_index=True).sort_values("seq", kind="stable") \
+                              .reset_index(drop=True)
+
+        if deductions is not None:
+            deductions = deductions[last[deductions.pop("row").to_numpy()]]
+            old        = self.tables["deductions"]
+            old        = old[~old["envelope_id"].isin(frame["id"])]
+            self.tables["deductions"] = pd.concat([old, deductions], ignore_index=True)
+        return int((~seen).sum()), int(seen.sum())
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.tables_path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(self.tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.tables_path)
+
+    def publish(self, as_of=None):
+        previous = load_snapshot(self.snapshot_path)
+        snapshot = {
+            "version": (previous["version"] if previous else 0) + 1,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **build_snapshot(self.tables, as_of),
+        }
+        os.makedirs(self.root, exist_ok=True)
+        # Atomic swap so the API never reads a half-written snapshot
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, self.snapshot_path)
+        return snapshot
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 3: JS VALUE SEMANTICS
+# The snapshot reproduces the helpers' responses byte for byte, so numbers in
+# messages follow String(number) and toFixed, and NaN/Infinity become null as
+# under JSON.stringify.
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _num(value):
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+def _pct(part, whole):
+    """(part / whole) * 100 as JS computes and serialises it."""
+    return None if whole == 0 else _num(part / whole * 100)
+
+
+def _key(value):
+    """A group key as JSON: pandas holds a missing string as NaN."""
+    return None if value is None or (isinstance(value, float) and math.isnan(value)) else value
+
+
+def _or0(value):
+    """`value || 0`."""
+    return 0 if value is None or (isinstance(value, float) and (math.isnan(value) or value == 0)) else value
+
+
+def js_string(value):
+    """String(value) for a JS number (ECMAScript Number::toString)."""
+    if isinstance(value, str):
+        return value
+    if value is None:
+        return "undefined"
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "Infinity" if value > 0 else "-Infinity"
+    if value == 0:
+        return "0"
+    sign             = "-" if value < 0 else ""
+    _, digits, exp   = Decimal(repr(abs(value))).normalize().as_tuple()
+    digits           = "".join(map(str, digits))
+    k, n             = len(digits), exp + len(digits)
+    if k <= n <= 21:
+        return sign + digits + "0" * (n - k)
+    if 0 < n <= 21:
+        return sign + digits[:n] + "." + digits[n:]
+    if -6 < n <= 0:
+        return sign + "0." + "0" * -n + digits
+    e = f"e{'+' if n - 1 > 0 else '-'}{abs(n - 1)}"
+    return sign + (digits if k == 1 else digits[0] + "." + digits[1:]) + e
+
+
+def to_fixed(value, places=1):
+    """Number.prototype.toFixed: exact value, ties away from zero."""
+    if abs(value) >= 1e21:
+        return js_string(value)
+    value = abs(value) if value == 0 else value          # (-0).toFixed(1) is "0.0"
+    return str(Decimal(value).quantize(Decimal(1).scaleb(-places), ROUND_HALF_UP))
+
+
+def envelope_name(disaster_type):
+    return ENVELOPE_NAMES.get(disaster_type, "Unknown Envelope")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 4: GROUP-BY AGGREGATIONS → SNAPSHOT
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _window(dates, as_of):
+    start = as_of - pd.Timedelta(days=BURN_WINDOW_DAYS)
+    return ((dates > start) & (dates <= as_of)).to_numpy()
+
+
+def _exhaustion(remaining, burn_rate):
+    return _num(remaining / burn_rate) if burn_rate > 0 else None
+
+
+def _approved(frame):
+    return frame[(frame["approval_status"] == "Approved") & (frame["voided"] == 0.0)]
+
+
+def disaster_rollup(allocations, requests, as_of):
+    approved   = _approved(allocations).dropna(subset=["disaster_id"])
+    # $group then a stable $sort on the sum: categories in first-seen order on ties
+    categories = (approved.groupby(["disaster_id", "category"], sort=False, dropna=False)["allocated"]
+                          .agg(["sum", "size"]).reset_index()
+                          .sort_values("sum", ascending=False, kind="stable"))
+    totals     = approved.groupby("disaster_id")["allocated"].sum()
+
+    requests   = requests.dropna(subset=["disaster_id"])
+    estimated  = requests["estimated"].fillna(0.0)
+    is_paid    = (requests["status"] == "Disbursed").to_numpy()
+    paid       = requests["disbursed"].fillna(requests["estimated"]).fillna(0.0).where(is_paid, 0.0)
+    in_window  = is_paid & _window(requests["disbursed_date"], as_of)
+    per_req    = pd.DataFrame({
+        "disaster_id": requests["disaster_id"],
+        "committed":   estimated.where(requests["status"].isin(COMMITTED), 0.0),
+        "disbursed":   paid,
+        "recent":      paid.where(in_window, 0.0),
+    }).groupby("disaster_id").sum()
+    statuses   = (requests.groupby(["disaster_id", "status"], dropna=False)["estimated"]
+                          .agg(["size", "sum"]).reset_index()
+                          .sort_values(["disaster_id", "status"], na_position="first"))
+
+    by_category = {d: g for d, g in categories.groupby("disaster_id", sort=False)}
+    by_status   = {d: g for d, g in statuses.groupby("disaster_id", sort=False)}
+
+    out = {}
+    for disaster_id in sorted(set(totals.index) | set(per_req.index)):
+        total     = float(totals.get(disaster_id, 0.0))
+        sums      = per_req.loc[disaster_id] if disaster_id in per_req.index else None
+        committed = float(sums["committed"]) if sums is not None else 0.0
+        disbursed = float(sums["disbursed"]) if sums is not None else 0.0
+        burn_rate = float(sums["recent"]) / BURN_WINDOW_DAYS if sums is not None else 0.0
+        rows      = by_category.get(disaster_id, categories.iloc[:0])
+        status    = ("CRITICAL" if committed > total * 0.9 else
+                     "WARNING"  if committed > total * 0.7 else "HEALTHY")
+
+        out[disaster_id] = {
+            # GET /budgets/:disasterId/breakdown
+            "breakdown": {
+                "breakdown": [{
+                    "category":        _key(category),
+                    "allocatedAmount": _num(amount),
+                    "totalSpent":      0,
+                    "remainingAmount": _num(amount),
+                    "percentageUsed":  _pct(0, amount),
+                } for category, amount in zip(rows["category"], rows["sum"])],
+                "totalAllocated":  total,
+                "totalSpent":      0,
+                "percentageUsed":  _pct(0, total),
+                "remainingBudget": total,
+            },
+            # GET /allocation-budget-impact/:disasterId
+            "budgetImpact": {
+                "totalBudget":              total,
+                "totalCommitted":           committed,
+                "totalSpent":               0,
+                "remainingUncommitted":     total - committed,
+                "remainingAfterAllocation": total - committed,
+                "projectedOverrun":         max(0.0, committed - total),
+                "budgetHealthStatus":       status,
+            },
+            "allocationSummary": [{
+                "_id":         _key(s),
+                "count":       int(n),
+                "totalAmount": _num(amount),
+            } for s, n, amount in zip(*(by_status[disaster_id][c] for c in ("status", "size", "sum")))]
+              if disaster_id in by_status else [],
+            "committed":        committed,
+            "disbursed":        disbursed,
+            "uncommitted":      total - committed,
+            "utilization":      _pct(committed, total),
+            "disbursementRate": _pct(disbursed, committed),
+            "burnRate":         burn_rate,
+            "daysToExhaustion": _exhaustion(total - disbursed, burn_rate),
+        }
+    return out
+
+
+def envelope_rollup(envelopes, deductions, as_of):
+    eligible = _approved(envelopes)
+    recent   = deductions[_window(deductions["date"], as_of)]
+    burn     = recent.groupby("envelope_id")["amount"].sum() / BURN_WINDOW_DAYS
+
+    out = {}
+    for row in eligible.itertuples(index=False):
+        burn_rate = float(burn.get(row.id, 0.0))
+        out[row.id] = {
+            "disasterType":          _key(row.disaster_type),
+            "envelopeName":          envelope_name(row.disaster_type),
+            "fiscalYear":            _key(row.fiscal_year),
+            "allocatedAmount":       _num(row.allocated),
+            "amountDeducted":        _num(row.deducted),
+            "remainingAmount":       _num(row.remaining),
+            "percentageRemaining":   _num(row.pct_remaining),
+            "amountUsedFromReserve": _num(row.reserve_used),
+            "utilization":           _pct(row.deducted, row.allocated),
+            "burnRate":              burn_rate,
+            "daysToExhaustion":      _exhaustion(row.remaining, burn_rate),
+        }
+    return out, burn
+
+
+def health_alerts(envelopes):
+    """getBudgetHealthAlerts over the approved envelopes of one fiscal year."""
+    alerts = []
+    for row in envelopes.itertuples(index=False):
+        pct = row.pct_remaining
+        if not pct <= 20:
+            continue
+        level = "critical" if pct <= 10 else "warning"
+        icon  = "🔴 CRITICAL" if pct <= 10 else "🟡 WARNING"
+        alerts.append({
+            "type":         level,
+            "message":      f"{icon}: {envelope_name(row.disaster_type)} is at {to_fixed(pct)}% remaining "
+                            f"(M{js_string(row.remaining)} of M{js_string(row.allocated)})",
+            "envelopeType": _key(row.disaster_type),
+            "percentage":   _num(pct),
+        })
+
+    reserve = envelopes[envelopes["disaster_type"] == RESERVE].head(1)
+    for row in reserve.itertuples(index=False):
+        if row.deducted > 0:
+            alerts.append({
+                "type":         "reserve",
+                "message":      f"🟠 Strategic Reserve has been used — M{js_string(row.remaining)} remaining in "
+                                f"reserve. Amount used: M{js_string(row.deducted)}",
+                "envelopeType": RESERVE,
+                "percentage":   _num(row.pct_remaining),
+                "amountUsed":   _num(row.deducted),
+            })
+    return alerts
+
+
+def fiscal_year_key(value):
+    """`item.fiscalYear?.toString() || 'unknown'`."""
+    return (js_string(value) if _key(value) is not None else "") or "unknown"
+
+
+def fiscal_year_rollup(budgets, allocations, envelopes, envelope_burn):
+    # GET /budgets/envelope-status/all: later documents overwrite earlier keys
+    status = {}
+    for row in budgets.itertuples(index=False):
+        status[fiscal_year_key(row.fiscal_year)] = {
+            "fiscalYear":      _key(row.fiscal_year),
+            "allocatedBudget": _or0(row.allocated),
+            "committedFunds":  _or0(row.committed),
+            "spentFunds":      _or0(row.spent),
+            "remainingBudget": _or0(row.remaining),
+        }
+
+    eligible   = _approved(envelopes)
+    burn       = eligible["id"].map(envelope_burn).fillna(0.0)
+    sums       = eligible.assign(burn=burn).groupby("fiscal_year")[
+                     ["allocated", "deducted", "remaining", "reserve_used", "burn"]].sum()
+    counts     = eligible.groupby("fiscal_year").size()
+    categories = _approved(allocations).groupby("fiscal_year")["allocated"].sum()
+    per_year   = {y: g for y, g in eligible.groupby("fiscal_year", sort=False)}
+
+    out = {}
+    for year in sorted(set(sums.index) | set(categories.index) | set(status)):
+        s         = sums.loc[year] if year in sums.index else pd.Series(0.0, index=sums.columns)
+        burn_rate = float(s["burn"])
+        out[year] = {
+            "envelopes":           int(counts.get(year, 0)),
+            "allocated":           float(s["allocated"]),
+            "deducted":            float(s["deducted"]),
+            "remaining":           float(s["remaining"]),
+            "usedFromReserve":     float(s["reserve_used"]),
+            "utilization":         _pct(s["deducted"], s["allocated"]),
+            "burnRate":            burn_rate,
+            "daysToExhaustion":    _exhaustion(s["remaining"], burn_rate),
+            "categoryBudgets":     float(categories.get(year, 0.0)),
+            "nationalBudget":      status.get(year),
+            "alerts":              health_alerts(per_year.get(year, eligible.iloc[:0])),
+        }
+    return out, status
+
+
+def availability_rollup(envelopes):
+    """The envelope findOne({disasterType, Approved, not voided}) returns, per type."""
+    first = _approved(envelopes).drop_duplicates("disaster_type", keep="first")
+    return {row.disaster_type: {
+        "envelopeId":      row.id,
+        "allocatedAmount": _num(row.allocated),
+        "remainingAmount": _num(row.remaining),
+    } for row in first.itertuples(index=False)}
+
+
+def build_snapshot(tables, as_of=None):
+    as_of   = pd.Timestamp(as_of or datetime.now(timezone.utc))
+    as_of   = as_of.tz_localize("UTC") if as_of.tzinfo is None else as_of.tz_convert("UTC")
+    sources = {kind: {
+        "documents":    int(len(tables[kind])),
+        "last_updated": (tables[kind]["updated_at"].max().isoformat()
+                         if tables[kind]["updated_at"].notna().any() else None),
+    } for kind in SPECS}
+
+    envelopes, burn = envelope_rollup(tables["envelopes"], tables["deductions"], as_of)
+    years, status   = fiscal_year_rollup(tables["budgets"], tables["allocations"], tables["envelopes"], burn)
+    return {
+        "as_of":            as_of.isoformat(),
+        "burn_window_days": BURN_WINDOW_DAYS,
+        "sources":          sources,
+        "disasters":        disaster_rollup(tables["allocations"], tables["requests"], as_of),
+        "envelopes":        envelopes,
+        "fiscalYears":      years,
+        "envelopeStatus":   status,
+        "availability":     availability_rollup(tables["envelopes"]),
+    }
+
+
+def check_availability(snapshot, disaster_type, amount):
+    """checkBudgetAvailability for a disaster of this type, from the snapshot."""
+    envelope = snapshot["availability"].get(disaster_type)
+    name     = envelope_name(disaster_type)
+    if envelope is None:
+        return {"available": False, "message": f"No approved budget envelope found for {name}",
+                "disasterType": disaster_type}
+
+    remaining = envelope["remainingAmount"]
+    if remaining >= amount:
+        return {
+            "available":      True,
+            "source":         "envelope",
+            "envelopeId":     envelope["envelopeId"],
+            "envelopeName":   name,
+            "envelopeAmount": envelope["allocatedAmount"],
+            "remaining":      remaining,
+            "needed":         amount,
+            "message":        f"Sufficient funds in {name}: M{js_string(remaining)} available",
+        }
+
+    reserve = snapshot["availability"].get(RESERVE)
+    if reserve and reserve["remainingAmount"] >= amount:
+        return {
+            "available":          "partial",
+            "source":             "reserve",
+            "envelopeId":         envelope["envelopeId"],
+            "envelopeName":       name,
+            "reserveId":          reserve["envelopeId"],
+            "envelopeAmount":     envelope["allocatedAmount"],
+            "envelopeRemaining":  remaining,
+            "reserveAmount":      reserve["allocatedAmount"],
+            "reserveRemaining":   reserve["remainingAmount"],
+            "needed":             amount,
+            "shortfall":          amount - remaining,
+            "message":            f"Insufficient funds in {name}. M{js_string(remaining)} remaining. Strategic "
+                                  f"Reserve has M{js_string(reserve['remainingAmount'])} available. Use reserve?",
+        }
+
+    in_reserve = _or0(reserve["remainingAmount"]) if reserve else 0
+    return {
+        "available":         False,
+        "source":            "none",
+        "envelopeRemaining": _or0(remaining),
+        "reserveRemaining":  in_reserve,
+        "needed":            amount,
+        "message":           f"Insufficient funds. {name} has M{js_string(remaining)}, Strategic Reserve has "
+                             f"M{js_string(in_reserve)}. Total needed: M{js_string(amount)}.",
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 5: REPORT
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _money(value):
+    return "—" if value is None else f"M{value:,.0f}"
+
+
+def print_snapshot(snapshot, disaster_id=None):
+    print(f"\n  Version {snapshot['version']} ({snapshot['created']}, as of {snapshot['as_of']})\n")
+    for kind, source in snapshot["sources"].items():
+        print(f"  {kind:<12} {source['documents']:>9,} documents   last updatedAt {source['last_updated'] or '—'}")
+
+    if disaster_id:
+        entry = snapshot["disasters"].get(disaster_id)
+        if entry is None:
+            print(f"\n  No budgets or allocations for disaster {disaster_id}.\n")
+            return
+        b = entry["budgetImpact"]
+        print(f"\n  Disaster {disaster_id}: {b['budgetHealthStatus']}")
+        print(f"    budget {_money(b['totalBudget'])}, committed {_money(entry['committed'])}, "
+              f"disbursed {_money(entry['disbursed'])}")
+        for row in entry["breakdown"]["breakdown"]:
+            print(f"    {str(row['category']):<12} {_money(row['allocatedAmount']):>14}")
+        for row in entry["allocationSummary"]:
+            print(f"    {str(row['_id']):<18} {row['count']:>6,} requests {_money(row['totalAmount']):>14}")
+        print()
+        return
+
+    print(f"\n  {'Fiscal year':<12} {'Envelopes':>10} {'Allocated':>15} {'Remaining':>15} {'Used':>7} "
+          f"{'Burn/day':>11} {'Alerts':>7}")
+    for year, row in snapshot["fiscalYears"].items():
+        used = "—" if row["utilization"] is None else f"{row['utilization']:.1f}%"
+        print(f"  {year:<12} {row['envelopes']:>10} {_money(row['allocated']):>15} {_money(row['remaining']):>15} "
+              f"{used:>7} {_money(row['burnRate']):>11} {len(row['alerts']):>7}")
+
+    health = pd.Series([d["budgetImpact"]["budgetHealthStatus"] for d in snapshot["disasters"].values()])
+    print(f"\n  {len(snapshot['disasters']):,} disasters: "
+          + ", ".join(f"{n} {s}" for s, n in health.value_counts().items()))
+    print()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 6: SYNTHETIC EXPORTS (fixtures and benchmark)
+# ─────────────────────────────────────────────────────────────────────────────
+
+AS_OF         = datetime(2026, 6, 30, tzinfo=timezone.utc)
+FISCAL_YEARS  = ["2024", "2025", "2026"]
+DISASTER_KEYS = ["drought", "heavy_rainfall", "strong_winds"]
+CATEGORIES    = ["Shelter", "Food", "Water", "Health", "Livelihood", "Education", "Other"]
+STATUSES      = ["Proposed", "Pending Approval", "Approved", "Rejected", "Disbursed", "Voided"]
+
+
+def _oid(prefix, i):
+    return {"$oid": f"{prefix}{i:022x}"}
+
+
+def _date(moment):
+    return {"$date": moment.isoformat(timespec="milliseconds").replace("+00:00", "Z")}
+
+
+def synthetic_exports(n_requests=3000, n_allocations=400, n_disasters=40, seed=42):
+    """mongoexport-shaped documents for every collection, plus the disasters."""
+    rng       = np.random.default_rng(seed)
+    money     = lambda lo, hi: round(float(rng.uniform(lo, hi)), 2)
+    recent    = lambda days: AS_OF - timedelta(minutes=int(rng.integers(1, days * 1440)))
+
+    disasters = [{"_id": _oid("d1", i), "type": DISASTER_KEYS[i % 3]} for i in range(n_disasters)]
+    budgeted  = disasters[:-1]              # the last disaster only has allocation requests
+
+    budgets = [{
+        "_id":             _oid("b1", i),
+        "fiscalYear":      int(year),
+        "allocatedBudget": money(5e7, 9e7),
+        "committedFunds":  money(1e7, 3e7),
+        "spentFunds":      money(1e6, 1e7),
+        "remainingBudget": money(1e7, 5e7),
+        "updatedAt":       _date(recent(400)),
+    } for i, year in enumerate(FISCAL_YEARS)]
+    del budgets[-1]["committedFunds"]       # schema default, absent from older documents
+
+    allocations = [{
+        "_id":             _oid("a1", i),
+        "disasterId":      budgeted[int(rng.integers(len(budgeted)))]["_id"],
+        "category":        CATEGORIES[int(rng.integers(len(CATEGORIES)))],
+        "allocatedAmount": money(5e3, 5e5),
+        "approvalStatus":  str(rng.choice(["Approved", "Pending", "Rejected"], p=[0.75, 0.15, 0.10])),
+        "isVoided":        bool(rng.random() < 0.08),
+        "fiscalYear":      FISCAL_YEARS[int(rng.integers(3))],
+        "updatedAt":       _date(recent(400)),
+    } for i in range(n_allocations)]
+
+    envelopes, i = [], 0
+    for year in FISCAL_YEARS:
+        for disaster_type in DISASTER_KEYS + [RESERVE]:
+            allocated = money(2e6, 2e7)
+            target    = allocated * float(rng.choice([0.0, 0.3, 0.6, 0.82, 0.87, 0.93, 0.97]))
+            if disaster_type == RESERVE and year == FISCAL_YEARS[-1]:
+                target = 0.0
+            k         = int(rng.integers(1, 12))
+            pieces    = [round(float(p), 2) for p in rng.dirichlet(np.ones(k)) * target] if target else []
+            deducted  = 0
+            for p in pieces:
+                deducted += p                 # JS accumulates one deduction at a time
+            remaining = allocated - deducted
+            envelopes.append({
+                "_id":                   _oid("e1", i),
+                "disasterType":          disaster_type,
+                "allocatedAmount":       allocated,
+                "amountDeducted":        deducted,
+                "remainingAmount":       remaining,
+                "percentageRemaining":   remaining / allocated * 100,
+                "amountUsedFromReserve": money(0, 5e5) if disaster_type != RESERVE else 0,
+                "approvalStatus":        "Approved" if rng.random() > 0.1 else "Pending",
+                "isVoided":              False,
+                "fiscalYear":            year,
+                "deductionHistory":      [{
+                    "deductedAmount": p,
+                    "deductedDate":   _date(recent(90)),
+                    "fromReserve":    disaster_type == RESERVE,
+                } for p in pieces],
+                "updatedAt":             _date(recent(400)),
+            })
+            i += 1
+
+    requests = []
+    for i in range(n_requests):
+        status  = str(rng.choice(STATUSES, p=[0.15, 0.15, 0.25, 0.1, 0.3, 0.05]))
+        cost    = money(500, 20_000)
+        request = {
+            "_id":                _oid("r1", i),
+            "disasterId":         disasters[int(rng.integers(n_disasters))]["_id"],
+            "status":             status,
+            "totalEstimatedCost": cost,
+            "updatedAt":          _date(recent(400)),
+        }
+        if status == "Disbursed":
+            request["disbursementData"] = {
+                "disbursedAmount": cost if rng.random() > 0.2 else money(500, cost),
+                "disbursedDate":   _date(recent(90)),
+            }
+        requests.append(request)
+
+    return {"budgets": budgets, "allocations": allocations, "envelopes": envelopes,
+            "requests": requests}, disasters
+
+
+def earlier_version(kind, document):
+    """The same document as it stood before its last update."""
+    document = copy.deepcopy(document)
+    if kind == "requests":
+        document["status"] = "Pending Approval"
+        document.pop("disbursementData", None)
+        document["totalEstimatedCost"] = round(document["totalEstimatedCost"] * 0.9, 2)
+    elif kind == "allocations":
+        document["approvalStatus"] = "Pending"
+    elif kind == "envelopes" and document["deductionHistory"]:
+        last = document["deductionHistory"].pop()
+        document["amountDeducted"]      -= last["deductedAmount"]
+        document["remainingAmount"]     += last["deductedAmount"]
+        document["percentageRemaining"]  = document["remainingAmount"] / document["allocatedAmount"] * 100
+    elif kind == "budgets":
+        document["spentFunds"] = 0
+    return document
+
+
+def mongoose_document(document):
+    """Extended JSON → the plain values Mongoose hands the helpers."""
+    if isinstance(document, dict):
+        if len(document) == 1 and next(iter(document)).startswith("$"):
+            return mongoose_document(next(iter(document.values())))
+        return {k: mongoose_document(v) for k, v in document.items()}
+    if isinstance(document, list):
+        return [mongoose_document(v) for v in document]
+    return document
+
+
+def _write_exports(directory, exports, lines=False):
+    paths = {}
+    for kind, documents in exports.items():
+        paths[kind] = os.path.join(directory, f"{kind}.json")
+        with open(paths[kind], "w") as f:
+            if lines:
+                f.writelines(json.dumps(d) + "\n" for d in documents)
+            else:
+                json.dump(documents, f)
+    return paths
+
+
+def _build(root, batches, as_of=AS_OF):
+    store = BudgetStore(root)
+    for i, exports in enumerate(batches):
+        with tempfile.TemporaryDirectory() as tmp:
+            for kind, path in _write_exports(tmp, exports, lines=i % 2 == 1).items():
+                store.ingest(kind, path)
+    store.save()
+    return store.publish(as_of)
+
+
+def run_benchmark(n_requests, repeats=3):
+    exports, _ = synthetic_exports(n_requests=n_requests, n_allocations=n_requests // 8,
+                                   n_disasters=max(40, n_requests // 500))
+    fresh      = max(1, n_requests // 100)
+    history    = {k: v[:-fresh] if k == "requests" else v for k, v in exports.items()}
+    batch      = {"requests": exports["requests"][-fresh:]}
+
+    print("=" * 62)
+    print(f"BUDGET ANALYTICS BENCHMARK ({n_requests:,} allocation requests)")
+    print("=" * 62 + "\n")
+
+    full, step, snap = [], [], []
+    for _ in range(repeats):
+        with tempfile.TemporaryDirectory() as root:
+            start = time.perf_counter()
+            _build(root, [history])
+            full.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            _build(root, [batch])
+            step.append(time.perf_counter() - start)
+
+            store = BudgetStore(root)
+            start = time.perf_counter()
+            build_snapshot(store.tables, AS_OF)
+            snap.append(time.perf_counter() - start)
+
+    print(f"  {'full ingest + snapshot':<34} {min(full):>8.3f}s")
+    print(f"  {f'append {fresh:,} requests + snapshot':<34} {min(step):>8.3f}s")
+    print(f"  {'group-bys alone':<34} {min(snap):>8.3f}s")
+    print()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 7: GOLDEN CHECK AGAINST THE JAVASCRIPT
+# The controller and both helper modules are copied verbatim into a scratch
+# tree whose models/ and mongoose are an in-memory stand-in answering the
+# handful of queries they make (find, findOne, findById, aggregate with
+# $match/$group/$sort) from the fixtures, then run by node.
+# ─────────────────────────────────────────────────────────────────────────────
+
+JS_SOURCES = ["controllers/financialController.js", "utils/financialUtils.js", "utils/budgetDeductionUtils.js"]
+JS_MODELS  = ["Budget", "BudgetAllocation", "DisasterBudgetEnvelope", "AidAllocationRequest", "Disaster",
+              "AuditLog", "Expense"]
+
+STORE_JS = """
+import { readFileSync } from 'fs';
+
+const fixtures = JSON.parse(readFileSync(process.argv[2], 'utf8'));
+const same     = (value, cond) => String(value) === String(cond);
+const field    = (doc, ref) => (typeof ref === 'string' && ref.startsWith('$') ? doc[ref.slice(1)] : ref);
+
+function matches(doc, filter) {
+  return Object.entries(filter).every(([key, cond]) =>
+    cond && typeof cond === 'object' && '$in' in cond
+      ? cond.$in.some((c) => same(doc[key], c))
+      : same(doc[key], cond));
+}
+
+function aggregate(docs, pipeline) {
+  for (const stage of pipeline) {
+    if (stage.$match) {
+      docs = docs.filter((d) => matches(d, stage.$match));
+    } else if (stage.$group) {
+      const { _id, ...sums } = stage.$group;
+      const groups = new Map();
+      for (const d of docs) {
+        const key = field(d, _id) ?? null;
+        if (!groups.has(key)) groups.set(key, { _id: key, ...Object.fromEntries(Object.keys(sums).map((n) => [n, 0])) });
+        const group = groups.get(key);
+        for (const [name, op] of Object.entries(sums)) {
+          const v = field(d, op.$sum);
+          if (typeof v === 'number') group[name] += v;
+        }
+      }
+      docs = [...groups.values()];
+    } else if (stage.$sort) {
+      const [[key, dir]] = Object.entries(stage.$sort);
+      docs = [...docs].sort((a, b) => (a[key] < b[key] ? -dir : a[key] > b[key] ? dir : 0));
+    }
+  }
+  return docs;
+}
+
+export function model(name) {
+  const docs = () => fixtures[name] || [];
+  return {
+    find: (filter = {}) => Object.assign(docs().filter((d) => matches(d, filter)), { lean() { return this; } }),
+    findOne: async (filter = {}) => docs().find((d) => matches(d, filter)) || null,
+    findById: async (id) => docs().find((d) => same(d._id, id)) || null,
+    aggregate: async (pipeline) => aggregate(docs(), pipeline),
+  };
+}
+"""
+
+MONGOOSE_JS = """
+class ObjectId { constructor(id) { this.id = String(id); } toString() { return this.id; } toJSON() { return this.id; } }
+export default { Types: { ObjectId } };
+"""
+
+HARNESS = """
+import { readFileSync } from 'fs';
+import controller from './controllers/financialController.js';
+import { getBudgetHealthAlerts, checkBudgetAvailability } from './utils/budgetDeductionUtils.js';
+
+const { disasters, fiscalYears, amounts } = JSON.parse(readFileSync(process.argv[3], 'utf8'));
+
+async function call(handler, params) {
+  let body;
+  const res = { status() { return res; }, json(b) { body = b; return res; } };
+  await handler({ params, query: {}, headers: {} }, res);
+  return body;
+}
+
+const out = { disasters: {}, alerts: {}, availability: {} };
+for (const id of disasters) {
+  out.disasters[id] = {
+    breakdown: await call(controller.getBudgetBreakdownByDisaster, { disasterId: id }),
+    impact:    await call(controller.getAllocationBudgetImpact, { disasterId: id }),
+  };
+  out.availability[id] = [];
+  for (const amount of amounts) out.availability[id].push(await checkBudgetAvailability(id, amount));
+}
+out.envelopeStatus = await call(controller.getEnvelopeStatus, {});
+for (const year of fiscalYears) out.alerts[year] = await getBudgetHealthAlerts(year);
+console.log(JSON.stringify(out));
+"""
+
+
+def run_js_reference(exports, disasters, amounts):
+    fixtures = {MODELS[kind]: mongoose_document(documents) for kind, documents in exports.items()}
+    fixtures["Disaster"] = mongoose_document(disasters)
+    query    = {
+        "disasters":   [d["_id"] for d in fixtures["Disaster"]],
+        "fiscalYears": FISCAL_YEARS + ["1999"],
+        "amounts":     amounts,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for source in JS_SOURCES:
+            (tmp / source).parent.mkdir(exist_ok=True)
+            shutil.copy(API_DIR / source, tmp / source)
+        (tmp / "models").mkdir()
+        for name in JS_MODELS:
+            (tmp / "models" / f"{name}.js").write_text(
+                f"import {{ model }} from '../store.js';\nexport default model('{name}');\n", encoding="utf-8")
+        (tmp / "node_modules" / "mongoose").mkdir(parents=True)
+        (tmp / "node_modules" / "mongoose" / "package.json").write_text(
+            '{"name": "mongoose", "type": "module", "main": "index.js"}', encoding="utf-8")
+        (tmp / "node_modules" / "mongoose" / "index.js").write_text(MONGOOSE_JS, encoding="utf-8")
+        (tmp / "package.json").write_text('{"type": "module"}', encoding="utf-8")
+        (tmp / "store.js").write_text(STORE_JS, encoding="utf-8")
+        (tmp / "harness.js").write_text(HARNESS, encoding="utf-8")
+        (tmp / "fixtures.json").write_text(json.dumps(fixtures), encoding="utf-8")
+        (tmp / "query.json").write_text(json.dumps(query), encoding="utf-8")
+
+        out = subprocess.run(["node", str(tmp / "harness.js"), str(tmp / "fixtures.json"), str(tmp / "query.json")],
+                             capture_output=True, text=True, check=True)
+    return json.loads(out.stdout), query
+
+
+def _same(a, b):
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(map(_same, a, b))
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        # $sum and reduce add in document order, pandas groupby sums compensated
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+    return a == b
+
+
+def _strip(snapshot):
+    return {k: v for k, v in snapshot.items() if k not in ("version", "created")}
+
+
+def verify(exports, disasters):
+    """Returns the number of mismatches between the snapshot and the JS."""
+    rng     = np.random.default_rng(7)
+    amounts = [1.0, 25_000.0, 750_000.0, 3_000_000.0, 12_500_000.55, 40_000_000.0]
+
+    # Two incremental batches: the second appends new documents and updates
+    # a fifth of the first batch's, which must land where a one-shot build does
+    first, second = {}, {}
+    for kind, documents in exports.items():
+        half    = len(documents) // 2
+        updated = set(rng.choice(half, size=max(1, half // 5), replace=False).tolist()) if half else set()
+        first[kind]  = [earlier_version(kind, d) if i in updated else d for i, d in enumerate(documents[:half])]
+        second[kind] = documents[half:] + [documents[i] for i in sorted(updated)]
+
+    with tempfile.TemporaryDirectory() as a, tempfile.TemporaryDirectory() as b:
+        incremental = _build(a, [first, second])
+        one_shot    = _build(b, [exports])
+
+    print("=" * 62)
+    print(f"GOLDEN CHECK vs JAVASCRIPT ({sum(map(len, exports.values())):,} documents)")
+    print("=" * 62 + "\n")
+
+    failures = 0 if _same(_strip(incremental), _strip(one_shot)) else 1
+    print(f"  {'incremental = rebuild':<26} {'ok' if not failures else 'MISMATCH'}")
+
+    reference, query = run_js_reference(exports, disasters, amounts)
+    types            = {str(plain(d["_id"])): d["type"] for d in disasters}
+    empty            = {"breakdown": {"breakdown": [], "totalAllocated": 0, "totalSpent": 0,
+                                      "percentageUsed": None, "remainingBudget": 0}}
+
+    checks = {
+        "breakdown":         [(d, reference["disasters"][d]["breakdown"],
+                               incremental["disasters"].get(d, empty)["breakdown"])
+                              for d in query["disasters"]],
+        "budgetImpact":      [(d, reference["disasters"][d]["impact"]["budgetImpact"],
+                               incremental["disasters"][d]["budgetImpact"]) for d in query["disasters"]],
+        "allocationSummary": [(d, reference["disasters"][d]["impact"]["allocationSummary"],
+                               incremental["disasters"][d]["allocationSummary"]) for d in query["disasters"]],
+        "envelopeStatus":    [("all", reference["envelopeStatus"], incremental["envelopeStatus"])],
+        "healthAlerts":      [(y, reference["alerts"][y],
+                               {"alerts": incremental["fiscalYears"][y]["alerts"]
+                                if y in incremental["fiscalYears"] else []})
+                              for y in query["fiscalYears"]],
+        "availability":      [(f"{d} M{amount:,.0f}", reference["availability"][d][i],
+                               check_availability(incremental, types[d], amount))
+                              for d in query["disasters"] for i, amount in enumerate(amounts)],
+    }
+    for name, cases in checks.items():
+        bad = [(key, js, py) for key, js, py in cases if not _same(js, py)]
+        failures += len(bad)
+        print(f"  {name:<26} {'ok' if not bad else f'{len(bad)} mismatches'} ({len(cases):,} cases)")
+        for key, js, py in bad[:3]:
+            print(f"      {key}:\n        js={json.dumps(js)[:300]}\n        py={json.dumps(py)[:300]}")
+
+    alerts  = sum(len(r["alerts"]) for r in reference["alerts"].values())
+    sources = pd.Series([r["source"] for rows in reference["availability"].values() for r in rows if "source" in r])
+    print(f"\n  covered: {alerts} health alerts, availability sources "
+          + ", ".join(f"{s}={n}" for s, n in sources.value_counts().items()))
+    print()
+    return failures
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COMMAND LINE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precomputed budget analytics from financial exports")
+    sub    = parser.add_subparsers(dest="command", required=True)
+    for name in ("ingest", "rebuild"):
+        p = sub.add_parser(name)
+        p.add_argument("--budgets",     help="Export of budgets")
+        p.add_argument("--allocations", help="Export of budgetallocations")
+        p.add_argument("--envelopes",   help="Export of disasterbudgetenvelopes")
+        p.add_argument("--requests",    help="Export of aid_allocation_requests")
+        p.add_argument("--as-of",       help="Burn-rate reference time (default now)")
+        p.add_argument("--store", default=STORE_DIR)
+    p = sub.add_parser("show")
+    p.add_argument("--disaster")
+    p.add_argument("--store", default=STORE_DIR)
+    p = sub.add_parser("verify", help="Golden check against the JavaScript helpers")
+    p.add_argument("--requests", type=int, default=3000)
+    p = sub.add_parser("benchmark")
+    p.add_argument("--requests", type=int, default=200_000)
+    args = parser.parse_args(argv)
+
+    if args.command == "verify":
+        exports, disasters = synthetic_exports(n_requests=args.requests)
+        return 1 if verify(exports, disasters) else 0
+    if args.command == "benchmark":
+        run_benchmark(args.requests)
+        return 0
+
+    print("=" * 62)
+    print("BUDGET ANALYTICS SNAPSHOT")
+    print("=" * 62)
+
+    if args.command == "show":
+        snapshot = load_snapshot(os.path.join(args.store, os.path.basename(SNAPSHOT_PATH)))
+        if snapshot is None:
+            print("\n  No snapshot published yet.\n")
+            return 1
+        print_snapshot(snapshot, args.disaster)
+        return 0
+
+    exports = {kind: getattr(args, kind) for kind in SPECS if getattr(args, kind)}
+    if not exports:
+        parser.error("give at least one of --budgets, --allocations, --envelopes, --requests")
+    if args.command == "rebuild":
+        path = os.path.join(args.store, os.path.basename(TABLES_PATH))
+        if os.path.exists(path):
+            os.remove(path)
+
+    store = BudgetStore(args.store)
+    print()
+    start = time.perf_counter()
+    for kind, path in exports.items():
+        added, updated = store.ingest(kind, path)
+        print(f"  {kind:<12} {added:>9,} new  {updated:>9,} updated   ({os.path.basename(path)})")
+    store.save()
+    snapshot = store.publish(args.as_of)
+    print(f"\n  Snapshot built in {time.perf_counter() - start:.2f}s")
+    print_snapshot(snapshot)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
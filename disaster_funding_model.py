@@ -22,12 +22,49 @@ Evaluation metrics (as recommended for regression problems):
 Output files:
   - disaster_model.pkl     (trained Decision Tree model)
   - disaster_encoders.pkl  (encoders + feature column order for predict.py)
+  - drift_reference.json   (training bin edges and counts for drift_sketch.py)
+  - disaster_explanations.json (per-leaf rule text returned with each estimate)
+  - training_report.json   (run report: metrics, importances, timings)
+
+Stage cache:
+  Each training stage (load → features → depth_search → holdout →
+  importance → refit → save) is cached in .stage_cache/ under a hash of
+  its input data, parameters and code. Re-running with nothing changed
+  reuses every cached stage; changing a setting recomputes only the
+  stages downstream of it.
+
+    python disaster_funding_model.py                      # reuse cache
+    python disaster_funding_model.py --from-stage holdout # recompute holdout onward
+    python disaster_funding_model.py --force              # recompute everything
+
+Duplicate collapse:
+  With --collapse-duplicates, identical feature rows are fit as one row
+  weighted by their count with their mean target. For squared error the
+  split gains are unchanged, so the tree is the same while every fit in
+  the depth search, holdout and refit handles only the unique rows.
+  Folds and the holdout split are drawn over the original rows first.
+
+    python disaster_funding_model.py --collapse-duplicates
+    python disaster_funding_model.py --collapse-benchmark 500000
 """
 
+import os
+import json
+import time
 import pickle
+import hashlib
+import inspect
+import argparse
+import contextlib
+import io
 import numpy as np
 import pandas as pd
 
+from concurrent.futures import ProcessPoolExecutor
+
+from drift_sketch      import build_reference, save_reference, REFERENCE_PATH
+from tree_explanations import build_explanations, save_explanations, EXPLANATIONS_PATH
+
 from sklearn.tree            import DecisionTreeRegressor, export_text
 from sklearn.preprocessing   import LabelEncoder
 from sklearn.model_selection import train_test_split, KFold, cross_val_score
@@ -50,6 +87,53 @@ def load_data(filepath="disaster_dataset.csv"):
 # SECTION 2: PREPARE FEATURES
 # ─────────────────────────────────────────────────────────────────────────────
 
+# Feature order must exactly match predict.py
+FEATURE_COLUMNS = [
+    "disaster_type_enc",
+    "severity_enc",
+    "season_enc",
+    "num_households",
+    "avg_damage_level",
+    "pct_elderly",
+    "pct_children_u5",
+    "pct_disabled",
+    "avg_household_size",
+]
+
+
+def build_encoders():
+    """
+    Builds the label encoders saved alongside the model.
+    Fit on all known categories — ensures stability at prediction time.
+    """
+    le_disaster_type = LabelEncoder()
+    le_severity      = LabelEncoder()
+    le_season        = LabelEncoder()
+
+    le_disaster_type.fit(["Heavy Rainfall", "Strong Winds", "Drought"])
+    le_severity.fit(["Low", "Moderate", "Critical"])
+    le_season.fit(["Summer", "Autumn", "Winter", "Spring"])
+
+    return {
+        "le_disaster_type": le_disaster_type,
+        "le_severity":      le_severity,
+        "le_season":        le_season,
+        "feature_columns":  list(FEATURE_COLUMNS),
+    }
+
+
+def encode_features(df, encoders):
+    """
+    Adds the encoded categorical columns to df and returns the
+    float feature matrix in FEATURE_COLUMNS order.
+    """
+    df["disaster_type_enc"] = encoders["le_disaster_type"].transform(df["disaster_type"])
+    df["severity_enc"]      = encoders["le_severity"].transform(df["severity"])
+    df["season_enc"]        = encoders["le_season"].transform(df["season"])
+
+    return df[encoders["feature_columns"]].values.astype(np.float64)
+
+
 def prepare_features(df):
     """
     Encodes categorical columns and builds the feature matrix X.
@@ -76,33 +160,10 @@ def prepare_features(df):
 
     print("Preparing features...")
 
-    le_disaster_type = LabelEncoder()
-    le_severity      = LabelEncoder()
-    le_season        = LabelEncoder()
-
-    # Fit on all known categories — ensures stability at prediction time
-    le_disaster_type.fit(["Heavy Rainfall", "Strong Winds", "Drought"])
-    le_severity.fit(["Low", "Moderate", "Critical"])
-    le_season.fit(["Summer", "Autumn", "Winter", "Spring"])
-
-    df["disaster_type_enc"] = le_disaster_type.transform(df["disaster_type"])
-    df["severity_enc"]      = le_severity.transform(df["severity"])
-    df["season_enc"]        = le_season.transform(df["season"])
-
-    # Feature order must exactly match predict.py
-    feature_columns = [
-        "disaster_type_enc",
-        "severity_enc",
-        "season_enc",
-        "num_households",
-        "avg_damage_level",
-        "pct_elderly",
-        "pct_children_u5",
-        "pct_disabled",
-        "avg_household_size",
-    ]
+    encoders        = build_encoders()
+    feature_columns = encoders["feature_columns"]
 
-    X = df[feature_columns].values
+    X = encode_features(df, encoders)
     Y = df["total_funding"].values
 
     print(f"  Problem type : Regression (continuous target)")
@@ -114,23 +175,62 @@ def prepare_features(df):
     print(f"  Y max        : LSL {Y.max():,.0f}")
     print(f"  Y mean       : LSL {Y.mean():,.0f}\n")
 
-    encoders = {
-        "le_disaster_type": le_disaster_type,
-        "le_severity":      le_severity,
-        "le_season":        le_season,
-        "feature_columns":  feature_columns,
-    }
-
     return X, Y, encoders
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 2B: WEIGHTED DUPLICATE COLLAPSE
+# The four vulnerability columns are fixed by district and the categoricals
+# have 3–4 values, so at scale many rows share one feature vector.
+# ─────────────────────────────────────────────────────────────────────────────
+
+def collapse_duplicates(X, Y):
+    """
+    One row per distinct feature vector. Returns the unique rows, their
+    mean target, their count (the sample_weight) and their sum of squared
+    targets (to restore node impurities afterwards).
+    """
+    X     = np.ascontiguousarray(X, dtype=np.float64)
+    rows  = X.view(np.dtype((np.void, X.dtype.itemsize * X.shape[1]))).ravel()
+    group = pd.factorize(rows)[0]
+    first = np.empty(group.max() + 1, dtype=np.int64)
+    first[group[::-1]] = np.arange(len(group))[::-1]    # first row of each group
+
+    counts = np.bincount(group).astype(np.float64)
+    sums   = np.bincount(group, weights=Y)
+    sumsq  = np.bincount(group, weights=np.asarray(Y, dtype=np.float64) ** 2)
+    return X[first], sums / counts, counts, sumsq
+
+
+def restore_node_stats(model, X_unique, Y_mean, counts, sumsq):
+    """
+    A weighted fit only sees the group means, so its node impurities miss
+    the spread inside each group. Recomputes every node's mean, impurity
+    and sample count as the uncollapsed fit would have stored them.
+    """
+    path  = model.decision_path(X_unique).tocsc().astype(np.float64)
+    w     = path.T @ counts
+    s1    = path.T @ (Y_mean * counts)
+    s2    = path.T @ sumsq
+
+    state = model.tree_.__getstate__()
+    nodes = state["nodes"]
+    mean  = s1 / w
+    nodes["impurity"]                = np.maximum(s2 / w - mean ** 2, 0.0)
+    nodes["n_node_samples"]          = np.rint(w).astype(np.int64)
+    nodes["weighted_n_node_samples"] = w
+    state["values"]                  = mean.reshape(state["values"].shape)
+    model.tree_.__setstate__(state)
+    return model
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # SECTION 3: FIND OPTIMAL TREE DEPTH VIA CROSS-VALIDATION
 # Tests depths 3, 5, 7, 10, 15, 20 and picks the one that generalises best.
 # This is the pruning step — preventing the tree from memorising training data.
 # ─────────────────────────────────────────────────────────────────────────────
 
-def find_optimal_depth(X, Y):
+def find_optimal_depth(X, Y, collapse=False):
     """
     Tests multiple max_depth values using 5-fold cross-validation.
     Selects the depth with the highest average R² across all 5 folds.
@@ -141,6 +241,9 @@ def find_optimal_depth(X, Y):
     finds the depth where the tree generalises best to unseen data.
 
     Depths tested: 3, 5, 7, 10, 15, 20, None (unlimited)
+
+    With collapse, each fold's training rows are collapsed after the folds
+    are drawn, and every held-out row is still scored on its own.
     """
 
     print("=" * 62)
@@ -156,9 +259,20 @@ def find_optimal_depth(X, Y):
     print(f"\n  {'Depth':<10}  {'CV R² Mean':>10}  {'CV R² Std':>10}  {'Note'}")
     print(f"  {'-'*10}  {'-'*10}  {'-'*10}  {'-'*20}")
 
+    if collapse:
+        # Folds are drawn over the original rows, then each training side is
+        # collapsed once and reused for every depth
+        folds = [(collapse_duplicates(X[train], Y[train]), test) for train, test in kf.split(X)]
+
     for depth in depths:
-        model  = DecisionTreeRegressor(max_depth=depth, random_state=42)
-        scores = cross_val_score(model, X, Y, cv=kf, scoring="r2")
+        if collapse:
+            scores = np.array([
+                r2_score(Y[test], fit_collapsed(collapsed, depth).predict(X[test]))
+                for collapsed, test in folds
+            ])
+        else:
+            model  = DecisionTreeRegressor(max_depth=depth, random_state=42)
+            scores = cross_val_score(model, X, Y, cv=kf, scoring="r2")
         mean   = scores.mean()
         std    = scores.std()
 
@@ -190,7 +304,35 @@ def find_optimal_depth(X, Y):
 # Final evaluation on a separate 20% test set
 # ─────────────────────────────────────────────────────────────────────────────
 
-def train_and_evaluate(X, Y, optimal_depth):
+def fit_tree(X, Y, depth, engine="exact", collapse=False):
+    """
+    Fits a Decision Tree with the chosen training engine:
+      - exact     : sklearn DecisionTreeRegressor (whole X in memory)
+      - histogram : histogram_tree.py (256-bin, out-of-core capable)
+    Both return a DecisionTreeRegressor, so predict.py is unaffected.
+    collapse fits the exact engine on weighted unique rows instead.
+    """
+    if engine == "histogram":
+        from histogram_tree import fit_histogram_tree
+        return fit_histogram_tree(X, Y, max_depth=depth)
+
+    if collapse:
+        return fit_collapsed(collapse_duplicates(X, Y), depth)
+
+    model = DecisionTreeRegressor(max_depth=depth, random_state=42)
+    model.fit(X, Y)
+    return model
+
+
+def fit_collapsed(collapsed, depth):
+    """Fits the output of collapse_duplicates with counts as sample_weight."""
+    X_unique, Y_mean, counts, sumsq = collapsed
+    model = DecisionTreeRegressor(max_depth=depth, random_state=42)
+    model.fit(X_unique, Y_mean, sample_weight=counts)
+    return restore_node_stats(model, X_unique, Y_mean, counts, sumsq)
+
+
+def train_and_evaluate(X, Y, optimal_depth, engine="exact", collapse=False):
     """
     Trains the Decision Tree at the optimal depth on 80% of the data.
     Evaluates on the remaining 20% using R², RMSE, and MAE.
@@ -208,8 +350,7 @@ def train_and_evaluate(X, Y, optimal_depth):
     print(f"\n  Training samples : {len(X_train)}")
     print(f"  Testing samples  : {len(X_test)}\n")
 
-    model = DecisionTreeRegressor(max_depth=optimal_depth, random_state=42)
-    model.fit(X_train, Y_train)
+    model = fit_tree(X_train, Y_train, optimal_depth, engine, collapse)
 
     Y_pred = model.predict(X_test)
 
@@ -259,6 +400,91 @@ def print_feature_importance(model, feature_columns):
     print()
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 5B: PERMUTATION IMPORTANCE (holdout set)
+# Impurity importance is biased toward high-cardinality numeric features
+# such as num_households. Permutation importance measures how much holdout
+# R² drops when one feature column is shuffled — what the auditors ask for.
+# ─────────────────────────────────────────────────────────────────────────────
+
+# Per-worker state, set once by _init_permutation_worker
+_PERM_STATE = {}
+
+
+def _init_permutation_worker(model, X, Y, seed):
+    # One preallocated copy of X per worker; each job shuffles a single
+    # column of it in place and restores it afterwards
+    _PERM_STATE.update(model=model, X=X, Y=Y, seed=seed, buffer=X.copy())
+
+
+def _permutation_job(job):
+    feature, repeat = job
+    state  = _PERM_STATE
+    X, buf = state["X"], state["buffer"]
+
+    rng = np.random.default_rng((state["seed"], feature, repeat))
+    buf[:, feature] = X[rng.permutation(len(X)), feature]
+    score = r2_score(state["Y"], state["model"].predict(buf))
+    buf[:, feature] = X[:, feature]
+
+    return feature, repeat, score
+
+
+def compute_permutation_importance(model, X_test, Y_test, feature_columns,
+                                   n_repeats=10, workers=None, seed=42):
+    """
+    Mean and std drop in holdout R² over n_repeats shuffles of each feature.
+
+    The baseline predictions and score are computed once. The
+    (feature, repeat) jobs are spread across a process pool; workers=1
+    runs them in this process.
+    """
+    start    = time.perf_counter()
+    baseline = r2_score(Y_test, model.predict(X_test))
+    jobs     = [(f, r) for f in range(len(feature_columns)) for r in range(n_repeats)]
+    scores   = np.empty((len(feature_columns), n_repeats))
+
+    init_args = (model, np.ascontiguousarray(X_test, dtype=np.float64), Y_test, seed)
+    if workers == 1:
+        _init_permutation_worker(*init_args)
+        for feature, repeat, score in map(_permutation_job, jobs):
+            scores[feature, repeat] = baseline - score
+    else:
+        # The with block shuts the workers down even if a job raises
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_permutation_worker,
+                                 initargs=init_args) as pool:
+            results = pool.map(_permutation_job, jobs, chunksize=max(1, len(jobs) // 32))
+            for feature, repeat, score in results:
+                scores[feature, repeat] = baseline - score
+
+    drops = {
+        feat: {"mean": float(scores[i].mean()), "std": float(scores[i].std())}
+        for i, feat in enumerate(feature_columns)
+    }
+    return {
+        "baseline_r2": float(baseline),
+        "n_repeats":   n_repeats,
+        "seconds":     time.perf_counter() - start,
+        "importances": drops,
+    }
+
+
+def print_permutation_importance(result):
+    print("=" * 62)
+    print("PERMUTATION IMPORTANCE (holdout set)")
+    print(f"Drop in R² when each feature is shuffled ({result['n_repeats']} repeats).")
+    print("=" * 62)
+
+    pairs = sorted(result["importances"].items(), key=lambda x: x[1]["mean"], reverse=True)
+    top   = max(pairs[0][1]["mean"], 1e-12)
+    for feat, imp in pairs:
+        bar = "█" * int(max(imp["mean"], 0) / top * 40)
+        print(f"  {feat:<22}  {bar:<40}  {imp['mean']:.4f} ± {imp['std']:.4f}")
+
+    print(f"\n  Baseline holdout R²: {result['baseline_r2']:.4f}")
+    print(f"  Time taken        : {result['seconds']:.2f}s\n")
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # SECTION 6: PRINT TREE STRUCTURE (shallow preview)
 # One of the key advantages of Decision Trees — you can read exactly
@@ -282,7 +508,7 @@ def print_tree_structure(model, feature_columns):
 # retrain on all 2000 records for the strongest possible deployment model
 # ─────────────────────────────────────────────────────────────────────────────
 
-def retrain_on_full_data(optimal_depth, X, Y):
+def retrain_on_full_data(optimal_depth, X, Y, engine="exact", collapse=False):
     """
     Retrains on all 2000 records.
     Cross-validation already confirmed the model generalises well
@@ -294,8 +520,7 @@ def retrain_on_full_data(optimal_depth, X, Y):
     print("Retraining on all 2000 rows for deployment.")
     print("=" * 62)
 
-    final_model     = DecisionTreeRegressor(max_depth=optimal_depth, random_state=42)
-    final_model.fit(X, Y)
+    final_model     = fit_tree(X, Y, optimal_depth, engine, collapse)
 
     Y_pred_full = final_model.predict(X)
     r2_full     = r2_score(Y, Y_pred_full)
@@ -311,20 +536,32 @@ def retrain_on_full_data(optimal_depth, X, Y):
 # SECTION 8: SAVE MODEL AND ENCODERS
 # ─────────────────────────────────────────────────────────────────────────────
 
-def save_model(final_model, encoders):
+def save_model(final_model, encoders, X):
+    """Writes the artifacts and returns their SHA-256 digests."""
     with open("disaster_model.pkl", "wb") as f:
         pickle.dump(final_model, f)
 
     with open("disaster_encoders.pkl", "wb") as f:
         pickle.dump(encoders, f)
 
+    # Training distribution the live drift sketches are compared against
+    save_reference(build_reference(X, encoders), REFERENCE_PATH)
+
+    # One simplified rule per leaf, so predict.py explains by lookup
+    save_explanations(build_explanations(final_model, encoders), EXPLANATIONS_PATH)
+
     print("=" * 62)
     print("FILES SAVED")
     print("=" * 62)
     print("  disaster_model.pkl    — trained Decision Tree model")
     print("  disaster_encoders.pkl — encoders + feature column order")
+    print("  drift_reference.json  — training bin edges for drift monitoring")
+    print("  disaster_explanations.json — leaf-indexed prediction explanations")
     print()
 
+    return {path: file_sha256(path) for path in
+            ("disaster_model.pkl", "disaster_encoders.pkl", REFERENCE_PATH, EXPLANATIONS_PATH)}
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # SECTION 9: EXAMPLE PREDICTION
@@ -378,29 +615,314 @@ def example_prediction(final_model, encoders):
     print("=" * 62)
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 10: RUN REPORT
+# ─────────────────────────────────────────────────────────────────────────────
+
+def write_run_report(report, path="training_report.json"):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+
+    print(f"  Run report written to {path}")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 11: MEMOIZED STAGE GRAPH
+# Every stage is keyed on a hash of its parameters, its code (functions, or
+# paths of whole helper source files) and the keys of
+# the stages it reads from, so a key only changes when something upstream
+# changed. Outputs are pickled to .stage_cache/ and resolved lazily: a cache
+# hit never touches the stages above it.
+# ─────────────────────────────────────────────────────────────────────────────
+
+STAGE_CACHE_DIR = ".stage_cache"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Stage:
+
+    def __init__(self, name, inputs, run, params=None, code=(), is_valid=None):
+        self.name     = name
+        self.inputs   = inputs
+        self.run      = run
+        self.params   = params or {}
+        self.code     = code
+        self.is_valid = is_valid
+
+
+class StageGraph:
+
+    def __init__(self, stages, cache_dir=STAGE_CACHE_DIR, recompute=()):
+        self.stages    = {stage.name: stage for stage in stages}
+        self.order     = [stage.name for stage in stages]
+        self.cache_dir = cache_dir
+        self.recompute = set(recompute)
+        self.keys      = {}
+        self.outputs   = {}
+        self.log       = []
+
+        for name in self.order:
+            self.keys[name] = self._key(self.stages[name])
+
+    def _key(self, stage):
+        payload = {
+            "stage":  stage.name,
+            "params": stage.params,
+            "code":   [file_sha256(fn) if isinstance(fn, str) else
+                       hashlib.sha256(inspect.getsource(fn).encode()).hexdigest()
+                       for fn in stage.code],
+            "inputs": [self.keys[name] for name in stage.inputs],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, f"{name}-{self.keys[name][:20]}.pkl")
+
+    def get(self, name):
+        if name in self.outputs:
+            return self.outputs[name]
+
+        stage = self.stages[name]
+        path  = self._path(name)
+
+        if name not in self.recompute and os.path.exists(path):
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+            if stage.is_valid is None or stage.is_valid(entry["output"]):
+                print(f"  [cache hit] {name:<13} saved {entry['seconds']:.2f}s\n")
+                self.log.append({"stage": name, "status": "hit", "seconds": 0.0,
+                                 "saved_seconds": entry["seconds"]})
+                self.outputs[name] = entry["output"]
+                return entry["output"]
+
+        args   = [self.get(dep) for dep in stage.inputs]
+        start  = time.perf_counter()
+        output = stage.run(*args)
+        took   = time.perf_counter() - start
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(path, "wb") as f:
+            pickle.dump({"output": output, "seconds": took}, f)
+
+        self.log.append({"stage": name, "status": "computed", "seconds": took, "saved_seconds": 0.0})
+        self.outputs[name] = output
+        return output
+
+    def downstream_of(self, name):
+        """name and every stage that reads from it, directly or indirectly."""
+        found = {name}
+        for stage_name in self.order:
+            if any(dep in found for dep in self.stages[stage_name].inputs):
+                found.add(stage_name)
+        return found
+
+
+def build_training_stages(args):
+    # code= lists every function a stage can reach in this module; helper
+    # modules (histogram engine, drift sketch, explanations) are keyed on
+    # their source files, so the exact engine never imports histogram_tree
+    here    = os.path.dirname(os.path.abspath(__file__))
+    helpers = {name: os.path.join(here, f"{name}.py")
+               for name in ("histogram_tree", "drift_sketch", "tree_explanations")}
+
+    features = [prepare_features, build_encoders, encode_features]
+    fitting  = [fit_tree, fit_collapsed, collapse_duplicates, restore_node_stats,
+                helpers["histogram_tree"]]
+
+    return [
+        Stage("load", [], lambda: load_data(args.data),
+              params={"data_sha256": file_sha256(args.data)}, code=[load_data]),
+        Stage("features", ["load"], lambda df: prepare_features(df.copy()),
+              code=features),
+        Stage("depth_search", ["features"],
+              lambda feats: find_optimal_depth(feats[0], feats[1], args.collapse_duplicates),
+              params={"collapse": args.collapse_duplicates},
+              code=[find_optimal_depth, fit_collapsed, collapse_duplicates, restore_node_stats]),
+        Stage("holdout", ["features", "depth_search"],
+              lambda feats, depth: train_and_evaluate(feats[0], feats[1], depth[0], args.engine,
+                                                      args.collapse_duplicates),
+              params={"engine": args.engine, "collapse": args.collapse_duplicates},
+              code=[train_and_evaluate] + fitting),
+        Stage("importance", ["features", "holdout"],
+              lambda feats, held: compute_permutation_importance(
+                  held[0], held[5], held[7], feats[2]["feature_columns"],
+                  n_repeats=args.perm_repeats, workers=args.workers),
+              params={"n_repeats": args.perm_repeats},
+              code=[compute_permutation_importance, _init_permutation_worker, _permutation_job]),
+        Stage("refit", ["features", "depth_search"],
+              lambda feats, depth: retrain_on_full_data(depth[0], feats[0], feats[1], args.engine,
+                                                        args.collapse_duplicates),
+              params={"engine": args.engine, "collapse": args.collapse_duplicates},
+              code=[retrain_on_full_data] + fitting),
+        Stage("save", ["features", "refit"], lambda feats, model: save_model(model, feats[2], feats[0]),
+              code=[save_model, file_sha256, helpers["drift_sketch"],
+                    helpers["tree_explanations"]],
+              is_valid=lambda digests: all(
+                  os.path.exists(path) and file_sha256(path) == sha for path, sha in digests.items()
+              )),
+    ]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 12: DUPLICATE COLLAPSE BENCHMARK
+# The 2000 events are resampled to `rows` rows with ±5% noise on the
+# target. Feature vectors repeat and targets differ, as they would once
+# real feedback accumulates. Every fit of the pipeline runs both ways.
+# ─────────────────────────────────────────────────────────────────────────────
+
+def trees_equivalent(a, b, X):
+    """
+    Same node count and depth, the same partition of X into leaves, and
+    the same value, impurity and sample count in matching leaves. Where two
+    splits tie exactly (e.g. Drought ⇔ damage ≤ 2.08, or two columns that
+    both separate the same two districts) sklearn's pick between them
+    follows floating-point noise, so leaves are matched by the rows they
+    hold rather than by node id.
+    """
+    A, B = a.tree_, b.tree_
+    if A.node_count != B.node_count or a.get_depth() != b.get_depth():
+        return False
+    la, lb  = a.apply(X), b.apply(X)
+    pairs   = np.unique(np.stack([la, lb], axis=1), axis=0)
+    if not (len(pairs) == len(np.unique(la)) == len(np.unique(lb))):
+        return False
+    i, j = pairs[:, 0], pairs[:, 1]
+    return bool(np.allclose(A.value[i], B.value[j], rtol=1e-9, atol=1e-6) and
+                np.allclose(A.impurity[i], B.impurity[j], rtol=1e-6, atol=1e-3) and
+                np.array_equal(A.n_node_samples[i], B.n_node_samples[j]))
+
+
+def run_collapse_benchmark(X, Y, rows, seed=42):
+    rng   = np.random.default_rng(seed)
+    pick  = rng.integers(0, len(X), rows)
+    Xb    = X[pick]
+    Yb    = Y[pick] * rng.normal(1.0, 0.05, rows)
+
+    start = time.perf_counter()
+    unique = len(collapse_duplicates(Xb, Yb)[0])
+    collapse_seconds = time.perf_counter() - start
+
+    quiet  = contextlib.redirect_stdout(io.StringIO())
+    timing = {}
+    with quiet:
+        for collapse in (False, True):
+            start = time.perf_counter()
+            depth, cv = find_optimal_depth(Xb, Yb, collapse)
+            timing[("depth_search", collapse)] = (time.perf_counter() - start, cv)
+            start = time.perf_counter()
+            held  = train_and_evaluate(Xb, Yb, depth, collapse=collapse)
+            timing[("holdout", collapse)] = (time.perf_counter() - start, held[0])
+            start = time.perf_counter()
+            final = retrain_on_full_data(depth, Xb, Yb, collapse=collapse)
+            timing[("refit", collapse)] = (time.perf_counter() - start, final)
+
+    print("=" * 62)
+    print("DUPLICATE COLLAPSE BENCHMARK")
+    print("=" * 62)
+    print(f"\n  Rows             : {rows:,}")
+    print(f"  Unique rows      : {unique:,}")
+    print(f"  Compression      : {rows / unique:,.1f}×  (collapse takes {collapse_seconds:.3f}s)\n")
+    print(f"  {'Step':<14} {'full':>9} {'collapsed':>10} {'speed-up':>9}  Result")
+
+    identical = True
+    for step in ("depth_search", "holdout", "refit"):
+        full, a = timing[(step, False)]
+        fast, b = timing[(step, True)]
+        if step == "depth_search":
+            same = all(abs(a[d]["mean_r2"] - b[d]["mean_r2"]) < 1e-9 for d in a)
+            note = "same CV R² at every depth" if same else "CV R² differs"
+        else:
+            same = trees_equivalent(a, b, Xb)
+            note = "identical tree" if same else "trees differ"
+        identical &= same
+        print(f"  {step:<14} {full:>8.2f}s {fast:>9.2f}s {full / fast:>8.1f}×  {note}")
+    print(f"\n  Result           : {'PASS' if identical else 'FAIL'}\n")
+    return identical
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # RUN EVERYTHING
 # ─────────────────────────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the disaster funding model")
+    parser.add_argument("--data", default="disaster_dataset.csv")
+    parser.add_argument("--engine", choices=["exact", "histogram"], default="exact",
+                        help="Tree training engine for the holdout and deployment fits")
+    parser.add_argument("--perm-repeats", type=int, default=10,
+                        help="Shuffles per feature for permutation importance")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for permutation importance (default: one per core)")
+    parser.add_argument("--collapse-duplicates", action="store_true",
+                        help="Fit identical feature rows once, weighted by their count (exact engine)")
+    parser.add_argument("--collapse-benchmark", type=int, metavar="ROWS", default=None,
+                        help="Compare full and collapsed fits on a resampled dataset of ROWS rows, then exit")
+    parser.add_argument("--force", action="store_true",
+                        help="Ignore the stage cache and recompute every stage")
+    parser.add_argument("--from-stage", default=None,
+                        choices=["load", "features", "depth_search", "holdout",
+                                 "importance", "refit", "save"],
+                        help="Recompute this stage and everything downstream of it")
+    args = parser.parse_args()
+    if args.collapse_duplicates and args.engine == "histogram":
+        parser.error("--collapse-duplicates applies to the exact engine only")
+
+    if args.collapse_benchmark:
+        with contextlib.redirect_stdout(io.StringIO()):
+            X, Y, _ = prepare_features(load_data(args.data))
+        raise SystemExit(0 if run_collapse_benchmark(X, Y, args.collapse_benchmark) else 1)
+
     print("\n" + "=" * 62)
     print("DISASTER FUNDING PREDICTION MODEL — TRAINING")
-    print("Model: Decision Tree Regressor")
+    print(f"Model: Decision Tree Regressor ({args.engine} engine)")
     print("Lesotho Disaster Management Authority")
     print("=" * 62 + "\n")
 
-    df                   = load_data("disaster_dataset.csv")
-    X, Y, encoders       = prepare_features(df)
-    feature_columns      = encoders["feature_columns"]
-
-    optimal_depth, cv_results  = find_optimal_depth(X, Y)
-    model, r2, rmse, mae, X_train, X_test, Y_train, Y_test = train_and_evaluate(X, Y, optimal_depth)
-
+    graph = StageGraph(build_training_stages(args))
+    if args.force:
+        graph.recompute = set(graph.order)
+    elif args.from_stage:
+        graph.recompute = graph.downstream_of(args.from_stage)
+
+    X, Y, encoders            = graph.get("features")
+    feature_columns           = encoders["feature_columns"]
+    optimal_depth, cv_results = graph.get("depth_search")
+    model, r2, rmse, mae, X_train, X_test, Y_train, Y_test = graph.get("holdout")
+    permutation               = graph.get("importance")
+    final_model               = graph.get("refit")
+    graph.get("save")
+
+    # Reporting always runs — it is cheap and reads only stage outputs
     print_feature_importance(model, feature_columns)
+    print_permutation_importance(permutation)
     print_tree_structure(model, feature_columns)
-
-    final_model = retrain_on_full_data(optimal_depth, X, Y)
-    save_model(final_model, encoders)
     example_prediction(final_model, encoders)
 
+    saved = sum(entry["saved_seconds"] for entry in graph.log)
+    print("\n" + "=" * 62)
+    print("STAGE CACHE")
+    print("=" * 62)
+    for entry in graph.log:
+        print(f"  {entry['stage']:<13}  {entry['status']:<8}  "
+              f"ran {entry['seconds']:>6.2f}s  saved {entry['saved_seconds']:>6.2f}s")
+    print(f"  Total time saved by cache: {saved:.2f}s\n")
+
+    write_run_report({
+        "engine":        args.engine,
+        "optimal_depth": optimal_depth,
+        "cv_results":    {str(d): r for d, r in cv_results.items()},
+        "holdout":       {"r2": r2, "rmse": rmse, "mae": mae},
+        "impurity_importance": dict(zip(feature_columns, model.feature_importances_.tolist())),
+        "permutation_importance": permutation,
+        "stages":        graph.log,
+        "cache_seconds_saved": saved,
+    })
+
     print("\nTraining complete. Ready to deploy predict.py.\n")
@@ -0,0 +1,282 @@
+"""
+district_features.py
+====================
+Feature store for the four district vulnerability features of the funding
+model, derived from the household assessments actually collected.
+Lesotho Disaster Management Authority.
+
+  pct_elderly        : share of households whose head is over 65
+  pct_children_u5    : share of households with a child under 5
+  pct_disabled       : share of households whose damage description mentions
+                       a disabled member (same keywords as the allocation plan)
+  avg_household_size : mean householdSize
+
+Exports are streamed in chunks, so any size fits in memory. Each chunk is
+reduced to per-district running sums (households, elderly, children,
+disabled, size total, size count) in feature_store/running_sums.csv.
+Already-ingested assessment ids are skipped, so a refresh costs work
+proportional to the new batch, never a rescan of the history.
+
+Every refresh publishes a versioned table (feature_store/vNNNN.json) and
+atomically swaps it into feature_store/district_profiles.json, which
+predict.py loads. A district's published value is its assessed share
+blended with the hardcoded profile as PRIOR_HOUSEHOLDS pseudo-households,
+so a district with a handful of assessments does not swing the model.
+
+Input: mongoexport of household_assessments (--jsonArray or JSON lines).
+
+Usage:
+  python district_features.py ingest households.json
+  python district_features.py ingest households.json --by-disaster
+  python district_features.py rebuild all_households.json     # after edits to old assessments
+  python district_features.py show
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from predict import DISTRICT_PROFILES, DISTRICT_TABLE_PATH, PROFILE_FEATURES
+from mongo_export import iter_export, plain
+from household_costing import KEYWORDS, phrase_hits
+
+
+STORE_DIR        = os.path.dirname(DISTRICT_TABLE_PATH)
+SUMS_PATH        = os.path.join(STORE_DIR, "running_sums.csv")
+INGESTED_PATH    = os.path.join(STORE_DIR, "ingested_ids.txt")
+
+CHUNK_RECORDS    = 50_000
+PRIOR_HOUSEHOLDS = 30
+
+SUM_FIELDS = ["households", "elderly", "children_u5", "disabled", "size_total", "size_count"]
+KEY_FIELDS = ["district", "disaster_id"]
+
+_DISTRICTS = {name.lower(): name for name in DISTRICT_PROFILES}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 1: CHUNKED EXPORT READER
+# ─────────────────────────────────────────────────────────────────────────────
+
+def iter_chunks(path, size=CHUNK_RECORDS):
+    chunk = []
+    for record in iter_export(path):
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 2: CHUNK → RUNNING SUMS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def canonical_district(name):
+    name = " ".join(str(name or "").replace("’", "'").split())
+    return _DISTRICTS.get(name.lower(), name.title())
+
+
+def chunk_sums(records, by_disaster=False):
+    """Per-district (and per-disaster) sums of one chunk as a DataFrame."""
+    def head(r, key):
+        return plain((r.get("headOfHousehold") or {}).get(key))
+
+    size        = np.array([plain(r.get("householdSize")) or np.nan for r in records], dtype=np.float64)
+    description = pd.Categorical([str(r.get("damageDescription") or "") for r in records])
+    disabled    = phrase_hits(description.categories, KEYWORDS["disabled"]).any(axis=1)[description.codes]
+
+    frame = pd.DataFrame({
+        "district":    [canonical_district((r.get("location") or {}).get("district")) for r in records],
+        "disaster_id": [str(plain(r.get("disasterId")) or "") if by_disaster else "" for r in records],
+        "households":  1,
+        "elderly":     np.array([head(r, "age") or 0 for r in records], dtype=np.float64) > 65,
+        "children_u5": np.array([plain(r.get("childrenUnder5")) or 0 for r in records], dtype=np.float64) > 0,
+        "disabled":    disabled,
+        "size_total":  np.nan_to_num(size),
+        "size_count":  ~np.isnan(size),
+    })
+    district_level = frame.assign(disaster_id="").groupby(KEY_FIELDS)[SUM_FIELDS].sum()
+    if not by_disaster:
+        return district_level
+    per_disaster = frame[frame["disaster_id"] != ""].groupby(KEY_FIELDS)[SUM_FIELDS].sum()
+    return pd.concat([district_level, per_disaster])
+
+
+class FeatureStore:
+
+    def __init__(self, root=STORE_DIR):
+        self.root          = root
+        self.sums_path     = os.path.join(root, os.path.basename(SUMS_PATH))
+        self.ingested_path = os.path.join(root, os.path.basename(INGESTED_PATH))
+        self.table_path    = os.path.join(root, os.path.basename(DISTRICT_TABLE_PATH))
+
+        if os.path.exists(self.sums_path):
+            self.sums = pd.read_csv(self.sums_path, keep_default_na=False).set_index(KEY_FIELDS)
+        else:
+            self.sums = pd.DataFrame(columns=KEY_FIELDS + SUM_FIELDS).set_index(KEY_FIELDS)
+        self.sums = self.sums.astype(np.float64)
+
+        self.ingested = set()
+        if os.path.exists(self.ingested_path):
+            with open(self.ingested_path) as f:
+                self.ingested = {line.rstrip("\n") for line in f}
+
+    def ingest(self, path, by_disaster=False):
+        """Adds the new assessments of an export to the running sums."""
+        new_ids, added, skipped = [], 0, 0
+        for chunk in iter_chunks(path):
+            fresh = []
+            for record in chunk:
+                record_id = str(plain(record.get("_id")) or "")
+                if record_id and record_id in self.ingested:
+                    skipped += 1
+                    continue
+                if record_id:
+                    self.ingested.add(record_id)
+                    new_ids.append(record_id)
+                fresh.append(record)
+            if fresh:
+                self.sums = self.sums.add(chunk_sums(fresh, by_disaster), fill_value=0.0)
+                added    += len(fresh)
+        return added, skipped, new_ids
+
+    def save(self, new_ids):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.sums_path + ".tmp"
+        self.sums.sort_index().reset_index().to_csv(tmp, index=False)
+        os.replace(tmp, self.sums_path)
+        with open(self.ingested_path, "a") as f:
+            f.writelines(f"{record_id}\n" for record_id in new_ids)
+
+    # --- published table ------------------------------------------------------
+
+    def profiles(self):
+        """Blends each key's assessed shares with its prior profile."""
+        national = {f: float(np.mean([p[f] for p in DISTRICT_PROFILES.values()])) for f in PROFILE_FEATURES}
+        table    = {"districts": {}, "disasters": {}}
+
+        for (district, disaster_id), s in self.sums.sort_index().iterrows():
+            prior = (table["districts"].get(district) if disaster_id else None) \
+                    or DISTRICT_PROFILES.get(district, national)
+            k     = PRIOR_HOUSEHOLDS
+            row   = {
+                "pct_elderly":        (s.elderly     + k * prior["pct_elderly"])     / (s.households + k),
+                "pct_children_u5":    (s.children_u5 + k * prior["pct_children_u5"]) / (s.households + k),
+                "pct_disabled":       (s.disabled    + k * prior["pct_disabled"])    / (s.households + k),
+                "avg_household_size": (s.size_total  + k * prior["avg_household_size"]) / (s.size_count + k),
+            }
+            row = {f: round(float(v), 4) for f, v in row.items()}
+            row["households_assessed"] = int(s.households)
+            if disaster_id:
+                table["disasters"][disaster_id] = {"district": district, **row}
+            else:
+                table["districts"][district] = row
+        return table
+
+    def publish(self, source):
+        previous = self.current_version()
+        version  = previous + 1
+        table    = {
+            "version":          version,
+            "created":          datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "source":           source,
+            "prior_households": PRIOR_HOUSEHOLDS,
+            **self.profiles(),
+        }
+        path = os.path.join(self.root, f"v{version:04d}.json")
+        with open(path, "w") as f:
+            json.dump(table, f, indent=2)
+
+        # Atomic swap so a concurrent predict.py never reads a half-written table
+        tmp = self.table_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(table, f, indent=2)
+        os.replace(tmp, self.table_path)
+        return table
+
+    def current_version(self):
+        if not os.path.exists(self.table_path):
+            return 0
+        with open(self.table_path) as f:
+            return json.load(f)["version"]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 3: REPORT
+# ─────────────────────────────────────────────────────────────────────────────
+
+def print_table(table):
+    print(f"\n  Version {table['version']} ({table['created']}, source {table['source']})\n")
+    print(f"  {'District':<15} {'Assessed':>9}  {'Elderly':>8}  {'Child<5':>8}  {'Disabled':>8}  {'HH size':>7}"
+          f"   (hardcoded)")
+    for district, row in table["districts"].items():
+        old = DISTRICT_PROFILES.get(district)
+        was = (f"{old['pct_elderly']:.2f}/{old['pct_children_u5']:.2f}/"
+               f"{old['pct_disabled']:.2f}/{old['avg_household_size']:.1f}") if old else "—"
+        print(f"  {district:<15} {row['households_assessed']:>9,}  {row['pct_elderly']:>8.3f}  "
+              f"{row['pct_children_u5']:>8.3f}  {row['pct_disabled']:>8.3f}  {row['avg_household_size']:>7.2f}"
+              f"   {was}")
+    if table["disasters"]:
+        print(f"\n  + {len(table['disasters'])} per-disaster profiles")
+    print()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COMMAND LINE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="District feature store from household assessments")
+    sub    = parser.add_subparsers(dest="command", required=True)
+    for name in ("ingest", "rebuild"):
+        p = sub.add_parser(name)
+        p.add_argument("export")
+        p.add_argument("--by-disaster", action="store_true", help="Also keep per-disaster profiles")
+        p.add_argument("--store", default=STORE_DIR)
+    p = sub.add_parser("show")
+    p.add_argument("--store", default=STORE_DIR)
+    args = parser.parse_args(argv)
+
+    print("=" * 62)
+    print("DISTRICT FEATURE STORE")
+    print("=" * 62)
+
+    if args.command == "show":
+        path = os.path.join(args.store, os.path.basename(DISTRICT_TABLE_PATH))
+        if not os.path.exists(path):
+            print("\n  No table published yet.\n")
+            return 1
+        with open(path) as f:
+            print_table(json.load(f))
+        return 0
+
+    if args.command == "rebuild":
+        for name in (SUMS_PATH, INGESTED_PATH):
+            path = os.path.join(args.store, os.path.basename(name))
+            if os.path.exists(path):
+                os.remove(path)
+
+    store = FeatureStore(args.store)
+    start = time.perf_counter()
+    added, skipped, new_ids = store.ingest(args.export, args.by_disaster)
+    seconds = time.perf_counter() - start
+    print(f"\n  {added:,} new assessments aggregated in {seconds:.2f}s ({skipped:,} already ingested)")
+
+    if not added and store.current_version():
+        print("  Nothing new; table unchanged.\n")
+        return 0
+    store.save(new_ids)
+    print_table(store.publish(os.path.basename(args.export)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,9 @@ import Budget from '../models/Budget.js';
 import AuditLog from '../models/AuditLog.js';
 import Disaster from '../models/Disaster.js';
 import Expense from '../models/Expense.js';
+import { readFile, stat } from 'fs/promises';
+import path from 'path';
+import { fileURLToPath } from 'url';
 import {
   getTotalSpentByCategory,
   getRemainingBudget,
@@ -26,6 +29,12 @@ import {
   getAllocationSummary,
 } from '../utils/financialUtils.js';
 
+// Written by budget_analytics.py at the repository root
+const BUDGET_SNAPSHOT_PATH = path.join(
+  path.dirname(fileURLToPath(import.meta.url)),
+  '../../budget_store/budget_snapshot.json'
+);
+
 /**
  * @POST /budgets
  * Create new budget allocation
@@ -705,6 +714,40 @@ const getAllocationBudgetImpact = async (req, res) => {
   }
 };
 
+/**
+ * @GET /budgets/analytics/snapshot
+ * Precomputed budget analytics (budget_analytics.py). Optional ?disasterId=
+ * or ?fiscalYear= return just that slice; the file is re-read only when the
+ * job publishes a new version
+ */
+let snapshotCache = { mtimeMs: 0, data: null };
+
+const getBudgetSnapshot = async (req, res) => {
+  try {
+    const { mtimeMs } = await stat(BUDGET_SNAPSHOT_PATH);
+    if (mtimeMs !== snapshotCache.mtimeMs) {
+      snapshotCache = { mtimeMs, data: JSON.parse(await readFile(BUDGET_SNAPSHOT_PATH, 'utf8')) };
+    }
+    const snapshot = snapshotCache.data;
+    const { disasterId, fiscalYear } = req.query;
+    const meta = { version: snapshot.version, created: snapshot.created, as_of: snapshot.as_of };
+
+    if (disasterId) {
+      return res.status(200).json({ ...meta, disaster: snapshot.disasters[disasterId] || null });
+    }
+    if (fiscalYear) {
+      return res.status(200).json({ ...meta, fiscalYear: snapshot.fiscalYears[fiscalYear] || null });
+    }
+    res.status(200).json(snapshot);
+  } catch (error) {
+    if (error.code === 'ENOENT') {
+      return res.status(404).json({ message: 'Budget snapshot not built yet; run budget_analytics.py ingest' });
+    }
+    console.error('Error reading budget snapshot:', error);
+    res.status(500).json({ message: 'Error reading budget snapshot', error: error.message });
+  }
+};
+
 export default {
   createBudget: createBudget,
   getBudgetsByDisaster: getBudgetsByDisaster,
@@ -714,6 +757,7 @@ export default {
   createNationalBudget: createNationalBudget,
   getEnvelopeStatus: getEnvelopeStatus,
   getAllocationBudgetImpact: getAllocationBudgetImpact,
+  getBudgetSnapshot: getBudgetSnapshot,
   createExpense: createExpense,
   getExpensesByDisaster: getExpensesByDisaster,
   approveExpense: approveExpense,
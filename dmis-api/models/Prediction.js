@@ -36,6 +36,17 @@ const PredictionSchema = new mongoose.Schema(
       type: Number,
       required: true,
     },
+    // Filled in once the disaster is resolved; read by /metrics and
+    // exported for model_refresh.py
+    actualFunding: {
+      type: Number,
+      default: null,
+    },
+    // Rules of the model leaf the estimate came from (predict.py --explain)
+    explanation: {
+      type: String,
+      default: null,
+    },
     userId: {
       type: mongoose.Schema.Types.ObjectId,
       ref: "User",
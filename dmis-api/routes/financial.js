@@ -289,4 +289,23 @@ router.get('/envelope-status/all', protect, async (req, res) => {
   }
 });
 
+/**
+ * GET /api/budgets/analytics/snapshot
+ * Precomputed budget analytics (breakdowns, burn rates, health alerts)
+ * Role: Finance Officer, Administrator
+ */
+router.get('/analytics/snapshot', protect, async (req, res) => {
+  try {
+    const user = JSON.parse(req.headers.user || '{}');
+    if (!['Finance Officer', 'Administrator'].includes(user.role)) {
+      return res.status(403).json({ message: 'Insufficient permissions to view budget analytics' });
+    }
+
+    await financialController.getBudgetSnapshot(req, res);
+  } catch (error) {
+    console.error('Route error:', error);
+    res.status(500).json({ message: 'Route error', error: error.message });
+  }
+});
+
 export default router;
@@ -20,24 +20,16 @@ const MODEL_DIR      = path.join(__dirname, "../../");
 
 
 // ─────────────────────────────────────────────────────────────────────────────
-// DISTRICT VULNERABILITY PROFILES
-// These values are looked up automatically based on the selected district.
-// They are NOT entered by the user — they come from district demographic data
-// used to train the model. The user only selects the district name.
+// DISTRICTS
+// The user only selects the district name. Its vulnerability profile is looked
+// up by predict.py from the district table aggregated from household
+// assessments (district_features.py), not entered by the user.
 // ─────────────────────────────────────────────────────────────────────────────
 
-const DISTRICT_PROFILES = {
-  "Maseru":        { pctElderly: 0.08, pctChildrenU5: 0.12, pctDisabled: 0.05, avgHouseholdSize: 4.5 },
-  "Berea":         { pctElderly: 0.10, pctChildrenU5: 0.15, pctDisabled: 0.06, avgHouseholdSize: 5.5 },
-  "Leribe":        { pctElderly: 0.11, pctChildrenU5: 0.16, pctDisabled: 0.06, avgHouseholdSize: 5.5 },
-  "Mafeteng":      { pctElderly: 0.12, pctChildrenU5: 0.18, pctDisabled: 0.07, avgHouseholdSize: 6.0 },
-  "Mohale's Hoek": { pctElderly: 0.13, pctChildrenU5: 0.19, pctDisabled: 0.07, avgHouseholdSize: 6.0 },
-  "Quthing":       { pctElderly: 0.14, pctChildrenU5: 0.20, pctDisabled: 0.08, avgHouseholdSize: 7.0 },
-  "Qacha's Nek":   { pctElderly: 0.15, pctChildrenU5: 0.22, pctDisabled: 0.09, avgHouseholdSize: 7.0 },
-  "Butha-Buthe":   { pctElderly: 0.14, pctChildrenU5: 0.19, pctDisabled: 0.08, avgHouseholdSize: 6.5 },
-  "Thaba-Tseka":   { pctElderly: 0.16, pctChildrenU5: 0.23, pctDisabled: 0.09, avgHouseholdSize: 7.5 },
-  "Mokhotlong":    { pctElderly: 0.17, pctChildrenU5: 0.24, pctDisabled: 0.10, avgHouseholdSize: 8.0 },
-};
+const DISTRICTS = [
+  "Maseru", "Berea", "Leribe", "Mafeteng", "Mohale's Hoek",
+  "Quthing", "Qacha's Nek", "Butha-Buthe", "Thaba-Tseka", "Mokhotlong",
+];
 
 
 /**
@@ -70,6 +62,7 @@ router.get("/test", (req, res) => {
  *   success: true,
  *   estimatedFunding: 2608437,
  *   formatted: "M 2,608,437",
+ *   explanation: "Average of 43 comparable past events with ...",
  *   predictionId: "67890xyz"
  * }
  */
@@ -92,26 +85,22 @@ router.post("/estimate", protect, async (req, res) => {
       });
     }
 
-    // --- Look up district vulnerability profile ---
-    const profile = DISTRICT_PROFILES[district];
-    if (!profile) {
+    // --- Validate district ---
+    if (!DISTRICTS.includes(district)) {
       return res.status(400).json({
         success: false,
-        message: `Unknown district: "${district}". Must be one of: ${Object.keys(DISTRICT_PROFILES).join(", ")}`,
+        message: `Unknown district: "${district}". Must be one of: ${DISTRICTS.join(", ")}`,
       });
     }
 
-    // --- Call Python model with all 9 arguments ---
-    const prediction = await runPythonModel(
+    // --- Call Python model; it looks up the district profile itself ---
+    const { prediction, explanation } = await runPythonModel(
       disasterType,
       severity,
       season,
       numHouseholds,
       avgDamageLevel,
-      profile.pctElderly,
-      profile.pctChildrenU5,
-      profile.pctDisabled,
-      profile.avgHouseholdSize,
+      district,
     );
 
     // --- Format the result ---
@@ -128,6 +117,7 @@ router.post("/estimate", protect, async (req, res) => {
       numHouseholds:    Number(numHouseholds),
       avgDamageLevel:   Number(avgDamageLevel),
       estimatedFunding: Number(prediction),
+      explanation,
       userId,
     });
 
@@ -135,6 +125,7 @@ router.post("/estimate", protect, async (req, res) => {
       success:          true,
       estimatedFunding: Number(prediction),
       formatted,
+      explanation,
       predictionId:     predictionDoc._id,
     });
 
@@ -149,7 +140,8 @@ router.post("/estimate", protect, async (req, res) => {
 
 
 /**
- * Runs predict.py as a child process and returns the predicted value.
+ * Runs predict.py as a child process and returns the predicted value
+ * with its explanation (the rules of the tree leaf the estimate came from).
  * Node.js cannot read .pkl files directly so we call Python for this.
  *
  * Arguments passed to predict.py (in order):
@@ -158,10 +150,8 @@ router.post("/estimate", protect, async (req, res) => {
  *   3. season
  *   4. numHouseholds
  *   5. avgDamageLevel
- *   6. pctElderly         ← from DISTRICT_PROFILES, not from user input
- *   7. pctChildrenU5      ← from DISTRICT_PROFILES, not from user input
- *   8. pctDisabled        ← from DISTRICT_PROFILES, not from user input
- *   9. avgHouseholdSize   ← from DISTRICT_PROFILES, not from user input
+ *   6. district           ← predict.py resolves its vulnerability profile
+ *   --explain             ← second output line is the explanation
  */
 function runPythonModel(
   disasterType,
@@ -169,10 +159,7 @@ function runPythonModel(
   season,
   numHouseholds,
   avgDamageLevel,
-  pctElderly,
-  pctChildrenU5,
-  pctDisabled,
-  avgHouseholdSize,
+  district,
 ) {
   return new Promise((resolve, reject) => {
     const python = spawn("python", [
@@ -182,10 +169,8 @@ function runPythonModel(
       season,
       String(numHouseholds),
       String(avgDamageLevel),
-      String(pctElderly),
-      String(pctChildrenU5),
-      String(pctDisabled),
-      String(avgHouseholdSize),
+      district,
+      "--explain",
     ], {
       cwd: MODEL_DIR,
     });
@@ -205,11 +190,12 @@ function runPythonModel(
       if (code !== 0) {
         reject(new Error("Python error: " + errorOutput));
       } else {
-        const value = parseFloat(output.trim());
+        const [firstLine, ...rest] = output.trim().split(/\r?\n/);
+        const value = parseFloat(firstLine);
         if (isNaN(value)) {
           reject(new Error("Python returned an invalid number: " + output));
         } else {
-          resolve(value);
+          resolve({ prediction: value, explanation: rest.join(" ").trim() || null });
         }
       }
     });
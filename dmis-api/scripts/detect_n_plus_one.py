@@ -0,0 +1,294 @@
+"""
+detect_n_plus_one.py
+--------------------
+Static N+1 query detector for the DMIS API.
+
+Finds Mongoose model calls (and raw driver db.collection(...) calls) that
+run once per element of a collection:
+  - sequential       : inside for / for-of / while loops (round trips serialised)
+  - fan-out          : inside .map(...) callbacks, typically under Promise.all
+                       (N concurrent round trips, N pool connections)
+  - fire-and-forget  : inside async .forEach(...) callbacks (not awaited at all)
+
+Each finding has a file:line, an estimated round-trip multiplier and the
+batched form to use instead: one $in lookup before the loop, populate()
+on the query that produced the list, or bulkWrite/insertMany for writes.
+
+Usage (from dmis-api/):
+  python scripts/detect_n_plus_one.py                   # whole dmis-api tree
+  python scripts/detect_n_plus_one.py controllers routes
+  python scripts/detect_n_plus_one.py --json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+from extract_model_refs import API_DIR, line_of
+
+SKIP_DIRS = {'node_modules', '.git'}
+
+READ_METHODS  = {'find', 'findOne', 'findById', 'countDocuments', 'exists', 'aggregate', 'distinct'}
+WRITE_METHODS = {
+    'create', 'insertMany', 'updateOne', 'updateMany', 'deleteOne', 'deleteMany',
+    'findByIdAndUpdate', 'findOneAndUpdate', 'findByIdAndDelete', 'findOneAndDelete',
+    'replaceOne', 'insertOne',
+}
+DB_METHODS = READ_METHODS | WRITE_METHODS
+
+IMPORT_RE     = re.compile(r"import\s+(\w+)\s+from\s+['\"](?:\.{1,2}/)+(?:[\w-]+/)*models/(\w+)(?:\.js)?['\"]")
+MODEL_CALL_RE = re.compile(r"\b(\w+)\s*\.\s*(" + '|'.join(sorted(DB_METHODS)) + r")\s*\(")
+DRIVER_RE     = re.compile(r"\.collection\s*\(\s*['\"](\w+)['\"]\s*\)\s*\.\s*(" + '|'.join(sorted(DB_METHODS)) + r")\s*\(")
+SAVE_RE       = re.compile(r"\bawait\s+([\w.]+)\s*\.\s*save\s*\(\s*\)")
+LOOP_RE       = re.compile(r"\b(for|while)\s*\(")
+BOUNDED_RE    = re.compile(r"<\s*=?\s*(\d+)\s*;")
+ITER_RE       = re.compile(r"([\w.\]\)]+)\s*\.\s*(forEach|map|flatMap|filter|reduce|some|every)\s*\(")
+
+# Loops with a small literal bound (retries, fixed batches) are not N+1
+MAX_BOUNDED_ITERATIONS = 10
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MASKING
+# Blank out comments and string contents (keeping offsets and newlines) so
+# structural regexes never match inside them.
+# ─────────────────────────────────────────────────────────────────────────────
+
+MASK_RE = re.compile(
+    r"//[^\n]*|/\*.*?\*/"
+    r"|'(?:\\.|[^'\\\n])*'|\"(?:\\.|[^\"\\\n])*\"|`(?:\\.|[^`\\])*`",
+    re.S,
+)
+
+
+def _blank(m):
+    token = m.group(0)
+    if token[0] in '\'"`':
+        return token[0] + re.sub(r'[^\n]', ' ', token[1:-1]) + token[-1]
+    return re.sub(r'[^\n]', ' ', token)
+
+
+def mask(text):
+    return MASK_RE.sub(_blank, text)
+
+
+BRACKET_RE = re.compile(r"[()\[\]{}]")
+
+
+def close_of(masked, i):
+    """Index of the bracket closing masked[i]. Masked text has no strings or
+    comments left, so a plain bracket scan is enough (and much faster)."""
+    depth = 0
+    for m in BRACKET_RE.finditer(masked, i):
+        depth += 1 if m.group(0) in '([{' else -1
+        if depth == 0:
+            return m.start()
+    return len(masked) - 1
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# LOOP REGIONS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def loop_regions(masked):
+    """Returns [(start, end, kind, label, line)] for every per-element region."""
+    regions = []
+
+    for m in LOOP_RE.finditer(masked):
+        header_end = close_of(masked, m.end() - 1)
+        body_start = header_end + 1
+        while body_start < len(masked) and masked[body_start].isspace():
+            body_start += 1
+        if body_start < len(masked) and masked[body_start] == '{':
+            body_end = close_of(masked, body_start)
+        else:
+            body_end = masked.find(';', body_start)
+        header  = ' '.join(masked[m.end():header_end].split())
+        bounded = BOUNDED_RE.search(header)
+        kind    = 'bounded' if bounded and int(bounded.group(1)) <= MAX_BOUNDED_ITERATIONS else 'sequential'
+        regions.append((header_end, body_end, kind, f'{m.group(1)} ({header})',
+                        line_of(masked, m.start())))
+
+    for m in ITER_RE.finditer(masked):
+        paren = m.end() - 1
+        end   = close_of(masked, paren)
+        body  = masked[paren + 1:end].lstrip()
+        is_async = body.startswith('async')
+        method = m.group(2)
+
+        # A map that reaches a DB call returns one promise per element,
+        # whether or not the callback is declared async
+        if method in ('map', 'flatMap'):
+            kind = 'fan-out'
+        elif method == 'forEach' and is_async:
+            kind = 'fire-and-forget'
+        else:
+            kind = 'sequential' if is_async else 'callback'
+
+        regions.append((paren, end, kind, f'{m.group(1)}.{method}(…)', line_of(masked, m.start())))
+
+    return regions
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# DB CALLS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def db_calls(text, masked):
+    """Returns [(pos, target, method, argument text)]."""
+    models = dict(IMPORT_RE.findall(text))
+    calls  = []
+
+    for m in MODEL_CALL_RE.finditer(masked):
+        if m.group(1) in models:
+            paren = m.end() - 1
+            args  = text[paren + 1:close_of(masked, paren)]
+            calls.append((m.start(), models[m.group(1)], m.group(2), ' '.join(args.split())))
+
+    for m in DRIVER_RE.finditer(text):
+        if masked[m.start()] == '.':
+            paren = m.end() - 1
+            args  = text[paren + 1:close_of(masked, paren)]
+            calls.append((m.start(), f"collection('{m.group(1)}')", m.group(2), ' '.join(args.split())))
+
+    for m in SAVE_RE.finditer(masked):
+        calls.append((m.start(), m.group(1), 'save', ''))
+
+    return calls
+
+
+def _source_query(text, masked, label, before):
+    """For `requests.map(…)`, finds `requests = await Model.method(` above it."""
+    name = re.match(r'[\w]+', label)
+    if not name:
+        return None
+    assign = re.compile(r"\b" + re.escape(name.group(0)) +
+                        r"\s*=\s*await\s+(\w+)\s*\.\s*(\w+)\s*\(")
+    found = list(assign.finditer(masked, 0, before))
+    if not found:
+        return None
+    m = found[-1]
+    return f'{name.group(0)} = {m.group(1)}.{m.group(2)}(…) (line {line_of(text, m.start())})'
+
+
+def suggestion(target, method, args):
+    field = re.match(r'\s*\w+\s*\.\s*(\w+)\s*(?:\|\||$)', args)
+    if method == 'save':
+        return 'collect the documents and write them with one Model.bulkWrite([...]) (insertMany for new ones)'
+    if method in WRITE_METHODS:
+        if method in ('create', 'insertOne'):
+            return f'collect the documents and call {target}.insertMany(docs) once'
+        return f'collect the updates and send one {target}.bulkWrite([...])'
+    if method == 'findById' or (method == 'findOne' and '_id' in args):
+        hint = f"populate('{field.group(1)}') on the query that produced the list, or " if field else ''
+        return (f'{hint}one {target}.find({{ _id: {{ $in: ids }} }}) before the loop '
+                f'and a Map lookup by _id inside it')
+    if method == 'countDocuments':
+        return f'one {target}.aggregate([{{ $match: {{ key: {{ $in: keys }} }} }}, {{ $group: {{ _id: "$key", n: {{ $sum: 1 }} }} }}])'
+    batched = 'find' if method == 'findOne' else method
+    return f'one {target}.{batched}({{ key: {{ $in: keys }} }}) before the loop, grouped by key in memory'
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ANALYSIS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def display_path(path):
+    """Relative to dmis-api/ where possible; files outside it keep the path given."""
+    try:
+        return path.relative_to(API_DIR).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def analyse_file(path):
+    text    = path.read_text(encoding='utf-8', errors='replace')
+    masked  = mask(text)
+    calls   = db_calls(text, masked)
+    if not calls:
+        return []
+
+    regions  = loop_regions(masked)
+    findings = []
+    per_loop = {}
+
+    for pos, target, method, args in calls:
+        enclosing = [r for r in regions if r[0] < pos < r[1] and r[2] not in ('callback', 'bounded')]
+        if not enclosing:
+            continue
+        enclosing.sort(key=lambda r: r[0])
+        innermost = enclosing[-1]
+        per_loop.setdefault(innermost, []).append(pos)
+        findings.append({
+            'pos':       pos,
+            'file':      display_path(path),
+            'line':      line_of(text, pos),
+            'call':      f'{target}.{method}',
+            'kind':      innermost[2],
+            'loop':      innermost[3],
+            'loopLine':  innermost[4],
+            'depth':     len(enclosing),
+            'source':    _source_query(text, masked, innermost[3], innermost[0]),
+            'suggest':   suggestion(target, method, args),
+            '_loop':     innermost,
+        })
+
+    for f in findings:
+        calls_in_loop = len(per_loop[f.pop('_loop')])
+        loops = 'N' if f['depth'] == 1 else '·'.join(['N', 'M', 'K', 'L'][:f['depth']])
+        f['callsPerIteration'] = calls_in_loop
+        f['roundTrips'] = f'≈{calls_in_loop}×{loops}' if calls_in_loop > 1 else f'≈{loops}'
+        del f['pos']
+
+    return findings
+
+
+def iter_files(roots):
+    for root in roots:
+        root = (API_DIR / root) if not Path(root).is_absolute() else Path(root)
+        if root.is_file():
+            yield root
+            continue
+        for folder, dirs, files in os.walk(root):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+            for name in sorted(files):
+                if name.endswith('.js'):
+                    yield Path(folder) / name
+
+
+def print_report(findings, n_files, elapsed_ms):
+    print(f'N+1 DETECTOR — {len(findings)} per-element DB calls in {n_files} files ({elapsed_ms:.1f} ms)\n')
+    for f in findings:
+        print(f"{f['file']}:{f['line']}  [{f['kind']}] {f['call']}  {f['roundTrips']} round trips")
+        print(f"    inside : {f['loop']} (line {f['loopLine']})")
+        if f['source']:
+            print(f"    over   : {f['source']}")
+        print(f"    batch  : {f['suggest']}")
+        print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Static N+1 query detector')
+    parser.add_argument('paths', nargs='*', default=['.'], help='Files or directories under dmis-api/')
+    parser.add_argument('--json', action='store_true', help='Machine-readable output')
+    args = parser.parse_args(argv)
+
+    start    = time.perf_counter()
+    files    = list(iter_files(args.paths))
+    findings = [f for path in files for f in analyse_file(path)]
+    elapsed  = (time.perf_counter() - start) * 1000
+
+    if args.json:
+        print(json.dumps({'filesScanned': len(files), 'elapsedMs': round(elapsed, 2),
+                          'findings': findings}, indent=2))
+    else:
+        print_report(findings, len(files), elapsed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,185 @@
-import os
-import json
+"""
+extract_model_refs.py
+---------------------
+Scans models/*.js for model names, collections, refs and declared indexes.
+
+With --advise it also works as an index advisor. It extracts the filter
+and sort key shapes of find / findOne / countDocuments (and the other
+filter-taking calls) in routes/ and controllers/, and reports every
+query shape that no declared index serves with a covering prefix
+(equality keys first, then sort keys). The report is ranked by how often
+each shape appears.
+
+Usage (from dmis-api/):
+  python scripts/extract_model_refs.py                  # model summary (JSON)
+  python scripts/extract_model_refs.py --advise         # index advisor report
+  python scripts/extract_model_refs.py --advise --json  # machine-readable, for CI
+  python scripts/extract_model_refs.py --advise --json --fail-on missing
+"""
+
 import re
+import sys
+import json
+import time
+import argparse
 from pathlib import Path
 
-dir_path = Path(__file__).resolve().parent.parent / 'models'
-results = []
-for file in sorted(dir_path.glob('*.js')):
+API_DIR    = Path(__file__).resolve().parent.parent
+MODELS_DIR = API_DIR / 'models'
+SCAN_DIRS  = ['routes', 'controllers']
+
+QUERY_METHODS = {
+    'find', 'findOne', 'countDocuments', 'exists',
+    'findOneAndUpdate', 'findOneAndDelete', 'updateOne', 'updateMany',
+    'deleteOne', 'deleteMany',
+}
+
+# Operators that still pin the key to fixed values (usable as an index prefix)
+EQUALITY_OPERATORS = {'$eq', '$in'}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# JS LEXING HELPERS
+# Just enough to skip strings/comments and match brackets — not a parser.
+# ─────────────────────────────────────────────────────────────────────────────
+
+CLOSING = {'(': ')', '[': ']', '{': '}'}
+
+
+def skip_string(text, i):
+    """text[i] is a quote; returns the index just past the closing quote."""
+    quote = text[i]
+    i += 1
+    while i < len(text):
+        if text[i] == '\\':
+            i += 2
+            continue
+        if text[i] == quote:
+            return i + 1
+        i += 1
+    return i
+
+
+def match_bracket(text, i):
+    """text[i] is ( [ or {; returns the index of its matching closer."""
+    stack = [CLOSING[text[i]]]
+    i += 1
+    while i < len(text) and stack:
+        ch = text[i]
+        if ch in '\'"`':
+            i = skip_string(text, i)
+            continue
+        if text.startswith('//', i):
+            i = text.find('\n', i)
+            i = len(text) if i < 0 else i
+            continue
+        if text.startswith('/*', i):
+            i = text.find('*/', i)
+            i = len(text) if i < 0 else i + 2
+            continue
+        if ch in CLOSING:
+            stack.append(CLOSING[ch])
+        elif stack and ch == stack[-1]:
+            stack.pop()
+            if not stack:
+                return i
+        i += 1
+    return len(text) - 1
+
+
+def split_top_level(text, sep=','):
+    """Splits on sep outside brackets and strings."""
+    parts, depth, start, i = [], 0, 0, 0
+    while i < len(text):
+        ch = text[i]
+        if ch in '\'"`':
+            i = skip_string(text, i)
+            continue
+        if ch in '([{':
+            depth += 1
+        elif ch in ')]}':
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+        i += 1
+    tail = text[start:].strip()
+    if tail:
+        parts.append(tail)
+    return parts
+
+
+def strip_comments(text):
+    out, i, start = [], 0, 0
+    while i < len(text):
+        if text[i] in '\'"`':
+            i = skip_string(text, i)
+            continue
+        if text.startswith('//', i):
+            end = text.find('\n', i)
+        elif text.startswith('/*', i):
+            end = text.find('*/', i)
+            end = end + 2 if end >= 0 else -1
+        else:
+            i += 1
+            continue
+        out.append(text[start:i])
+        i = start = len(text) if end < 0 else end
+    out.append(text[start:])
+    return ''.join(out)
+
+
+def line_of(text, pos):
+    return text.count('\n', 0, pos) + 1
+
+
+def object_entries(literal):
+    """
+    Top-level (key, value) pairs of a JS object literal '{ ... }'.
+    Shorthand entries give value None; spreads give key '...'.
+    """
+    body    = strip_comments(literal.strip()[1:-1])
+    entries = []
+    for part in split_top_level(body):
+        if part.startswith('...'):
+            entries.append(('...', part[3:].strip()))
+            continue
+        key, sep, value = part.partition(':')
+        key = key.strip().strip('\'"')
+        if key.startswith('['):
+            entries.append(('...', part))
+            continue
+        entries.append((key, value.strip() if sep else None))
+    return entries
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MODELS AND DECLARED INDEXES
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _index_keys(literal):
+    keys = []
+    for key, value in object_entries(literal):
+        direction = -1 if value and value.strip().startswith('-') else 1
+        keys.append([key, direction])
+    return keys
+
+
+def _field_indexes(schema_literal, prefix=''):
+    """Single-field indexes from `index: true` / `unique: true` field options."""
+    found = []
+    for key, value in object_entries(schema_literal):
+        if not value or not value.startswith('{') or key == '...':
+            continue
+        options = dict(object_entries(value))
+        if options.get('index') == 'true' or options.get('unique') == 'true':
+            found.append({'keys': [[prefix + key, 1]], 'unique': options.get('unique') == 'true'})
+        elif 'type' not in options:
+            found.extend(_field_indexes(value, prefix + key + '.'))
+    return found
+
+
+def parse_model(file):
     text = file.read_text(encoding='utf-8')
     model_match = re.search(r"export default mongoose\.model\(['\"](.*?)['\"]", text)
     model_name = model_match.group(1) if model_match else file.stem
@@ -13,11 +187,304 @@ for file in sorted(dir_path.glob('*.js')):
     collection = collection_match.group(1) if collection_match else None
     refs = sorted(set(re.findall(r"ref\s*:\s*['\"](.*?)['\"]", text)))
     idx_count = len(re.findall(r"\.index\(|index\(", text))
-    results.append({
+
+    indexes = [{'keys': [['_id', 1]], 'unique': True}]
+    schema = re.search(r"new\s+mongoose\.Schema\s*\(", text)
+    if schema:
+        start = text.index('{', schema.end())
+        indexes.extend(_field_indexes(text[start:match_bracket(text, start) + 1]))
+    for call in re.finditer(r"\.index\s*\(\s*\{", text):
+        paren   = text.index('(', call.start())
+        start   = call.end() - 1
+        end     = match_bracket(text, start)
+        options = text[end + 1:match_bracket(text, paren)]
+        indexes.append({
+            'keys':   _index_keys(text[start:end + 1]),
+            'unique': re.search(r"unique\s*:\s*true", options) is not None,
+        })
+
+    return {
         'file': file.name,
         'model': model_name,
         'collection': collection,
         'refs': refs,
         'indexCount': idx_count,
-    })
-print(json.dumps(results, indent=2))
+        'indexes': indexes,
+    }
+
+
+def load_models():
+    return [parse_model(file) for file in sorted(MODELS_DIR.glob('*.js'))]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# QUERY SHAPES
+# ─────────────────────────────────────────────────────────────────────────────
+
+IMPORT_RE = re.compile(r"import\s+(\w+)\s+from\s+['\"](?:\.\./)+models/(\w+)(?:\.js)?['\"]")
+CALL_RE   = re.compile(r"\b(\w+)\s*\.\s*(" + '|'.join(sorted(QUERY_METHODS)) + r")\s*\(")
+CHAIN_RE  = re.compile(r"\s*\.\s*(\w+)\s*\(")
+
+
+def model_imports(text, model_by_stem):
+    """Maps local identifiers to model names, e.g. Prediction → 'Prediction'."""
+    return {
+        ident: model_by_stem[stem]
+        for ident, stem in IMPORT_RE.findall(text)
+        if stem in model_by_stem
+    }
+
+
+def _classify_value(value):
+    if value is None or not value.startswith('{'):
+        return 'eq'
+    operators = {key for key, _ in object_entries(value)}
+    return 'eq' if operators and operators <= EQUALITY_OPERATORS else 'range'
+
+
+def _resolve_identifier(text, name, before):
+    """
+    Keys of `const name = { ... }` declared before the call, plus any
+    `name.key = ...` / `name['key'] = ...` assignments between the two.
+    """
+    decls = list(re.finditer(r"(?:const|let|var)\s+" + re.escape(name) + r"\s*=\s*\{", text[:before]))
+    if not decls:
+        return None
+    decl  = decls[-1]
+    start = decl.end() - 1
+    end   = match_bracket(text, start)
+    keys  = object_entries(text[start:end + 1])
+
+    assign = re.compile(re.escape(name) + r"""(?:\.(\w+)|\[['"]([\w.]+)['"]\])\s*=(?!=)\s*""")
+    for m in assign.finditer(text, end, before):
+        rhs = text[m.end():m.end() + 1]
+        keys.append((m.group(1) or m.group(2), '{$' if rhs == '{' else 'x'))
+    return keys
+
+
+def _filter_shape(text, arg, call_pos):
+    """Returns (equality keys, range keys, dynamic) for a filter argument."""
+    arg = arg.strip()
+    if not arg:
+        return [], [], False
+    if arg.startswith('{'):
+        entries = object_entries(arg)
+    elif re.fullmatch(r'\w+', arg):
+        entries = _resolve_identifier(text, arg, call_pos)
+        if entries is None:
+            return [], [], True
+    else:
+        return [], [], True
+
+    eq, rng, dynamic = [], [], False
+    for key, value in entries:
+        if key == '...' or key.startswith('$'):
+            dynamic = True
+        elif _classify_value(value) == 'eq':
+            eq.append(key)
+        else:
+            rng.append(key)
+    return eq, rng, dynamic
+
+
+def _sort_shape(arg):
+    arg = arg.strip()
+    if arg.startswith('{'):
+        return [(key, -1 if value and value.strip().startswith('-') else 1)
+                for key, value in object_entries(arg)]
+    if arg[:1] in '\'"':
+        return [(token.lstrip('-+'), -1 if token.startswith('-') else 1)
+                for token in arg.strip('\'"`').split()]
+    return []
+
+
+def extract_queries(file, model_by_stem):
+    text    = file.read_text(encoding='utf-8')
+    imports = model_imports(text, model_by_stem)
+    queries = []
+
+    for call in CALL_RE.finditer(text):
+        ident, method = call.group(1), call.group(2)
+        if ident not in imports:
+            continue
+
+        open_paren  = call.end() - 1
+        close_paren = match_bracket(text, open_paren)
+        args        = split_top_level(text[open_paren + 1:close_paren])
+        eq, rng, dynamic = _filter_shape(text, args[0] if args else '', call.start())
+
+        sort = []
+        if len(args) >= 3 and args[2].startswith('{'):
+            options = dict(object_entries(args[2]))
+            if options.get('sort'):
+                sort = _sort_shape(options['sort'])
+
+        # Follow the query-builder chain: .populate(...).sort(...).lean()
+        pos = close_paren + 1
+        while True:
+            link = CHAIN_RE.match(text, pos)
+            if not link:
+                break
+            paren = link.end() - 1
+            end   = match_bracket(text, paren)
+            if link.group(1) == 'sort':
+                sort = _sort_shape(text[paren + 1:end])
+            pos = end + 1
+
+        queries.append({
+            'model':   imports[ident],
+            'method':  method,
+            'eq':      sorted(set(eq)),
+            'range':   sorted(set(rng)),
+            'sort':    sort,
+            'dynamic': dynamic,
+            'site':    f'{file.relative_to(API_DIR).as_posix()}:{line_of(text, call.start())}',
+        })
+    return queries
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COVERAGE CHECK
+# MongoDB equality-sort-range rule: an index serves a query with a covering
+# prefix when its leading fields are exactly the equality keys (any order),
+# followed by the sort keys in order (all directions equal or all reversed).
+# ─────────────────────────────────────────────────────────────────────────────
+
+def covers(index, eq, sort, rng):
+    fields = [key for key, _ in index]
+    n_eq   = len(eq)
+    if set(fields[:n_eq]) != set(eq):
+        return False
+
+    if sort:
+        tail = index[n_eq:n_eq + len(sort)]
+        if [k for k, _ in tail] != [k for k, _ in sort]:
+            return False
+        same = all(d == sd for (_, d), (_, sd) in zip(tail, sort))
+        flip = all(d == -sd for (_, d), (_, sd) in zip(tail, sort))
+        return same or flip
+
+    if not eq and rng:
+        return bool(fields) and fields[0] in rng
+    return True
+
+
+def usable(index, eq, sort, rng):
+    """The index at least narrows the scan (its first field is constrained)."""
+    first = index[0][0]
+    return first in eq or first in rng or (not eq and sort and first == sort[0][0])
+
+
+def point_lookup(index, eq):
+    """Equality on every key of a unique index returns at most one document."""
+    return index['unique'] and {k for k, _ in index['keys']} <= set(eq)
+
+
+def suggest(eq, sort, rng, best):
+    """Equality keys in the order of the closest existing index, then sort, then range."""
+    leading = [k for k, _ in best] if best else []
+    ordered = [k for k in leading if k in eq] + [k for k in eq if k not in leading]
+    return [[k, 1] for k in ordered] + [list(s) for s in sort] + [[k, 1] for k in rng[:1]]
+
+
+def advise(models, queries):
+    index_by_model = {m['model']: m['indexes'] for m in models}
+    shapes = {}
+
+    for q in queries:
+        if not q['eq'] and not q['range'] and not q['sort'] and not q['dynamic']:
+            continue  # deliberate full collection read
+        key = (q['model'], tuple(q['eq']), tuple(q['range']), tuple(q['sort']))
+        shape = shapes.setdefault(key, {
+            'model': q['model'], 'eq': q['eq'], 'range': q['range'],
+            'sort': [[k, d] for k, d in q['sort']], 'dynamic': False,
+            'count': 0, 'sites': [],
+        })
+        shape['count'] += 1
+        shape['dynamic'] = shape['dynamic'] or q['dynamic']
+        shape['sites'].append(q['site'])
+
+    findings = []
+    for (model, eq, rng, sort), shape in shapes.items():
+        indexes = index_by_model.get(model, [{'keys': [['_id', 1]], 'unique': True}])
+        if any(point_lookup(idx, eq) or covers(idx['keys'], eq, sort, rng) for idx in indexes):
+            continue
+        partial = [idx['keys'] for idx in indexes if usable(idx['keys'], eq, sort, rng)]
+        # Prefer the partial index that pins the most equality keys up front
+        partial.sort(key=lambda keys: -sum(1 for k, _ in keys[:len(eq)] if k in eq))
+        best = partial[0] if partial else None
+        shape['status']    = 'partial' if partial else 'missing'
+        shape['bestIndex'] = best
+        shape['suggested'] = suggest(eq, sort, rng, best)
+        findings.append(shape)
+
+    findings.sort(key=lambda f: (f['status'] != 'missing', -f['count'], f['model']))
+    return findings
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# OUTPUT
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _fmt_keys(keys):
+    return '{ ' + ', '.join(f'{k}: {d}' for k, d in keys) + ' }' if keys else '-'
+
+
+def print_report(findings, n_files, n_queries, elapsed_ms):
+    print(f'INDEX ADVISOR — {n_queries} queries in {n_files} files, '
+          f'{len(findings)} shapes without a covering index ({elapsed_ms:.1f} ms)\n')
+    for rank, f in enumerate(findings, 1):
+        print(f"{rank:>2}. [{f['status']}] {f['model']}  ×{f['count']}")
+        print(f"    filter eq   : {', '.join(f['eq']) or '-'}")
+        if f['range']:
+            print(f"    filter range: {', '.join(f['range'])}")
+        if f['dynamic']:
+            print('    filter      : has keys that could not be resolved statically')
+        print(f"    sort        : {_fmt_keys(f['sort'])}")
+        if f['bestIndex']:
+            print(f"    best index  : {_fmt_keys(f['bestIndex'])} (narrows the scan, not covering)")
+        print(f"    suggest     : schema.index({_fmt_keys(f['suggested'])})")
+        for site in f['sites']:
+            print(f'      {site}')
+        print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Model summary and index advisor')
+    parser.add_argument('--advise', action='store_true', help='Check query shapes against indexes')
+    parser.add_argument('--json', action='store_true', help='Machine-readable advisor output')
+    parser.add_argument('--fail-on', choices=['missing', 'partial'], default=None,
+                        help='Exit 1 when findings at this level (or worse) exist')
+    args = parser.parse_args(argv)
+
+    models = load_models()
+    if not args.advise:
+        print(json.dumps(models, indent=2))
+        return 0
+
+    start         = time.perf_counter()
+    model_by_stem = {Path(m['file']).stem: m['model'] for m in models}
+    files         = [f for d in SCAN_DIRS for f in sorted((API_DIR / d).glob('**/*.js'))]
+    queries       = [q for f in files for q in extract_queries(f, model_by_stem)]
+    findings      = advise(models, queries)
+    elapsed_ms    = (time.perf_counter() - start) * 1000
+
+    if args.json:
+        print(json.dumps({
+            'filesScanned': len(files),
+            'queries':      len(queries),
+            'elapsedMs':    round(elapsed_ms, 2),
+            'findings':     findings,
+        }, indent=2))
+    else:
+        print_report(findings, len(files), len(queries), elapsed_ms)
+
+    if args.fail_on == 'missing':
+        return 1 if any(f['status'] == 'missing' for f in findings) else 0
+    if args.fail_on == 'partial':
+        return 1 if findings else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -190,6 +190,13 @@ const styles = {
     margin: "0 0 16px",
     lineHeight: 1.1,
   },
+  resultExplanation: {
+    fontSize: "var(--fs-helper)",
+    color: "var(--text-secondary)",
+    maxWidth: "640px",
+    margin: "16px auto 0",
+    lineHeight: 1.5,
+  },
   badgeRow: {
     display: "flex",
     flexWrap: "wrap",
@@ -311,6 +318,7 @@ const Forecasting = () => {
         avgDamageLevel:   Number(avgDamageLevel),
         estimatedFunding: data.estimatedFunding,
         formatted:        data.formatted,
+        explanation:      data.explanation,
       });
 
     } catch (err) {
@@ -497,6 +505,9 @@ const Forecasting = () => {
               {/* ── NEW: show damage level in result badges ── */}
               <span style={styles.badge}>Damage Level {latestResult.avgDamageLevel}</span>
             </div>
+            {latestResult.explanation && (
+              <p style={styles.resultExplanation}>{latestResult.explanation}</p>
+            )}
           </div>
         </div>
       )}
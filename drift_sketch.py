@@ -0,0 +1,416 @@
+"""
+drift_sketch.py
+===============
+Input drift monitoring for the funding model's live requests.
+Lesotho Disaster Management Authority.
+
+At train time disaster_funding_model.py saves drift_reference.json:
+  - numeric features  : bin edges (training min, deciles, max) and the
+                        training count in each bin, with one extra bin
+                        below the training minimum and one above the maximum
+  - categorical codes : training count per encoder class
+  - joint cells       : disaster type × severity × season × household
+                        quartile × damage band, with the training count in
+                        each, so requests in never-seen combinations show up
+                        even when every single feature looks in range
+
+predict.py --serve keeps the same fixed-size counters for live requests
+(DriftSketch.observe, a list append per request; binning is vectorised
+once per batch) and flushes them to drift_sketch.json every few seconds.
+
+Report: PSI and a binned KS statistic per feature, out-of-range shares,
+and the share of requests that landed in joint cells with no training
+rows.
+
+Usage:
+  python drift_sketch.py reference disaster_dataset.csv   # rebuild the reference only
+  python drift_sketch.py report
+  python drift_sketch.py report --sketch drift_sketch.json --reference drift_reference.json
+  python drift_sketch.py benchmark                        # per-request overhead
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import argparse
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+
+REFERENCE_PATH = "drift_reference.json"
+SKETCH_PATH    = "drift_sketch.json"
+
+CATEGORICAL    = {"disaster_type_enc": "le_disaster_type",
+                  "severity_enc":      "le_severity",
+                  "season_enc":        "le_season"}
+DECILES        = np.linspace(0.1, 0.9, 9)
+HOUSEHOLD_QS   = [0.25, 0.5, 0.75]
+DAMAGE_BANDS   = [2.0, 3.0]     # minor–moderate | moderate–severe | severe–destroyed
+
+BATCH_ROWS     = 4096
+FLUSH_SECONDS  = 5.0
+
+PSI_MODERATE   = 0.10
+PSI_MAJOR      = 0.25
+PSI_EPSILON    = 1e-4
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 1: TRAINING REFERENCE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _upper(x):
+    # Right edge that still includes the training maximum in the last bin
+    return float(np.nextafter(x, np.inf))
+
+
+def _bin(values, edges):
+    """0 below the first edge, len(edges) at/after the last, else 1..len-1."""
+    return np.searchsorted(edges, values, side="right")
+
+
+def _cell_layout(reference):
+    cells = reference["cells"]
+    sizes = [len(reference["features"][name]["labels"]) for name in CATEGORICAL]
+    sizes += [len(cells["household_edges"]) + 1, len(cells["damage_edges"]) + 1]
+    return sizes
+
+
+def cell_index(X, reference, feature_columns):
+    """Flat joint-cell index of each row."""
+    cells = reference["cells"]
+    parts = [X[:, feature_columns.index(name)].astype(np.int64) for name in CATEGORICAL]
+    parts.append(_bin(X[:, feature_columns.index("num_households")], cells["household_edges"]))
+    parts.append(_bin(X[:, feature_columns.index("avg_damage_level")], cells["damage_edges"]))
+    return np.ravel_multi_index(parts, _cell_layout(reference), mode="clip")
+
+
+def build_reference(X, encoders):
+    """Bin edges and training counts for every feature in feature_columns."""
+    feature_columns = encoders["feature_columns"]
+    reference       = {"feature_columns": feature_columns, "rows": int(len(X)), "features": {}}
+
+    for j, name in enumerate(feature_columns):
+        column = X[:, j]
+        if name in CATEGORICAL:
+            labels = [str(c) for c in encoders[CATEGORICAL[name]].classes_]
+            counts = np.bincount(column.astype(np.int64), minlength=len(labels))
+            reference["features"][name] = {"kind": "categorical", "labels": labels,
+                                           "counts": counts.tolist()}
+        else:
+            inner = np.quantile(column, DECILES)
+            edges = np.unique(np.concatenate([[column.min()], inner, [_upper(column.max())]]))
+            counts = np.bincount(_bin(column, edges), minlength=len(edges) + 1)
+            reference["features"][name] = {"kind": "numeric", "edges": edges.tolist(),
+                                           "min": float(column.min()), "max": float(column.max()),
+                                           "counts": counts.tolist()}
+
+    households = X[:, feature_columns.index("num_households")]
+    reference["cells"] = {
+        "household_edges": np.unique(np.concatenate([
+            [households.min()], np.quantile(households, HOUSEHOLD_QS), [_upper(households.max())],
+        ])).tolist(),
+        "damage_edges": [1.0] + DAMAGE_BANDS + [_upper(4.0)],
+    }
+    reference["cells"]["counts"] = np.bincount(
+        cell_index(X, reference, feature_columns),
+        minlength=int(np.prod(_cell_layout(reference))),
+    ).tolist()
+    return reference
+
+
+def save_reference(reference, path=REFERENCE_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(reference, f)
+    os.replace(tmp, path)
+
+
+def reference_digest(reference):
+    """Hash of the layout a sketch is counted against: columns, bin edges, labels."""
+    layout = {
+        "feature_columns": reference["feature_columns"],
+        "features": {name: [float(v) for v in spec["edges"]] if spec["kind"] == "numeric"
+                     else spec["labels"] for name, spec in reference["features"].items()},
+        "cells":    {key: [float(v) for v in reference["cells"][key]]
+                     for key in ("household_edges", "damage_edges")},
+    }
+    return hashlib.sha256(json.dumps(layout, sort_keys=True).encode()).hexdigest()
+
+
+def load_reference(path=REFERENCE_PATH):
+    with open(path) as f:
+        reference = json.load(f)
+    for spec in reference["features"].values():
+        if "edges" in spec:
+            spec["edges"] = np.asarray(spec["edges"])
+    for key in ("household_edges", "damage_edges"):
+        reference["cells"][key] = np.asarray(reference["cells"][key])
+    return reference
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 2: SERVING-SIDE SKETCH
+# ─────────────────────────────────────────────────────────────────────────────
+
+class DriftSketch:
+    """
+    Fixed-size live counters with the reference's layout. observe() only
+    appends the feature row to a bounded batch; the batch is binned with
+    one searchsorted per feature when it fills or at each flush.
+    """
+
+    def __init__(self, reference_path=REFERENCE_PATH, sketch_path=SKETCH_PATH):
+        self.reference       = load_reference(reference_path)
+        self.digest          = reference_digest(self.reference)
+        self.sketch_path     = sketch_path
+        self.feature_columns = self.reference["feature_columns"]
+        self.pending         = []
+        self.last_flush      = time.perf_counter_ns()
+
+        self.counts = {name: np.zeros(len(spec["counts"]), dtype=np.int64)
+                       for name, spec in self.reference["features"].items()}
+        self.cells  = np.zeros(len(self.reference["cells"]["counts"]), dtype=np.int64)
+        self.rows   = 0
+        self.since  = time.time()
+
+        # Keep accumulating across restarts of the predictor, but only into
+        # a sketch counted against these exact bins
+        if os.path.exists(sketch_path):
+            with open(sketch_path) as f:
+                saved = json.load(f)
+            if saved.get("reference_rows") == self.reference["rows"] and \
+                    saved.get("reference_digest") == self.digest:
+                self.counts = {name: np.asarray(saved["counts"][name], dtype=np.int64) for name in self.counts}
+                self.cells  = np.asarray(saved["cells"], dtype=np.int64)
+                self.rows   = saved["rows"]
+                self.since  = saved["since"]
+
+    def observe(self, row, now_ns=None):
+        """now_ns: a perf_counter_ns() reading the caller already took, saving a clock read."""
+        self.pending.append(row)
+        if len(self.pending) >= BATCH_ROWS:
+            self.fold()
+        now = time.perf_counter_ns() if now_ns is None else now_ns
+        if now - self.last_flush >= FLUSH_SECONDS * 1e9:
+            self.flush()
+
+    def fold(self):
+        if not self.pending:
+            return
+        n = len(self.pending)
+        X = np.fromiter(chain.from_iterable(self.pending), np.float64, n * len(self.feature_columns))
+        X = X.reshape(n, -1)
+        self.pending = []
+        for j, name in enumerate(self.feature_columns):
+            spec  = self.reference["features"][name]
+            slots = len(self.counts[name])
+            if spec["kind"] == "categorical":
+                index = np.clip(X[:, j].astype(np.int64), 0, slots - 1)
+            else:
+                index = _bin(X[:, j], spec["edges"])
+            self.counts[name] += np.bincount(index, minlength=slots)
+        self.cells += np.bincount(cell_index(X, self.reference, self.feature_columns),
+                                  minlength=len(self.cells))
+        self.rows  += len(X)
+
+    def flush(self):
+        self.fold()
+        self.last_flush = time.perf_counter_ns()
+        snapshot = {
+            "reference_rows":   self.reference["rows"],
+            "reference_digest": self.digest,
+            "feature_columns":  self.feature_columns,
+            "since":            self.since,
+            "updated":          time.time(),
+            "rows":             self.rows,
+            "counts":           {name: c.tolist() for name, c in self.counts.items()},
+            "cells":            self.cells.tolist(),
+        }
+        tmp = self.sketch_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, self.sketch_path)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 3: DRIFT REPORT
+# ─────────────────────────────────────────────────────────────────────────────
+
+def psi(expected, actual):
+    p = np.asarray(expected, dtype=np.float64)
+    q = np.asarray(actual, dtype=np.float64)
+    p = np.maximum(p / max(p.sum(), 1), PSI_EPSILON)
+    q = np.maximum(q / max(q.sum(), 1), PSI_EPSILON)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def binned_ks(expected, actual):
+    """KS distance between the two CDFs evaluated at the bin edges."""
+    p = np.cumsum(expected) / max(np.sum(expected), 1)
+    q = np.cumsum(actual) / max(np.sum(actual), 1)
+    return float(np.max(np.abs(p - q)))
+
+
+def _flag(value):
+    if value >= PSI_MAJOR:
+        return "MAJOR"
+    if value >= PSI_MODERATE:
+        return "moderate"
+    return ""
+
+
+def _describe_cell(flat, reference):
+    index = np.unravel_index(flat, _cell_layout(reference))
+    names = [reference["features"][name]["labels"][i] for name, i in zip(CATEGORICAL, index[:3])]
+
+    def band(edges, i, fmt):
+        if i == 0:
+            return f"<{fmt(edges[0])}"
+        if i >= len(edges):
+            return f">{fmt(edges[-1])}"
+        return f"{fmt(edges[i - 1])}–{fmt(edges[i])}"
+
+    cells = reference["cells"]
+    return (f"{names[0]} / {names[1]} / {names[2]}, "
+            f"households {band(cells['household_edges'], index[3], lambda v: f'{v:,.0f}')}, "
+            f"damage {band(cells['damage_edges'], index[4], lambda v: f'{v:.0f}')}")
+
+
+def report(sketch_path=SKETCH_PATH, reference_path=REFERENCE_PATH):
+    reference = load_reference(reference_path)
+    with open(sketch_path) as f:
+        sketch = json.load(f)
+
+    print("=" * 62)
+    print("INPUT DRIFT REPORT")
+    print("=" * 62)
+    if sketch.get("reference_digest") != reference_digest(reference):
+        print(f"\n  {sketch_path} was counted against different bins than {reference_path};")
+        print("  restart predict.py --serve to start a sketch for the current reference.\n")
+        return {}
+    since = time.strftime("%Y-%m-%d %H:%M", time.localtime(sketch["since"]))
+    print(f"\n  Live requests : {sketch['rows']:,} since {since}")
+    print(f"  Training rows : {reference['rows']:,}\n")
+    if not sketch["rows"]:
+        return {}
+
+    print(f"  {'Feature':<20} {'PSI':>7} {'KS':>6} {'< min':>7} {'> max':>7}  Flag")
+    summary = {}
+    for name in reference["feature_columns"]:
+        spec   = reference["features"][name]
+        live   = np.asarray(sketch["counts"][name])
+        value  = psi(spec["counts"], live)
+        if spec["kind"] == "numeric":
+            ks    = binned_ks(spec["counts"], live)
+            below = live[0] / sketch["rows"]
+            above = live[-1] / sketch["rows"]
+            flag  = _flag(value) or ("out of range" if below + above > 0 else "")
+            print(f"  {name:<20} {value:>7.3f} {ks:>6.3f} {below:>7.1%} {above:>7.1%}  {flag}")
+        else:
+            ks, below, above = None, 0.0, 0.0
+            flag = _flag(value)
+            unseen = [label for label, t, l in zip(spec["labels"], spec["counts"], live) if l and not t]
+            if unseen:
+                flag = (flag + " " if flag else "") + f"never in training: {', '.join(unseen)}"
+            print(f"  {name:<20} {value:>7.3f} {'—':>6} {'':>7} {'':>7}  {flag}")
+        summary[name] = {"psi": value, "ks": ks, "below_min": below, "above_max": above}
+
+    trained  = np.asarray(reference["cells"]["counts"])
+    live     = np.asarray(sketch["cells"])
+    empty    = (trained == 0) & (live > 0)
+    share    = live[empty].sum() / sketch["rows"]
+    print(f"\n  Requests in joint cells with no training rows: {share:.1%}")
+    for flat in np.argsort(-np.where(empty, live, 0))[:5]:
+        if not empty[flat]:
+            break
+        print(f"    {live[flat]:>8,}  {_describe_cell(flat, reference)}")
+    print(f"\n  PSI ≥ {PSI_MODERATE} moderate shift, ≥ {PSI_MAJOR} major shift.\n")
+
+    summary["unpopulated_share"] = float(share)
+    return summary
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 4: BENCHMARK
+# ─────────────────────────────────────────────────────────────────────────────
+
+def run_benchmark(requests=200_000, reference_path=REFERENCE_PATH):
+    """
+    Rows are shaped like build_feature_row's output (integer codes, then
+    floats), and each observe() gets a clock reading as the serve loop
+    passes one, so the figure is the sketch's own cost per request.
+    """
+    import tempfile
+    reference = load_reference(reference_path)
+    rng       = np.random.default_rng(0)
+    columns   = []
+    for name in reference["feature_columns"]:
+        spec = reference["features"][name]
+        if spec["kind"] == "categorical":
+            columns.append(rng.integers(0, len(spec["labels"]), requests).tolist())
+        else:
+            columns.append(rng.uniform(spec["min"], spec["max"] * 1.2, requests).tolist())
+    rows   = [list(row) for row in zip(*columns)]
+    stamps = (time.perf_counter_ns() + 1000 * np.arange(requests)).tolist()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sketch = DriftSketch(reference_path, os.path.join(tmp, "sketch.json"))
+        start  = time.perf_counter_ns()
+        for row, now in zip(rows, stamps):
+            sketch.observe(row, now)
+        sketch.flush()
+        took   = time.perf_counter_ns() - start
+
+    print("=" * 62)
+    print("DRIFT SKETCH OVERHEAD")
+    print("=" * 62)
+    print(f"\n  Requests observed : {requests:,}")
+    print(f"  Per request       : {took / requests:.0f} ns (append + amortised binning and flush)")
+    print(f"  Sketch size       : {sum(len(c) for c in sketch.counts.values()) + len(sketch.cells):,} counters\n")
+    return took / requests
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COMMAND LINE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Input drift sketches for the funding model")
+    sub    = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("reference")
+    p.add_argument("data", nargs="?", default="disaster_dataset.csv")
+    p.add_argument("--encoders", default="disaster_encoders.pkl")
+    p.add_argument("--out", default=REFERENCE_PATH)
+    p = sub.add_parser("report")
+    p.add_argument("--sketch", default=SKETCH_PATH)
+    p.add_argument("--reference", default=REFERENCE_PATH)
+    p = sub.add_parser("benchmark")
+    p.add_argument("--requests", type=int, default=200_000)
+    p.add_argument("--reference", default=REFERENCE_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "reference":
+        from disaster_funding_model import encode_features
+        with open(args.encoders, "rb") as f:
+            encoders = pickle.load(f)
+        X = encode_features(pd.read_csv(args.data), encoders)
+        save_reference(build_reference(X, encoders), args.out)
+        print(f"Saved {args.out} ({len(X):,} training rows)")
+    elif args.command == "report":
+        if not os.path.exists(args.sketch):
+            print(f"No sketch at {args.sketch} yet; run predict.py --serve first.")
+            return 1
+        report(args.sketch, args.reference)
+    else:
+        run_benchmark(args.requests, args.reference)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
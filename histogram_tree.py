@@ -0,0 +1,617 @@
+"""
+histogram_tree.py
+=================
+Histogram-binned, out-of-core training engine for the disaster funding
+Decision Tree. Lesotho Disaster Management Authority.
+
+DecisionTreeRegressor.fit needs the whole float64 X in memory. This engine
+never does: the training data is read in chunks, so memory scales with
+bins × nodes instead of rows.
+
+How it works:
+  1. Sketch   : one streaming pass finds at most 256 bins per feature.
+                Features with ≤256 distinct values (every categorical and
+                district column) keep one bin per value, so their split
+                thresholds are the same midpoints sklearn would choose.
+                Wider features (num_households, avg_damage_level) are cut
+                at quantiles of a uniform reservoir sample.
+  2. Bin      : a second pass writes uint8 bin codes and the float64 target
+                to .npy files on disk (memory-mapped).
+  3. Grow     : the tree is grown level by level. Each level is one pass
+                over the codes: rows are routed through the splits chosen
+                at the previous level, then count/sum histograms are
+                accumulated per (node, feature, bin). The best squared-error
+                split of every node is read off the cumulative histograms.
+  4. Export   : the grown nodes are written into a real sklearn Tree, so the
+                saved disaster_model.pkl is a DecisionTreeRegressor and
+                predict.py loads it unchanged.
+
+Usage:
+  python histogram_tree.py build     --csv disaster_dataset.csv --store hist_store
+  python histogram_tree.py train     --store hist_store --max-depth 7
+  python histogram_tree.py compare   --csv disaster_dataset.csv --max-depth 7
+  python histogram_tree.py benchmark --rows 1000000 10000000 50000000
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from sklearn.tree            import DecisionTreeRegressor
+from sklearn.tree._tree      import Tree, NODE_DTYPE
+from sklearn.model_selection import train_test_split
+from sklearn.metrics         import r2_score, mean_absolute_error
+
+from disaster_funding_model import build_encoders, encode_features
+
+
+MAX_BINS           = 256
+DEFAULT_CHUNK_ROWS = 1_000_000
+SKETCH_SAMPLE_ROWS = 262_144
+
+# Holdout R² of the histogram tree must stay within this distance of the
+# exact DecisionTreeRegressor trained at the same depth on the same split.
+ACCURACY_TOLERANCE_R2 = 0.01
+
+TREE_LEAF      = -1
+TREE_UNDEFINED = -2
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 1: CHUNK SOURCES
+# A chunk source is a zero-argument callable returning a fresh iterator of
+# (X, Y) chunks, so the data can be streamed more than once.
+# ─────────────────────────────────────────────────────────────────────────────
+
+def csv_chunk_source(filepath, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Streams disaster_dataset.csv-shaped files, encoded as in training."""
+    encoders = build_encoders()
+
+    def source():
+        for df in pd.read_csv(filepath, chunksize=chunk_rows):
+            yield encode_features(df, encoders), df["total_funding"].values.astype(np.float64)
+
+    return source
+
+
+def array_chunk_source(X, Y, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Wraps in-memory arrays so they can be binned like a file."""
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+
+    def source():
+        for start in range(0, len(X), chunk_rows):
+            yield X[start:start + chunk_rows], Y[start:start + chunk_rows]
+
+    return source
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 2: SKETCH BIN THRESHOLDS (streaming pass 1)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _midpoints(values):
+    values = np.unique(values)
+    return (values[:-1] + values[1:]) / 2.0
+
+
+def sketch_thresholds(source, max_bins=MAX_BINS, sample_rows=SKETCH_SAMPLE_ROWS, seed=42):
+    """
+    Returns (thresholds, n_rows, n_features).
+
+    thresholds[f] is a sorted array of at most max_bins - 1 cut points.
+    A value x falls in bin b = number of cut points strictly below x, so
+    "x <= thresholds[f][b]" is exactly "bin <= b".
+    """
+    rng          = np.random.default_rng(seed)
+    n_rows       = 0
+    distinct     = None
+    sample_keys  = np.empty(0)
+    sample_rows_ = None
+
+    for X, _ in source():
+        if distinct is None:
+            distinct     = [set() for _ in range(X.shape[1])]
+            sample_rows_ = np.empty((0, X.shape[1]))
+
+        n_rows += len(X)
+
+        for f, values in enumerate(distinct):
+            if values is not None:
+                values.update(np.unique(X[:, f]).tolist())
+                if len(values) > max_bins:
+                    distinct[f] = None
+
+        # Uniform reservoir: keep the rows with the smallest random keys
+        keys         = np.concatenate([sample_keys, rng.random(len(X))])
+        rows         = np.concatenate([sample_rows_, X])
+        if len(keys) > sample_rows:
+            keep     = np.argpartition(keys, sample_rows)[:sample_rows]
+            keys     = keys[keep]
+            rows     = rows[keep]
+        sample_keys  = keys
+        sample_rows_ = rows
+
+    if distinct is None:
+        raise ValueError("Training data is empty")
+
+    thresholds = []
+    for f, values in enumerate(distinct):
+        if values is not None:
+            thresholds.append(_midpoints(np.array(sorted(values))))
+            continue
+
+        column    = np.sort(sample_rows_[:, f])
+        uniques   = np.unique(column)
+        quantiles = np.quantile(column, np.linspace(0, 1, max_bins + 1)[1:-1])
+        # Snap every quantile to the gap just above it so no bin boundary
+        # ever falls inside a run of equal values
+        upper     = np.searchsorted(uniques, quantiles, side="right")
+        upper     = np.unique(upper[(upper > 0) & (upper < len(uniques))])
+        thresholds.append((uniques[upper - 1] + uniques[upper]) / 2.0)
+
+    return thresholds, n_rows, len(distinct)
+
+
+def bin_codes(X, thresholds):
+    codes = np.empty(X.shape, dtype=np.uint8)
+    for f, cuts in enumerate(thresholds):
+        codes[:, f] = np.searchsorted(cuts, X[:, f], side="left")
+    return codes
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 3: BINNED STORE (streaming pass 2)
+# codes.npy (uint8, rows × features) and target.npy (float64) on disk,
+# opened memory-mapped so only the chunk being processed is resident.
+# ─────────────────────────────────────────────────────────────────────────────
+
+class BinnedStore:
+
+    def __init__(self, codes, target, thresholds, path=None):
+        self.codes      = codes
+        self.target     = target
+        self.thresholds = thresholds
+        self.path       = path
+
+    @property
+    def n_rows(self):
+        return self.codes.shape[0]
+
+    @property
+    def n_features(self):
+        return self.codes.shape[1]
+
+    @classmethod
+    def build(cls, source, path=None, max_bins=MAX_BINS):
+        """Bins a chunk source. With path=None the store is kept in memory."""
+        thresholds, n_rows, n_features = sketch_thresholds(source, max_bins=max_bins)
+
+        if path is None:
+            codes  = np.empty((n_rows, n_features), dtype=np.uint8)
+            target = np.empty(n_rows, dtype=np.float64)
+        else:
+            os.makedirs(path, exist_ok=True)
+            codes  = np.lib.format.open_memmap(os.path.join(path, "codes.npy"), mode="w+",
+                                               dtype=np.uint8, shape=(n_rows, n_features))
+            target = np.lib.format.open_memmap(os.path.join(path, "target.npy"), mode="w+",
+                                               dtype=np.float64, shape=(n_rows,))
+
+        start = 0
+        for X, Y in source():
+            stop                = start + len(X)
+            codes[start:stop]   = bin_codes(X, thresholds)
+            target[start:stop]  = Y
+            start               = stop
+
+        if path is not None:
+            codes.flush()
+            target.flush()
+            with open(os.path.join(path, "thresholds.json"), "w") as f:
+                json.dump([cuts.tolist() for cuts in thresholds], f)
+
+        return cls(codes, target, thresholds, path)
+
+    @classmethod
+    def open(cls, path):
+        codes  = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        target = np.load(os.path.join(path, "target.npy"), mmap_mode="r")
+        with open(os.path.join(path, "thresholds.json")) as f:
+            thresholds = [np.array(cuts, dtype=np.float64) for cuts in json.load(f)]
+        return cls(codes, target, thresholds, path)
+
+    def new_node_ids(self):
+        """Scratch array holding the current node of every row."""
+        if self.path is None:
+            return np.zeros(self.n_rows, dtype=np.int32)
+        return np.lib.format.open_memmap(os.path.join(self.path, "node_ids.npy"), mode="w+",
+                                         dtype=np.int32, shape=(self.n_rows,))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 4: LEVEL-WISE GROWTH FROM CHUNKED HISTOGRAMS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _best_splits(count_hist, sum_hist, n, s, min_samples_leaf):
+    """
+    count_hist, sum_hist : (features, nodes, bins)
+    n, s                 : (nodes,) totals
+    Returns (gain, feature, bin) per node. gain is the squared-error
+    reduction proxy sklearn uses: S_L²/n_L + S_R²/n_R - S²/n.
+    """
+    n_left = np.cumsum(count_hist, axis=2)
+    s_left = np.cumsum(sum_hist, axis=2)
+    n_right = n[None, :, None] - n_left
+    s_right = s[None, :, None] - s_left
+
+    valid = (n_left >= min_samples_leaf) & (n_right >= min_samples_leaf)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        proxy = s_left ** 2 / n_left + s_right ** 2 / n_right
+    proxy = np.where(valid, proxy, -np.inf)
+
+    n_features, n_nodes, n_bins = proxy.shape
+    flat  = proxy.transpose(1, 0, 2).reshape(n_nodes, n_features * n_bins)
+    best  = np.argmax(flat, axis=1)
+    gain  = flat[np.arange(n_nodes), best] - s ** 2 / n
+    feature, bin_ = best // n_bins, best % n_bins
+    return gain, feature, bin_, n_left[feature, np.arange(n_nodes), bin_]
+
+
+def grow_tree(store, max_depth=None, min_samples_split=2, min_samples_leaf=1,
+              chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Grows a squared-error regression tree over a BinnedStore, one pass over
+    the data per level. Returns the node table as a dict of lists.
+    """
+    max_depth = max_depth if max_depth is not None else np.iinfo(np.int32).max
+    n_bins    = MAX_BINS
+    n_feat    = store.n_features
+
+    nodes = {
+        "left": [TREE_LEAF], "right": [TREE_LEAF], "feature": [TREE_UNDEFINED],
+        "bin": [0], "n": [store.n_rows], "sum": [0.0], "sumsq": [0.0], "depth": [0],
+    }
+    node_ids = store.new_node_ids()
+    frontier = [0]
+
+    # Splits chosen at the previous level, applied lazily on the next pass
+    split_feature = np.full(1, -1, dtype=np.int64)
+    split_bin     = np.zeros(1, dtype=np.int64)
+    split_left    = np.zeros(1, dtype=np.int32)
+    split_right   = np.zeros(1, dtype=np.int32)
+
+    while frontier:
+        n_nodes  = len(nodes["n"])
+        frontier = np.asarray(frontier)
+
+        slot_of  = np.full(n_nodes, -1, dtype=np.int64)
+        slot_of[frontier] = np.arange(len(frontier))
+
+        depth      = nodes["depth"][frontier[0]]
+        splittable = [node for node in frontier
+                      if depth < max_depth and nodes["n"][node] >= min_samples_split]
+        hist_of    = np.full(n_nodes, -1, dtype=np.int64)
+        hist_of[splittable] = np.arange(len(splittable))
+
+        totals     = np.zeros((3, len(frontier)))
+        count_hist = np.zeros((n_feat, len(splittable) * n_bins))
+        sum_hist   = np.zeros((n_feat, len(splittable) * n_bins))
+
+        for start in range(0, store.n_rows, chunk_rows):
+            stop  = min(start + chunk_rows, store.n_rows)
+            codes = np.asarray(store.codes[start:stop])
+            y     = np.asarray(store.target[start:stop])
+            nid   = np.asarray(node_ids[start:stop])
+
+            # Route rows through the previous level's splits
+            pending = np.nonzero(split_feature[nid] >= 0)[0]
+            if len(pending):
+                parent  = nid[pending]
+                go_left = codes[pending, split_feature[parent]] <= split_bin[parent]
+                nid     = nid.copy()
+                nid[pending] = np.where(go_left, split_left[parent], split_right[parent])
+                node_ids[start:stop] = nid
+
+            slot = slot_of[nid]
+            rows = slot >= 0
+            if not rows.any():
+                continue
+            totals[0] += np.bincount(slot[rows], minlength=len(frontier))
+            totals[1] += np.bincount(slot[rows], weights=y[rows], minlength=len(frontier))
+            totals[2] += np.bincount(slot[rows], weights=y[rows] ** 2, minlength=len(frontier))
+
+            if splittable:
+                hslot = hist_of[nid]
+                rows  = hslot >= 0
+                base  = hslot[rows] * n_bins
+                yh    = y[rows]
+                for f in range(n_feat):
+                    idx = base + codes[rows, f]
+                    count_hist[f] += np.bincount(idx, minlength=count_hist.shape[1])
+                    sum_hist[f]   += np.bincount(idx, weights=yh, minlength=sum_hist.shape[1])
+
+        for i, node in enumerate(frontier):
+            nodes["n"][node]     = int(totals[0, i])
+            nodes["sum"][node]   = totals[1, i]
+            nodes["sumsq"][node] = totals[2, i]
+
+        split_feature = np.full(n_nodes, -1, dtype=np.int64)
+        split_bin     = np.zeros(n_nodes, dtype=np.int64)
+        split_left    = np.zeros(n_nodes, dtype=np.int32)
+        split_right   = np.zeros(n_nodes, dtype=np.int32)
+        next_frontier = []
+
+        if splittable:
+            n = np.array([nodes["n"][node] for node in splittable], dtype=np.float64)
+            s = np.array([nodes["sum"][node] for node in splittable])
+            q = np.array([nodes["sumsq"][node] for node in splittable])
+            gain, feature, bin_, n_left = _best_splits(
+                count_hist.reshape(n_feat, len(splittable), n_bins),
+                sum_hist.reshape(n_feat, len(splittable), n_bins),
+                n, s, min_samples_leaf,
+            )
+            # Same stopping rule as sklearn: pure nodes and no-gain splits stay leaves
+            sse = q - s ** 2 / n
+            for i, node in enumerate(splittable):
+                if not np.isfinite(gain[i]) or gain[i] <= 1e-12 * max(q[i], 1.0) or sse[i] <= 0:
+                    continue
+                left, right = len(nodes["n"]), len(nodes["n"]) + 1
+                for key, value in (("left", TREE_LEAF), ("right", TREE_LEAF),
+                                   ("feature", TREE_UNDEFINED), ("bin", 0),
+                                   ("n", 0), ("sum", 0.0), ("sumsq", 0.0), ("depth", depth + 1)):
+                    nodes[key].extend([value, value])
+                nodes["left"][node]    = left
+                nodes["right"][node]   = right
+                nodes["feature"][node] = int(feature[i])
+                nodes["bin"][node]     = int(bin_[i])
+                # Child sizes are known now; the sums arrive on the next pass
+                nodes["n"][left]       = int(n_left[i])
+                nodes["n"][right]      = int(n[i] - n_left[i])
+                next_frontier.extend([left, right])
+
+            new_size      = len(nodes["n"])
+            split_feature = np.resize(split_feature, new_size)
+            split_feature[n_nodes:] = -1
+            split_bin     = np.resize(split_bin, new_size)
+            split_left    = np.resize(split_left, new_size)
+            split_right   = np.resize(split_right, new_size)
+            for node in splittable:
+                if nodes["left"][node] != TREE_LEAF:
+                    split_feature[node] = nodes["feature"][node]
+                    split_bin[node]     = nodes["bin"][node]
+                    split_left[node]    = nodes["left"][node]
+                    split_right[node]   = nodes["right"][node]
+
+        frontier = next_frontier
+
+    return nodes
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 5: EXPORT AS A SKLEARN DecisionTreeRegressor
+# ─────────────────────────────────────────────────────────────────────────────
+
+def to_sklearn(nodes, thresholds, max_depth=None):
+    """Writes the node table into a fitted DecisionTreeRegressor."""
+    count  = len(nodes["n"])
+    n      = np.array(nodes["n"], dtype=np.float64)
+    mean   = np.array(nodes["sum"]) / np.maximum(n, 1)
+    impur  = np.maximum(np.array(nodes["sumsq"]) / np.maximum(n, 1) - mean ** 2, 0.0)
+
+    table = np.zeros(count, dtype=NODE_DTYPE)
+    table["left_child"]              = nodes["left"]
+    table["right_child"]             = nodes["right"]
+    table["feature"]                 = nodes["feature"]
+    table["threshold"]               = [
+        thresholds[f][b] if f >= 0 else TREE_UNDEFINED
+        for f, b in zip(nodes["feature"], nodes["bin"])
+    ]
+    table["impurity"]                = impur
+    table["n_node_samples"]          = nodes["n"]
+    table["weighted_n_node_samples"] = n
+
+    n_features = len(thresholds)
+    tree = Tree(n_features, np.array([1], dtype=np.intp), 1)
+    tree.__setstate__({
+        "max_depth":  int(max(nodes["depth"])),
+        "node_count": count,
+        "nodes":      table,
+        "values":     mean.reshape(count, 1, 1),
+    })
+
+    model = DecisionTreeRegressor(max_depth=max_depth, random_state=42)
+    model.n_features_in_ = n_features
+    model.n_outputs_     = 1
+    model.max_features_  = n_features
+    model.tree_          = tree
+    return model
+
+
+def train_histogram_tree(store, max_depth=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    nodes = grow_tree(store, max_depth=max_depth, chunk_rows=chunk_rows)
+    return to_sklearn(nodes, store.thresholds, max_depth=max_depth)
+
+
+def fit_histogram_tree(X, Y, max_depth=None):
+    """In-memory convenience wrapper used by disaster_funding_model.py."""
+    store = BinnedStore.build(array_chunk_source(X, Y))
+    return train_histogram_tree(store, max_depth=max_depth)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 6: ACCURACY CHECK AGAINST THE EXACT TREE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def compare_with_exact(filepath="disaster_dataset.csv", max_depth=7):
+    encoders = build_encoders()
+    df       = pd.read_csv(filepath)
+    X        = encode_features(df, encoders)
+    Y        = df["total_funding"].values.astype(np.float64)
+
+    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2, random_state=42)
+
+    exact = DecisionTreeRegressor(max_depth=max_depth, random_state=42).fit(X_train, Y_train)
+    hist  = fit_histogram_tree(X_train, Y_train, max_depth=max_depth)
+
+    results = {}
+    for name, model in (("exact", exact), ("histogram", hist)):
+        Y_pred = model.predict(X_test)
+        results[name] = {
+            "r2":    r2_score(Y_test, Y_pred),
+            "mae":   mean_absolute_error(Y_test, Y_pred),
+            "nodes": model.tree_.node_count,
+        }
+
+    delta = abs(results["exact"]["r2"] - results["histogram"]["r2"])
+
+    print("=" * 62)
+    print(f"HISTOGRAM vs EXACT TREE (depth {max_depth}, 20% holdout)")
+    print("=" * 62)
+    print(f"\n  {'Engine':<10}  {'R²':>8}  {'MAE (LSL)':>12}  {'Nodes':>6}")
+    for name, r in results.items():
+        print(f"  {name:<10}  {r['r2']:>8.4f}  {r['mae']:>12,.0f}  {r['nodes']:>6}")
+    print(f"\n  |ΔR²| = {delta:.4f}  (tolerance {ACCURACY_TOLERANCE_R2})")
+    print(f"  {'PASS' if delta <= ACCURACY_TOLERANCE_R2 else 'FAIL'}\n")
+
+    return delta <= ACCURACY_TOLERANCE_R2, results
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 7: SCALING BENCHMARK
+# Synthetic rows are resampled from disaster_dataset.csv with jitter on the
+# continuous columns, generated chunk by chunk so nothing is held in memory.
+# ─────────────────────────────────────────────────────────────────────────────
+
+def synthetic_chunk_source(filepath, n_rows, chunk_rows=DEFAULT_CHUNK_ROWS, seed=42):
+    encoders = build_encoders()
+    df       = pd.read_csv(filepath)
+    base_X   = encode_features(df, encoders)
+    base_Y   = df["total_funding"].values.astype(np.float64)
+    hh_col   = encoders["feature_columns"].index("num_households")
+    dmg_col  = encoders["feature_columns"].index("avg_damage_level")
+
+    def source():
+        for i, start in enumerate(range(0, n_rows, chunk_rows)):
+            rng  = np.random.default_rng((seed, i))
+            size = min(chunk_rows, n_rows - start)
+            pick = rng.integers(0, len(base_X), size)
+            X    = base_X[pick].copy()
+            jit  = rng.uniform(0.9, 1.1, size)
+            X[:, hh_col]  = np.round(X[:, hh_col] * jit)
+            X[:, dmg_col] = np.clip(np.round(X[:, dmg_col] + rng.normal(0, 0.05, size), 2), 1.0, 4.0)
+            yield X, base_Y[pick] * jit
+
+    return source
+
+
+def run_benchmark(row_counts, filepath="disaster_dataset.csv", max_depth=7,
+                  chunk_rows=DEFAULT_CHUNK_ROWS, workdir=None):
+    # resource is POSIX-only; on Windows the peak RSS column reads n/a
+    try:
+        import resource
+    except ImportError:
+        resource = None
+
+    print("=" * 62)
+    print(f"HISTOGRAM TREE SCALING BENCHMARK (depth {max_depth})")
+    print("=" * 62)
+    print(f"\n  {'Rows':>12}  {'Bin (s)':>8}  {'Grow (s)':>8}  {'Rows/s':>12}  {'Peak RSS':>10}  {'Nodes':>6}")
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for n_rows in row_counts:
+            path   = os.path.join(tmp, f"store_{n_rows}")
+            source = synthetic_chunk_source(filepath, n_rows, chunk_rows=chunk_rows)
+
+            t0    = time.perf_counter()
+            store = BinnedStore.build(source, path=path)
+            t1    = time.perf_counter()
+            model = train_histogram_tree(store, max_depth=max_depth, chunk_rows=chunk_rows)
+            t2    = time.perf_counter()
+
+            peak_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                       if resource else None)
+            result  = {
+                "rows":        n_rows,
+                "bin_seconds": t1 - t0,
+                "grow_seconds": t2 - t1,
+                "peak_rss_mb": peak_mb,
+                "nodes":       model.tree_.node_count,
+            }
+            results.append(result)
+            print(f"  {n_rows:>12,}  {t1 - t0:>8.1f}  {t2 - t1:>8.1f}  "
+                  f"{n_rows / (t2 - t1):>12,.0f}  "
+                  f"{f'{peak_mb:>8.0f}MB' if peak_mb is not None else 'n/a':>10}  {result['nodes']:>6}")
+
+            del store, model
+            for name in ("codes.npy", "target.npy", "node_ids.npy"):
+                os.remove(os.path.join(path, name))
+
+    print()
+    return results
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COMMAND LINE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Histogram-binned out-of-core tree trainer")
+    sub    = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Bin a CSV into an on-disk store")
+    build.add_argument("--csv", default="disaster_dataset.csv")
+    build.add_argument("--store", required=True)
+    build.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+
+    train = sub.add_parser("train", help="Grow a tree from a store and save it")
+    train.add_argument("--store", required=True)
+    train.add_argument("--max-depth", type=int, default=7)
+    train.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    train.add_argument("--output", default="disaster_model.pkl")
+
+    compare = sub.add_parser("compare", help="Check accuracy against the exact tree")
+    compare.add_argument("--csv", default="disaster_dataset.csv")
+    compare.add_argument("--max-depth", type=int, default=7)
+
+    bench = sub.add_parser("benchmark", help="Time binning and growth at increasing row counts")
+    bench.add_argument("--csv", default="disaster_dataset.csv")
+    bench.add_argument("--rows", type=int, nargs="+",
+                       default=[1_000_000, 5_000_000, 10_000_000, 50_000_000])
+    bench.add_argument("--max-depth", type=int, default=7)
+    bench.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    bench.add_argument("--workdir", default=None)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        store = BinnedStore.build(csv_chunk_source(args.csv, args.chunk_rows), path=args.store)
+        print(f"Binned {store.n_rows:,} rows × {store.n_features} features into {args.store}")
+        print(f"  Bins per feature: {[len(cuts) + 1 for cuts in store.thresholds]}")
+
+    elif args.command == "train":
+        store = BinnedStore.open(args.store)
+        model = train_histogram_tree(store, max_depth=args.max_depth, chunk_rows=args.chunk_rows)
+        with open(args.output, "wb") as f:
+            pickle.dump(model, f)
+        print(f"Saved {args.output} — {model.tree_.node_count} nodes, depth {model.get_depth()}")
+
+    elif args.command == "compare":
+        ok, _ = compare_with_exact(args.csv, args.max_depth)
+        return 0 if ok else 1
+
+    elif args.command == "benchmark":
+        run_benchmark(args.rows, args.csv, args.max_depth, args.chunk_rows, args.workdir)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,428 @@
+"""
+model_refresh.py
+================
+Refreshes the deployed disaster funding model from resolved predictions
+(records whose actualFunding has been filled in) without a full retrain.
+Lesotho Disaster Management Authority.
+
+Input: an export of the predictions collection, e.g.
+
+  mongoexport --db dmis --collection predictions \
+    --query '{"actualFunding": {"$ne": null}}' \
+    --jsonArray --out resolved_predictions.json
+
+JSON arrays and JSON lines are both accepted. District vulnerability
+values come from predict.district_profile over the published feature
+store table, exactly as for a live request.
+
+How a refresh works:
+  1. Score the new rows with the deployed model ("before" metrics) and
+     check them for drift against the training reference ranges. About
+     one row in five (chosen by id) is held out of the refresh.
+  2. If error and drift are within thresholds: keep the tree structure and
+     re-estimate node values. Every node's stored sample weight, mean and
+     impurity are combined with the sums of the new rows that pass
+     through it. The cost is proportional to new rows × depth, never to
+     the size of the history.
+  3. Otherwise: a full structural retrain on the original dataset plus all
+     accumulated feedback (feedback_history.csv).
+  4. Gate: the "after" metrics are measured on the held-out rows; a result
+     more than --max-regression worse than the deployed model there is
+     rejected.
+  5. Publish the result as a new version in model_registry/ with
+     before/after metrics, then swap it into disaster_model.pkl. Only then
+     are the rows appended to the history and their ids marked ingested,
+     so a failed or rejected refresh leaves them for the next run.
+
+Usage:
+  python model_refresh.py resolved_predictions.json
+  python model_refresh.py resolved_predictions.json --force-retrain
+  python model_refresh.py resolved_predictions.json --max-regression 0.10
+"""
+
+import os
+import sys
+import copy
+import zlib
+import json
+import pickle
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from predict import build_feature_row, district_profile
+from mongo_export import read_export, plain
+from disaster_funding_model import (
+    build_encoders, encode_features, find_optimal_depth, retrain_on_full_data,
+)
+from tree_explanations import build_explanations, save_explanations
+
+
+MODEL_PATH    = "disaster_model.pkl"
+ENCODERS_PATH = "disaster_encoders.pkl"
+DATASET_PATH  = "disaster_dataset.csv"
+REGISTRY_DIR  = "model_registry"
+
+# Above either threshold the tree structure is considered stale
+DEFAULT_MAX_MAPE       = 0.25   # mean absolute % error of the deployed model on new rows
+DEFAULT_MAX_DRIFT      = 0.10   # share of new rows outside the training feature ranges
+DEFAULT_MAX_REGRESSION = 0.05   # held-out MAE may exceed the deployed model's by this much
+
+HOLDOUT_EVERY          = 5      # ~1 in 5 new rows scores the refresh instead of feeding it
+MIN_HOLDOUT_BATCH      = 10
+
+DATASET_COLUMNS = [
+    "district", "disaster_type", "severity", "season", "num_households",
+    "avg_damage_level", "pct_elderly", "pct_children_u5", "pct_disabled",
+    "avg_household_size", "total_funding",
+]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 1: LOAD RESOLVED PREDICTIONS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def load_feedback(path, encoders, seen_ids=()):
+    """
+    Returns (ids, rows DataFrame in disaster_dataset.csv schema, X).
+    Records without actualFunding, already-ingested ids and unknown
+    districts are skipped.
+    """
+    seen    = set(seen_ids)
+    ids     = []
+    rows    = []
+    X       = []
+    skipped = 0
+
+    for record in read_export(path):
+        record_id = str(plain(record.get("_id", "")))
+        actual    = plain(record.get("actualFunding"))
+        try:
+            profile = district_profile(str(record.get("district") or ""))
+        except ValueError:
+            profile = None
+
+        if actual is None or record_id in seen or profile is None:
+            skipped += 1
+            continue
+
+        features = build_feature_row(
+            encoders,
+            record["disasterType"],
+            record["severity"],
+            record["season"],
+            plain(record["numHouseholds"]),
+            plain(record["avgDamageLevel"]),
+            profile["pct_elderly"],
+            profile["pct_children_u5"],
+            profile["pct_disabled"],
+            profile["avg_household_size"],
+        )
+        ids.append(record_id)
+        seen.add(record_id)
+        X.append(features)
+        rows.append([
+            record["district"], record["disasterType"], record["severity"], record["season"],
+            *features[3:], float(actual),
+        ])
+
+    print(f"  Resolved predictions: {len(ids)} new, {skipped} skipped")
+    return ids, pd.DataFrame(rows, columns=DATASET_COLUMNS), np.array(X, dtype=np.float64)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 2: METRICS AND DRIFT
+# ─────────────────────────────────────────────────────────────────────────────
+
+def batch_metrics(model, X, Y):
+    Y_pred = np.maximum(model.predict(X), 0)
+    error  = Y - Y_pred
+    nonzero = Y != 0
+    return {
+        "rows": int(len(Y)),
+        "mae":  float(np.abs(error).mean()),
+        "rmse": float(np.sqrt((error ** 2).mean())),
+        "mape": float(np.abs(error[nonzero] / Y[nonzero]).mean()) if nonzero.any() else 0.0,
+    }
+
+
+def reference_ranges(X):
+    return {"min": X.min(axis=0).tolist(), "max": X.max(axis=0).tolist()}
+
+
+def drift_fraction(X, reference):
+    """Share of rows with any feature outside the training min/max."""
+    low   = np.array(reference["min"])
+    high  = np.array(reference["max"])
+    out   = ((X < low) | (X > high)).any(axis=1)
+    return float(out.mean()) if len(X) else 0.0
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 3: LEAF VALUE RE-ESTIMATION (structure kept)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def refresh_node_values(model, X, Y, weight=1.0):
+    """
+    Returns a copy of model whose node means, sample counts and impurities
+    include the new rows. Split structure is untouched.
+    """
+    refreshed = copy.deepcopy(model)
+    state     = refreshed.tree_.__getstate__()
+    nodes     = state["nodes"].copy()
+    values    = state["values"].copy()
+
+    paths = model.decision_path(X).tocsc().T.tocsr()     # nodes × rows
+    w     = np.full(len(Y), float(weight))
+    add_n = np.asarray(paths.sum(axis=1)).ravel()
+    add_w = paths @ w
+    add_s = paths @ (w * Y)
+    add_q = paths @ (w * Y ** 2)
+
+    old_w    = nodes["weighted_n_node_samples"]
+    old_mean = values[:, 0, 0]
+    old_q    = (nodes["impurity"] + old_mean ** 2) * old_w
+
+    new_w    = old_w + add_w
+    new_mean = (old_mean * old_w + add_s) / new_w
+    new_q    = old_q + add_q
+
+    nodes["weighted_n_node_samples"] = new_w
+    nodes["n_node_samples"]          = nodes["n_node_samples"] + add_n.astype(np.int64)
+    nodes["impurity"]                = np.maximum(new_q / new_w - new_mean ** 2, 0.0)
+    values[:, 0, 0]                  = new_mean
+
+    state["nodes"]  = nodes
+    state["values"] = values
+    refreshed.tree_.__setstate__(state)
+    return refreshed
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 4: FULL STRUCTURAL RETRAIN
+# ─────────────────────────────────────────────────────────────────────────────
+
+def full_retrain(history_path, new_rows=None):
+    """Retrains on the dataset, the recorded feedback and this batch's fit rows."""
+    df = pd.read_csv(DATASET_PATH)
+    if os.path.exists(history_path):
+        df = pd.concat([df, pd.read_csv(history_path)], ignore_index=True)
+    if new_rows is not None:
+        df = pd.concat([df, new_rows], ignore_index=True)
+
+    encoders   = build_encoders()
+    X          = encode_features(df, encoders)
+    Y          = df["total_funding"].values.astype(np.float64)
+    depth, _   = find_optimal_depth(X, Y)
+    return retrain_on_full_data(depth, X, Y), reference_ranges(X)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 5: VERSIONED REGISTRY
+# model_registry/manifest.json lists every published version;
+# model_registry/vNNNN/disaster_model.pkl holds each one.
+# model_registry/ingested_ids.txt is append-only, one feedback _id a line,
+# so marking a batch ingested costs the batch, not the whole history.
+# ─────────────────────────────────────────────────────────────────────────────
+
+class ModelRegistry:
+
+    def __init__(self, root=REGISTRY_DIR):
+        self.root          = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.history_path  = os.path.join(root, "feedback_history.csv")
+        self.ingested_path = os.path.join(root, "ingested_ids.txt")
+
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            # Registries written before ingested_ids.txt kept the list inline
+            if "ingested_ids" in self.manifest:
+                self.mark_ingested(self.manifest.pop("ingested_ids"))
+                self.save()
+        else:
+            self.manifest = None
+
+    def bootstrap(self, model):
+        """Registers the currently deployed model as version 1 (one-off)."""
+        df = pd.read_csv(DATASET_PATH)
+        X  = encode_features(df, build_encoders())
+        self.manifest = {
+            "current":   None,
+            "reference": reference_ranges(X),
+            "versions":  [],
+        }
+        self.publish(model, "initial", rows=0, before=None, after=None, drift=0.0, deploy=False)
+
+    def publish(self, model, mode, rows, before, after, drift, deploy=True):
+        version = len(self.manifest["versions"]) + 1
+        folder  = os.path.join(self.root, f"v{version:04d}")
+        os.makedirs(folder, exist_ok=True)
+
+        path = os.path.join(folder, "disaster_model.pkl")
+        with open(path, "wb") as f:
+            pickle.dump(model, f)
+
+        self.manifest["versions"].append({
+            "version":        version,
+            "created":        datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "mode":           mode,
+            "parent":         self.manifest["current"],
+            "rows_ingested":  rows,
+            "drift_fraction": drift,
+            "metrics_before": before,
+            "metrics_after":  after,
+            "path":           path,
+        })
+        self.manifest["current"] = version
+
+        if deploy:
+            # Atomic swap so a concurrent predict.py never reads a half-written file
+            tmp = MODEL_PATH + ".tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(model, f)
+            os.replace(tmp, MODEL_PATH)
+
+            # Leaf values and sample counts changed, so the explanations did too
+            with open(ENCODERS_PATH, "rb") as f:
+                save_explanations(build_explanations(model, pickle.load(f)))
+
+        self.save()
+        return version
+
+    def ingested_ids(self):
+        if not os.path.exists(self.ingested_path):
+            return set()
+        with open(self.ingested_path) as f:
+            return {line.rstrip("\n") for line in f if line.strip()}
+
+    def mark_ingested(self, ids):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.ingested_path, "a") as f:
+            f.writelines(f"{record_id}\n" for record_id in ids)
+
+    def append_history(self, rows):
+        rows.to_csv(self.history_path, mode="a", index=False,
+                    header=not os.path.exists(self.history_path))
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 6: REFRESH
+# ─────────────────────────────────────────────────────────────────────────────
+
+def holdout_mask(ids):
+    """
+    Deterministic ~1/HOLDOUT_EVERY of the new rows, by id, kept out of the
+    refresh so the "after" metrics are measured on rows the model never saw.
+    Small batches are fit whole and their metrics labelled in-sample.
+    """
+    if len(ids) < MIN_HOLDOUT_BATCH:
+        return np.zeros(len(ids), dtype=bool)
+    mask = np.array([zlib.crc32(i.encode()) % HOLDOUT_EVERY == 0 for i in ids], dtype=bool)
+    if mask.all() or not mask.any():
+        mask = np.arange(len(ids)) % HOLDOUT_EVERY == 0
+    return mask
+
+
+def refresh(export_path, max_mape=DEFAULT_MAX_MAPE, max_drift=DEFAULT_MAX_DRIFT,
+            feedback_weight=1.0, force_retrain=False, registry_dir=REGISTRY_DIR,
+            max_regression=DEFAULT_MAX_REGRESSION):
+    print("=" * 62)
+    print("MODEL REFRESH FROM ACTUAL FUNDING")
+    print("=" * 62)
+
+    with open(MODEL_PATH, "rb") as f:
+        model = pickle.load(f)
+    with open(ENCODERS_PATH, "rb") as f:
+        encoders = pickle.load(f)
+
+    registry = ModelRegistry(registry_dir)
+    if registry.manifest is None:
+        registry.bootstrap(model)
+
+    ids, rows, X = load_feedback(export_path, encoders, registry.ingested_ids())
+    if not ids:
+        print("  Nothing new to ingest.\n")
+        return None
+
+    Y      = rows["total_funding"].values.astype(np.float64)
+    before = batch_metrics(model, X, Y)
+    drift  = drift_fraction(X, registry.manifest["reference"])
+    held   = holdout_mask(ids)
+    fit    = ~held if held.any() else np.ones(len(ids), dtype=bool)
+
+    print(f"  Before : MAE LSL {before['mae']:,.0f}  MAPE {before['mape']:.1%}")
+    print(f"  Drift  : {drift:.1%} of new rows outside training ranges")
+    print(f"  Split  : {int(fit.sum())} rows fit, {int(held.sum())} held out")
+
+    if force_retrain or before["mape"] > max_mape or drift > max_drift:
+        reason = "forced" if force_retrain else (
+            f"MAPE {before['mape']:.1%} > {max_mape:.0%}" if before["mape"] > max_mape
+            else f"drift {drift:.1%} > {max_drift:.0%}"
+        )
+        print(f"  Mode   : full structural retrain ({reason})\n")
+        refreshed, reference = full_retrain(registry.history_path, rows[fit])
+        mode = "full_retrain"
+    else:
+        print("  Mode   : leaf value refresh (structure kept)")
+        refreshed = refresh_node_values(model, X[fit], Y[fit], weight=feedback_weight)
+        reference = None
+        mode = "leaf_refresh"
+
+    if held.any():
+        baseline = batch_metrics(model, X[held], Y[held])
+        after    = {**batch_metrics(refreshed, X[held], Y[held]), "scope": "held_out",
+                    "deployed_mae": baseline["mae"]}
+        print(f"  After  : MAE LSL {after['mae']:,.0f}  MAPE {after['mape']:.1%} on held-out rows "
+              f"(deployed model: MAE LSL {baseline['mae']:,.0f})")
+        # Gate: a refresh that scores clearly worse on unseen rows is not published
+        if after["mae"] > baseline["mae"] * (1 + max_regression) and not force_retrain:
+            print("  Rejected: refreshed model is worse on the held-out rows; nothing recorded.\n")
+            return None
+    else:
+        after = {**batch_metrics(refreshed, X, Y), "scope": "in_sample"}
+        print(f"  After  : MAE LSL {after['mae']:,.0f}  MAPE {after['mape']:.1%} (in-sample fit, "
+              f"batch under {MIN_HOLDOUT_BATCH} rows)")
+
+    if reference is not None:
+        registry.manifest["reference"] = reference
+    version = registry.publish(refreshed, mode, len(ids), before, after, drift)
+
+    # Only now are the rows consumed: a failed or rejected publish leaves
+    # them to be picked up by the next refresh
+    registry.append_history(rows)
+    registry.mark_ingested(ids)
+
+    print(f"  Published version {version} → {MODEL_PATH}\n")
+    return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the funding model from actual funding")
+    parser.add_argument("export", help="JSON export of resolved predictions")
+    parser.add_argument("--max-mape", type=float, default=DEFAULT_MAX_MAPE)
+    parser.add_argument("--max-drift", type=float, default=DEFAULT_MAX_DRIFT)
+    parser.add_argument("--feedback-weight", type=float, default=1.0,
+                        help="Sample weight of a feedback row relative to a training row")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION,
+                        help="Allowed held-out MAE increase over the deployed model before rejecting")
+    parser.add_argument("--force-retrain", action="store_true")
+    parser.add_argument("--registry", default=REGISTRY_DIR)
+    args = parser.parse_args(argv)
+
+    refresh(args.export, args.max_mape, args.max_drift, args.feedback_weight,
+            args.force_retrain, args.registry, args.max_regression)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
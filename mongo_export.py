@@ -0,0 +1,72 @@
+"""
+mongo_export.py
+===============
+Readers for mongoexport files, shared by the jobs that consume the API's
+collections offline (model refresh, feature store, costing, optimiser,
+shadow evaluation, budget analytics).
+Lesotho Disaster Management Authority.
+
+  read_export  : whole file → list of documents (JSON array or JSON lines)
+  iter_export  : the same, streamed one document at a time
+  plain        : unwraps an extended-JSON scalar ({"$oid": ...},
+                 {"$date": ...}, {"$numberDouble": ...}); any other value,
+                 including ordinary one-field subdocuments, is returned as is
+"""
+
+import json
+
+
+# Wrappers mongoexport emits for scalar BSON types
+EXTENDED_JSON_KEYS = frozenset({
+    "$oid", "$date", "$numberInt", "$numberLong", "$numberDouble", "$numberDecimal",
+})
+
+
+def plain(value):
+    """Unwraps mongoexport extended JSON ({"$oid": ...}, {"$numberDouble": ...})."""
+    while isinstance(value, dict) and len(value) == 1 and next(iter(value)) in EXTENDED_JSON_KEYS:
+        # Canonical mode nests: {"$date": {"$numberLong": "..."}}
+        value = next(iter(value.values()))
+    return value
+
+
+def read_export(path):
+    with open(path) as f:
+        text = f.read().strip()
+    if not text:
+        return []
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def iter_export(path, block_bytes=1 << 20):
+    """
+    Yields records one at a time from a JSON array or JSON lines file
+    without loading the file: arrays are decoded object by object from a
+    sliding buffer.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buf = f.read(block_bytes).lstrip()
+        if not buf.startswith("["):
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        pos = 1
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                record, pos = decoder.raw_decode(buf, pos)
+                yield record
+            except json.JSONDecodeError:
+                more = f.read(block_bytes)
+                if not more:
+                    raise
+                buf, pos = buf[pos:] + more, 0
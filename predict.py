@@ -12,10 +12,10 @@ Node.js calls it like this:
     "Winter" \
     300 \
     2.8 \
-    0.12 \
-    0.18 \
-    0.07 \
-    6.0
+    "Mafeteng"
+
+or, with the four district values given explicitly:
+  python predict.py "Strong Winds" "Critical" "Winter" 300 2.8 0.12 0.18 0.07 6.0
 
 Arguments (in order):
   1. disaster_type     : "Heavy Rainfall" | "Strong Winds" | "Drought"
@@ -24,18 +24,36 @@ Arguments (in order):
   4. num_households    : integer — estimated number of affected households
   5. avg_damage_level  : float 1.0–4.0 — average damage level
                          1 = minor, 2 = moderate, 3 = severe, 4 = destroyed
+  6. district          : district name — its profile supplies args 6–9 below
+
+  or instead of the district name:
   6. pct_elderly       : float 0–1 — proportion of elderly households
   7. pct_children_u5   : float 0–1 — proportion of households with child under 5
   8. pct_disabled      : float 0–1 — proportion of households with disabled member
   9. avg_household_size: float — average household size in affected district
 
-District vulnerability values (args 6–9) should come from
-the district profiles stored in your backend, not entered manually
-by the user. The user only enters args 1–5.
+District profiles come from the table published by district_features.py
+(aggregated from household assessments), falling back to DISTRICT_PROFILES
+below for districts it does not cover. They are never entered by the user.
+
+With --explain a second line gives the reasoning behind the estimate:
+the simplified rules of the tree leaf it came from, precomputed in
+disaster_explanations.json (see tree_explanations.py).
+
+Long-running mode (JSON lines on stdin/stdout, model loaded once):
+  python predict.py --serve
+  python predict.py --serve --candidate candidate_model.pkl --shadow-fraction 0.1
+The second form also scores a sample of requests with a candidate model
+off the response path; see shadow_evaluation.py. When drift_reference.json
+exists, live feature counts are kept for drift_sketch.py report.
 """
 
+import os
 import sys
+import json
 import pickle
+from functools import lru_cache
+
 import numpy as np
 
 
@@ -52,8 +70,9 @@ SEVERITY_MINIMUMS = {
 }
 
 # Default district vulnerability profiles
-# Your Node.js backend should look up the selected district and pass
-# these values as arguments. This is the fallback if not provided.
+# Used for any district the published district table does not cover.
+PROFILE_FEATURES = ["pct_elderly", "pct_children_u5", "pct_disabled", "avg_household_size"]
+
 DISTRICT_PROFILES = {
     "Maseru":        {"pct_elderly": 0.08, "pct_children_u5": 0.12, "pct_disabled": 0.05, "avg_household_size": 4.5},
     "Berea":         {"pct_elderly": 0.10, "pct_children_u5": 0.15, "pct_disabled": 0.06, "avg_household_size": 5.5},
@@ -68,7 +87,33 @@ DISTRICT_PROFILES = {
 }
 
 
-def predict(
+# Assessment-derived profiles published by district_features.py. Where the
+# table exists it overrides DISTRICT_PROFILES for the districts it covers.
+DISTRICT_TABLE_PATH = os.path.join("feature_store", "district_profiles.json")
+
+
+@lru_cache(maxsize=None)
+def load_district_profiles(path=DISTRICT_TABLE_PATH):
+    """Loaded once per process: the published table over the defaults above."""
+    profiles = {name: dict(profile) for name, profile in DISTRICT_PROFILES.items()}
+    if os.path.exists(path):
+        with open(path) as f:
+            table = json.load(f)
+        for name, row in table["districts"].items():
+            profiles[name] = {key: row[key] for key in PROFILE_FEATURES}
+    return profiles
+
+
+def district_profile(district, path=DISTRICT_TABLE_PATH):
+    profiles = load_district_profiles(path)
+    for name, profile in profiles.items():
+        if name.lower() == " ".join(district.replace("’", "'").split()).lower():
+            return profile
+    raise ValueError(f'Unknown district: "{district}". Must be one of: {", ".join(profiles)}')
+
+
+def build_feature_row(
+    encoders,
     disaster_type,
     severity,
     season,
@@ -79,14 +124,11 @@ def predict(
     pct_disabled,
     avg_household_size,
 ):
-    # --- Load model ---
-    with open("disaster_model.pkl", "rb") as f:
-        model = pickle.load(f)
-
-    # --- Load encoders ---
-    with open("disaster_encoders.pkl", "rb") as f:
-        encoders = pickle.load(f)
-
+    """
+    Applies the input rules below and returns one feature row in
+    feature_columns order. Shared with model_refresh.py so feedback rows
+    are encoded exactly like live requests.
+    """
     le_disaster_type = encoders["le_disaster_type"]
     le_severity      = encoders["le_severity"]
     le_season        = encoders["le_season"]
@@ -109,17 +151,74 @@ def predict(
 
     # --- Build feature vector ---
     # Order must exactly match feature_columns in disaster_funding_model.py
-    X = np.array([[
-        le_disaster_type.transform([disaster_type])[0],
-        le_severity.transform([severity])[0],
-        le_season.transform([season])[0],
+    # Codes as plain ints: numpy scalars cost several times more to convert
+    # when the drift sketch batches rows into an array
+    return [
+        int(le_disaster_type.transform([disaster_type])[0]),
+        int(le_severity.transform([severity])[0]),
+        int(le_season.transform([season])[0]),
         num_households,
         avg_damage_level,
         pct_elderly,
         pct_children_u5,
         pct_disabled,
         avg_household_size,
-    ]])
+    ]
+
+
+def build_feature_matrix(encoders, rows):
+    """
+    Vectorised build_feature_row for many requests at once. rows is a
+    DataFrame with one column per build_feature_row argument; the same
+    minimums and clamps are applied column-wise.
+    """
+    minimums = rows["severity"].map(SEVERITY_MINIMUMS).fillna(10).to_numpy()
+
+    return np.column_stack([
+        encoders["le_disaster_type"].transform(rows["disaster_type"]),
+        encoders["le_severity"].transform(rows["severity"]),
+        encoders["le_season"].transform(rows["season"]),
+        np.maximum(rows["num_households"].to_numpy().astype(int), minimums),
+        np.clip(rows["avg_damage_level"].to_numpy(dtype=float), 1.0, 4.0),
+        np.clip(rows["pct_elderly"].to_numpy(dtype=float), 0.0, 1.0),
+        np.clip(rows["pct_children_u5"].to_numpy(dtype=float), 0.0, 1.0),
+        np.clip(rows["pct_disabled"].to_numpy(dtype=float), 0.0, 1.0),
+        np.maximum(rows["avg_household_size"].to_numpy(dtype=float), 1.0),
+    ]).astype(np.float64)
+
+
+def predict(
+    disaster_type,
+    severity,
+    season,
+    num_households,
+    avg_damage_level,
+    pct_elderly,
+    pct_children_u5,
+    pct_disabled,
+    avg_household_size,
+    explain=False,
+):
+    # --- Load model ---
+    with open("disaster_model.pkl", "rb") as f:
+        model = pickle.load(f)
+
+    # --- Load encoders ---
+    with open("disaster_encoders.pkl", "rb") as f:
+        encoders = pickle.load(f)
+
+    X = np.array([build_feature_row(
+        encoders,
+        disaster_type,
+        severity,
+        season,
+        num_households,
+        avg_damage_level,
+        pct_elderly,
+        pct_children_u5,
+        pct_disabled,
+        avg_household_size,
+    )])
 
     # --- Predict ---
     prediction = model.predict(X)[0]
@@ -130,46 +229,156 @@ def predict(
     # --- Print result for Node.js to read ---
     print(round(prediction))
 
+    if explain:
+        from tree_explanations import load_explanations, predict_explained, explanations_path
+        table    = load_explanations(model, encoders, explanations_path("disaster_model.pkl"))
+        _, texts = predict_explained(model, table, X)
+        print(texts[0])
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# LONG-RUNNING MODE
+# One JSON request per line on stdin, one JSON answer per line on stdout:
+#   {"id": "...", "disasterType": "Drought", "severity": "Critical",
+#    "season": "Winter", "numHouseholds": 300, "avgDamageLevel": 2.8,
+#    "district": "Mafeteng"}                         (or the four pct_* values)
+#   → {"id": "...", "estimatedFunding": 1234567, "explanation": "..."}
+# The model, encoders and explanation table are loaded once instead of on
+# every call.
+# ─────────────────────────────────────────────────────────────────────────────
+
+def request_row(encoders, request):
+    if request.get("district"):
+        profile = district_profile(str(request["district"]))
+    else:
+        profile = {key: request[key] for key in PROFILE_FEATURES}
+    return build_feature_row(
+        encoders,
+        request["disasterType"],
+        request["severity"],
+        request["season"],
+        request["numHouseholds"],
+        request["avgDamageLevel"],
+        **profile,
+    )
+
+
+def serve(argv):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(prog="predict.py --serve")
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--candidate", help="Candidate model .pkl to shadow-evaluate")
+    parser.add_argument("--shadow-fraction", type=float, default=0.10,
+                        help="Share of requests also scored by the candidate")
+    parser.add_argument("--shadow-cpu", type=float, default=0.05,
+                        help="Share of one core the candidate may use")
+    parser.add_argument("--shadow-log", default="shadow_log.bin")
+    parser.add_argument("--drift-sketch", default="drift_sketch.json",
+                        help="Where live feature counters are flushed (needs drift_reference.json)")
+    args = parser.parse_args(argv)
+
+    with open("disaster_model.pkl", "rb") as f:
+        model = pickle.load(f)
+    with open("disaster_encoders.pkl", "rb") as f:
+        encoders = pickle.load(f)
+
+    from tree_explanations import load_explanations, predict_explained, explanations_path
+    explanations = load_explanations(model, encoders, explanations_path("disaster_model.pkl"))
+
+    drift = None
+    if os.path.exists("drift_reference.json"):
+        from drift_sketch import DriftSketch
+        drift = DriftSketch("drift_reference.json", args.drift_sketch)
+
+    shadow = None
+    if args.candidate:
+        from shadow_evaluation import ShadowEvaluator
+        shadow = ShadowEvaluator(args.candidate, args.shadow_fraction, args.shadow_cpu, args.shadow_log)
+
+    try:
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            request_id = None
+            try:
+                request    = json.loads(line)
+                if not isinstance(request, dict):
+                    raise TypeError(f"Request must be a JSON object, got {type(request).__name__}")
+                request_id = request.get("id")
+                start      = time.perf_counter_ns()
+                row        = request_row(encoders, request)
+                values, texts = predict_explained(model, explanations, [row])
+                prediction = float(values[0])
+                finished   = time.perf_counter_ns()
+                elapsed_us = (finished - start) / 1000
+            except (ValueError, KeyError, TypeError) as e:
+                print(json.dumps({"id": request_id, "error": str(e)}), flush=True)
+                continue
+
+            print(json.dumps({"id": request_id, "estimatedFunding": round(prediction),
+                              "explanation": texts[0]}), flush=True)
+
+            # Only after the answer is out: monitoring never delays it
+            if drift:
+                drift.observe(row, finished)
+            if shadow:
+                shadow.submit(request_id, row, prediction, elapsed_us)
+    finally:
+        if drift:
+            drift.flush()
+        if shadow:
+            shadow.close()
+
 
 if __name__ == "__main__":
+    if "--serve" in sys.argv[1:]:
+        serve(sys.argv[1:])
+        sys.exit(0)
+
     """
     Expected call from Node.js:
       python predict.py <disaster_type> <severity> <season> <num_households>
                         <avg_damage_level> <pct_elderly> <pct_children_u5>
                         <pct_disabled> <avg_household_size>
 
-    The district vulnerability values (pct_elderly, pct_children_u5,
-    pct_disabled, avg_household_size) should be looked up from
-    DISTRICT_PROFILES in your Node.js backend using the selected district,
-    then passed here as arguments. The user does not enter these manually.
-
-    Example Node.js lookup:
-      const profiles = {
-        "Maseru":    { pct_elderly: 0.08, pct_children_u5: 0.12, pct_disabled: 0.05, avg_household_size: 4.5 },
-        "Mafeteng":  { pct_elderly: 0.12, pct_children_u5: 0.18, pct_disabled: 0.07, avg_household_size: 6.0 },
-        ...
-      };
-      const p = profiles[selectedDistrict];
-      const args = [disasterType, severity, season, numHouseholds,
-                    avgDamageLevel, p.pct_elderly, p.pct_children_u5,
-                    p.pct_disabled, p.avg_household_size];
+      python predict.py <disaster_type> <severity> <season> <num_households>
+                        <avg_damage_level> <district>
+
+    The district's vulnerability values (pct_elderly, pct_children_u5,
+    pct_disabled, avg_household_size) are looked up here from the
+    published district table. The 9-argument form with explicit values
+    is still accepted. --explain may be added anywhere.
     """
 
-    if len(sys.argv) != 10:
-        print("ERROR: Expected 9 arguments.", file=sys.stderr)
+    explain = "--explain" in sys.argv[1:]
+    if explain:
+        sys.argv.remove("--explain")
+
+    if len(sys.argv) not in (7, 10):
+        print("ERROR: Expected 6 or 9 arguments.", file=sys.stderr)
         print("Usage: python predict.py <disaster_type> <severity> <season>", file=sys.stderr)
-        print("       <num_households> <avg_damage_level> <pct_elderly>", file=sys.stderr)
+        print("       <num_households> <avg_damage_level> <district>", file=sys.stderr)
+        print("   or: ... <avg_damage_level> <pct_elderly>", file=sys.stderr)
         print("       <pct_children_u5> <pct_disabled> <avg_household_size>", file=sys.stderr)
         sys.exit(1)
 
+    if len(sys.argv) == 7:
+        try:
+            profile = district_profile(sys.argv[6])
+        except ValueError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        profile = dict(zip(PROFILE_FEATURES, sys.argv[6:10]))
+
     predict(
         disaster_type      = sys.argv[1],
         severity           = sys.argv[2],
         season             = sys.argv[3],
         num_households     = sys.argv[4],
         avg_damage_level   = sys.argv[5],
-        pct_elderly        = sys.argv[6],
-        pct_children_u5    = sys.argv[7],
-        pct_disabled       = sys.argv[8],
-        avg_household_size = sys.argv[9],
+        explain            = explain,
+        **profile,
     )
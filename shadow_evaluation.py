@@ -0,0 +1,289 @@
+"""
+shadow_evaluation.py
+====================
+Shadow evaluation of a candidate funding model next to production.
+Lesotho Disaster Management Authority.
+
+`python predict.py --serve --candidate candidate_model.pkl` keeps both
+models loaded. For a configurable fraction of requests the production
+answer is written first. The features and the production result are then
+handed to a separate worker process, which scores the candidate and
+appends the pair to a log.
+
+Production latency is protected three ways:
+  - the hand-off is a non-blocking put on a short queue; if the worker is
+    behind, the sample is dropped, never queued up
+  - the worker is a separate process (no shared GIL) at lower priority
+  - the worker holds a CPU budget: a token bucket filled at
+    cpu_budget × wall time, drained by the CPU time each candidate call
+    actually used; samples that arrive with the bucket empty are dropped
+
+Log: fixed-size binary records (SHADOW_DTYPE, ~90 bytes), append-only, so
+a crash can lose at most the unflushed tail. Counters (sampled, dropped
+as queue-full, dropped over budget, CPU used) go to <log>.stats.json.
+
+Report:
+  python shadow_evaluation.py report shadow_log.bin
+  python shadow_evaluation.py report shadow_log.bin --actuals predictions.json
+
+--actuals is a mongoexport of the predictions collection; records are
+joined on the request id the caller passed (the Prediction _id).
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import pickle
+import random
+import argparse
+import multiprocessing as mp
+
+import numpy as np
+
+from mongo_export import read_export, plain
+
+
+SHADOW_LOG         = "shadow_log.bin"
+DEFAULT_FRACTION   = 0.10
+DEFAULT_CPU_BUDGET = 0.05    # share of one core the candidate may use
+QUEUE_SLOTS        = 8       # absorbs bursts only; beyond this samples are dropped
+BURST_SECONDS      = 0.25    # most CPU the worker can bank while idle
+FLUSH_SECONDS      = 1.0
+
+N_FEATURES = 9
+SHADOW_DTYPE = np.dtype([
+    ("ts",            "<f8"),
+    ("id",            "S24"),
+    ("production",    "<f8"),
+    ("candidate",     "<f8"),
+    ("production_us", "<f4"),
+    ("candidate_us",  "<f4"),
+    ("features",      "<f4", (N_FEATURES,)),
+])
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 1: SERVING SIDE
+# ─────────────────────────────────────────────────────────────────────────────
+
+class ShadowEvaluator:
+    """Used by predict.py --serve; submit() never blocks."""
+
+    def __init__(self, candidate_path, fraction=DEFAULT_FRACTION, cpu_budget=DEFAULT_CPU_BUDGET,
+                 log_path=SHADOW_LOG):
+        self.fraction   = fraction
+        self.queue      = mp.Queue(maxsize=QUEUE_SLOTS)
+        self.sampled    = mp.Value("q", 0, lock=False)
+        self.queue_full = mp.Value("q", 0, lock=False)
+        self.submit_ns  = mp.Value("q", 0, lock=False)
+        self.reported   = False
+        self.worker     = mp.Process(
+            target=_worker,
+            args=(candidate_path, self.queue, log_path, cpu_budget,
+                  self.sampled, self.queue_full, self.submit_ns),
+            daemon=True,
+        )
+        self.worker.start()
+
+    def submit(self, request_id, features, production, production_us):
+        if random.random() >= self.fraction:
+            return
+        start = time.perf_counter_ns()
+        self.sampled.value += 1
+        try:
+            self.queue.put_nowait((time.time(), request_id or "", features, production, production_us))
+        except queue.Full:
+            self.queue_full.value += 1
+            # A dead worker looks exactly like a busy one from here; say so once
+            if not self.reported and not self.worker.is_alive():
+                self._report_exit()
+        self.submit_ns.value += time.perf_counter_ns() - start
+
+    def close(self, timeout=5.0):
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.worker.join(timeout)
+        if self.worker.is_alive():
+            self.worker.terminate()
+        elif self.worker.exitcode and not self.reported:
+            self._report_exit()
+
+    def _report_exit(self):
+        self.reported = True
+        print(f"WARNING: shadow worker exited with code {self.worker.exitcode}; "
+              "candidate samples are being dropped", file=sys.stderr, flush=True)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 2: WORKER PROCESS
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _write_stats(path, stats):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(stats, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _worker(candidate_path, jobs, log_path, cpu_budget, sampled, queue_full, submit_ns):
+    # os.nice is POSIX-only; elsewhere the worker runs at normal priority
+    if hasattr(os, "nice"):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+    with open(candidate_path, "rb") as f:
+        candidate = pickle.load(f)
+
+    stats_path = log_path + ".stats.json"
+    stats      = {"candidate": candidate_path, "cpu_budget": cpu_budget, "started": time.time(),
+                  "processed": 0, "dropped_budget": 0, "cpu_seconds": 0.0}
+    allowance  = BURST_SECONDS * cpu_budget
+    last       = time.monotonic()
+    pending    = []
+    flushed    = last
+
+    with open(log_path, "ab") as log:
+        while True:
+            try:
+                job = jobs.get(timeout=FLUSH_SECONDS)
+            except queue.Empty:
+                job = False
+
+            now       = time.monotonic()
+            allowance = min(BURST_SECONDS * cpu_budget, allowance + (now - last) * cpu_budget)
+            last      = now
+
+            if job:
+                if allowance <= 0:
+                    stats["dropped_budget"] += 1
+                else:
+                    ts, request_id, features, production, production_us = job
+                    cpu0 = time.process_time()
+                    t0   = time.perf_counter()
+                    pred = max(0.0, float(candidate.predict(np.asarray([features], dtype=np.float64))[0]))
+                    wall = time.perf_counter() - t0
+                    used = time.process_time() - cpu0
+                    allowance          -= used
+                    stats["cpu_seconds"] += used
+                    stats["processed"]   += 1
+                    pending.append((ts, str(request_id)[:24].encode(), production, pred,
+                                    production_us, wall * 1e6, features))
+
+            if pending and (job is None or now - flushed >= FLUSH_SECONDS):
+                log.write(np.array(pending, dtype=SHADOW_DTYPE).tobytes())
+                log.flush()
+                pending = []
+            if job is None or now - flushed >= FLUSH_SECONDS:
+                flushed = now
+                stats.update(sampled=sampled.value, dropped_queue_full=queue_full.value,
+                             submit_seconds=submit_ns.value / 1e9)
+                _write_stats(stats_path, stats)
+            if job is None:
+                return
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 3: REPORT
+# ─────────────────────────────────────────────────────────────────────────────
+
+def read_log(path):
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=SHADOW_DTYPE)
+    raw   = np.fromfile(path, dtype=np.uint8)
+    whole = len(raw) - len(raw) % SHADOW_DTYPE.itemsize   # ignore a torn final record
+    return raw[:whole].view(SHADOW_DTYPE)
+
+
+def load_actuals(path):
+    actuals = {}
+    for record in read_export(path):
+        value = plain(record.get("actualFunding"))
+        if value is not None:
+            actuals[str(plain(record.get("_id")))] = float(value)
+    return actuals
+
+
+def _pct(values, q):
+    return float(np.percentile(values, q)) if len(values) else float("nan")
+
+
+def report(log_path, actuals_path=None):
+    records = read_log(log_path)
+    stats   = {}
+    if os.path.exists(log_path + ".stats.json"):
+        with open(log_path + ".stats.json") as f:
+            stats = json.load(f)
+
+    print("=" * 62)
+    print("SHADOW EVALUATION REPORT")
+    print("=" * 62)
+    if stats:
+        print(f"\n  Candidate          : {stats['candidate']}")
+        print(f"  Sampled requests   : {stats.get('sampled', 0):,}")
+        print(f"  Scored             : {stats['processed']:,}")
+        print(f"  Dropped (behind)   : {stats.get('dropped_queue_full', 0):,}")
+        print(f"  Dropped (budget)   : {stats['dropped_budget']:,}")
+        print(f"  Candidate CPU      : {stats['cpu_seconds']:.2f}s "
+              f"(budget {stats['cpu_budget']:.0%} of a core, in a separate process)")
+        if stats.get("sampled"):
+            print(f"  Hand-off cost      : {stats['submit_seconds'] / stats['sampled'] * 1e6:.1f} µs "
+                  f"per sampled request, after the response is written")
+    if not len(records):
+        print("\n  No paired predictions logged yet.\n")
+        return {}
+
+    prod, cand = records["production"], records["candidate"]
+    diff       = cand - prod
+    rel        = np.abs(diff) / np.maximum(np.abs(prod), 1.0)
+
+    print(f"\n  Paired predictions : {len(records):,}")
+    print(f"\n  Disagreement (candidate − production)")
+    print(f"    {'':<12} {'p50':>12} {'p90':>12} {'p99':>12} {'max':>12}")
+    print(f"    {'|Δ| LSL':<12} " + " ".join(f"{_pct(np.abs(diff), q):>12,.0f}" for q in (50, 90, 99, 100)))
+    print(f"    {'|Δ| / prod':<12} " + " ".join(f"{_pct(rel, q):>12.1%}" for q in (50, 90, 99, 100)))
+    for cut in (0.0, 0.05, 0.10, 0.25):
+        print(f"    share with |Δ| > {cut:>4.0%} : {(rel > cut + 1e-12).mean():.1%}")
+    print(f"    mean Δ (bias)        : {diff.mean():+,.0f} LSL")
+
+    print(f"\n  Latency per request (µs)")
+    print(f"    {'':<12} {'p50':>10} {'p99':>10}")
+    print(f"    {'production':<12} {_pct(records['production_us'], 50):>10.0f} {_pct(records['production_us'], 99):>10.0f}")
+    print(f"    {'candidate':<12} {_pct(records['candidate_us'], 50):>10.0f} {_pct(records['candidate_us'], 99):>10.0f}")
+
+    summary = {"pairs": int(len(records)), "median_rel_diff": _pct(rel, 50)}
+    if actuals_path:
+        actuals = load_actuals(actuals_path)
+        ids     = np.char.decode(records["id"], "ascii")
+        matched = np.array([i in actuals for i in ids])
+        print(f"\n  Resolved (actualFunding known): {matched.sum():,} of {len(records):,}")
+        if matched.any():
+            actual = np.array([actuals[i] for i in ids[matched]])
+            print(f"    {'':<12} {'MAE (LSL)':>14} {'MAPE':>8}")
+            for name in ("production", "candidate"):
+                err  = records[name][matched] - actual
+                mape = np.mean(np.abs(err) / np.maximum(actual, 1.0))
+                summary[f"{name}_mae"] = float(np.abs(err).mean())
+                print(f"    {name:<12} {np.abs(err).mean():>14,.0f} {mape:>8.1%}")
+    print()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shadow evaluation report")
+    sub    = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("report")
+    p.add_argument("log", nargs="?", default=SHADOW_LOG)
+    p.add_argument("--actuals", help="mongoexport of predictions with actualFunding")
+    args = parser.parse_args(argv)
+
+    report(args.log, args.actuals)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
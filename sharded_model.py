@@ -0,0 +1,256 @@
+"""
+sharded_model.py
+================
+Trains one Decision Tree per shard of the disaster funding data and a
+routing predictor that sends each request to its shard's tree.
+Lesotho Disaster Management Authority.
+
+Why shard:
+A single global tree spends its first levels separating Drought from
+Strong Winds from Heavy Rainfall, and Low from Critical, before it ever
+reaches household-level structure. A tree per disaster type (or per
+type × severity) starts directly on that structure, and the shards are
+independent, so they are fitted in parallel across cores.
+
+Shard keys:
+  - type           : one tree per disaster_type            (3 shards)
+  - type_severity  : one tree per disaster_type × severity (9 shards)
+
+Shards with fewer than --min-shard-rows training rows are not given their
+own tree; their requests fall back to the global model.
+
+The saved ShardedModel has the same predict(X) interface as
+DecisionTreeRegressor and takes the same 9-column feature matrix, so
+predict.py can load it in place of disaster_model.pkl.
+
+Usage:
+  python sharded_model.py --shard-by type_severity --workers 4
+"""
+
+import sys
+import time
+import pickle
+import argparse
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from sklearn.tree            import DecisionTreeRegressor
+from sklearn.model_selection import train_test_split, KFold, cross_val_score
+from sklearn.metrics         import r2_score, mean_absolute_error
+
+from disaster_funding_model import load_data, prepare_features
+
+
+SHARD_KEYS = {
+    "type":          ["disaster_type_enc"],
+    "type_severity": ["disaster_type_enc", "severity_enc"],
+}
+
+ENCODER_OF = {
+    "disaster_type_enc": "le_disaster_type",
+    "severity_enc":      "le_severity",
+}
+
+DEPTHS = [3, 5, 7, 10, 15, 20, None]
+
+DEFAULT_MIN_SHARD_ROWS = 50
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 1: ROUTING PREDICTOR
+# ─────────────────────────────────────────────────────────────────────────────
+
+class ShardedModel:
+    """
+    Routes every row to the tree of its shard, falling back to the global
+    tree for shards that had too little data. Batches are grouped by shard
+    so each tree is called once per batch, not once per row.
+    """
+
+    def __init__(self, shard_by, shard_columns, cardinalities, shard_models, global_model):
+        self.shard_by      = shard_by
+        self.shard_columns = shard_columns
+        self.cardinalities = cardinalities
+        self.shard_models  = shard_models
+        self.global_model  = global_model
+
+    def shard_keys(self, X):
+        codes = tuple(X[:, c].astype(np.int64) for c in self.shard_columns)
+        return np.ravel_multi_index(codes, self.cardinalities)
+
+    def predict(self, X):
+        X    = np.asarray(X, dtype=np.float64)
+        keys = self.shard_keys(X)
+        out  = np.empty(len(X), dtype=np.float64)
+
+        order           = np.argsort(keys, kind="stable")
+        uniq, starts    = np.unique(keys[order], return_index=True)
+        bounds          = np.append(starts, len(order))
+        for key, lo, hi in zip(uniq, bounds[:-1], bounds[1:]):
+            rows      = order[lo:hi]
+            model     = self.shard_models.get(int(key), self.global_model)
+            out[rows] = model.predict(X[rows])
+        return out
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 2: PER-SHARD TRAINING (runs in worker processes)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _select_depth(X, Y):
+    """Same 5-fold CV depth search as find_optimal_depth, without printing."""
+    n_splits = min(5, len(X))
+    kf       = KFold(n_splits=n_splits, shuffle=True, random_state=42)
+    scores   = {
+        depth: cross_val_score(DecisionTreeRegressor(max_depth=depth, random_state=42),
+                               X, Y, cv=kf, scoring="r2").mean()
+        for depth in DEPTHS
+    }
+    best = max(scores, key=scores.get)
+    return 20 if best is None else best
+
+
+def _fit_shard(job):
+    key, X, Y, depth = job
+    start = time.perf_counter()
+    if depth is None:
+        depth = _select_depth(X, Y)
+    model = DecisionTreeRegressor(max_depth=depth, random_state=42).fit(X, Y)
+    return key, model, depth, time.perf_counter() - start
+
+
+def train_sharded(X, Y, encoders, shard_by="type_severity",
+                  min_shard_rows=DEFAULT_MIN_SHARD_ROWS, workers=None, global_depth=None):
+    """
+    Fits the global fallback tree and one tree per populated shard, all in
+    parallel. Returns (ShardedModel, per-shard stats, wall seconds).
+    """
+    if min_shard_rows < 2:
+        # A shard's depth is chosen by k-fold CV, which needs two rows
+        raise ValueError(f"min_shard_rows must be at least 2, got {min_shard_rows}")
+    names         = SHARD_KEYS[shard_by]
+    shard_columns = [encoders["feature_columns"].index(name) for name in names]
+    cardinalities = tuple(len(encoders[ENCODER_OF[name]].classes_) for name in names)
+
+    router = ShardedModel(shard_by, shard_columns, cardinalities, {}, None)
+    keys   = router.shard_keys(X)
+
+    jobs  = [("global", X, Y, global_depth)]
+    small = {}
+    for key in np.unique(keys):
+        rows = keys == key
+        if rows.sum() >= min_shard_rows:
+            jobs.append((int(key), X[rows], Y[rows], None))
+        else:
+            small[int(key)] = int(rows.sum())
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        fitted = list(pool.map(_fit_shard, jobs))
+    wall = time.perf_counter() - start
+
+    stats = {}
+    for (key, model, depth, seconds), job in zip(fitted, jobs):
+        if key == "global":
+            router.global_model = model
+        else:
+            router.shard_models[key] = model
+        stats[key] = {
+            "rows":    len(job[1]),
+            "depth":   depth,
+            "nodes":   model.tree_.node_count,
+            "seconds": seconds,
+        }
+    for key, rows in small.items():
+        stats[key] = {"rows": rows, "depth": None, "nodes": 0, "seconds": 0.0}
+
+    return router, stats, wall
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 3: COMPARISON REPORT
+# ─────────────────────────────────────────────────────────────────────────────
+
+def shard_label(key, router, encoders):
+    if key == "global":
+        return "global (fallback)"
+    codes = np.unravel_index(key, router.cardinalities)
+    names = SHARD_KEYS[router.shard_by]
+    return " / ".join(
+        encoders[ENCODER_OF[name]].inverse_transform([int(code)])[0]
+        for name, code in zip(names, codes)
+    )
+
+
+def compare_with_single(X, Y, encoders, shard_by, min_shard_rows, workers):
+    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2, random_state=42)
+
+    start  = time.perf_counter()
+    depth  = _select_depth(X_train, Y_train)
+    single = DecisionTreeRegressor(max_depth=depth, random_state=42).fit(X_train, Y_train)
+    single_wall = time.perf_counter() - start
+
+    router, stats, sharded_wall = train_sharded(
+        X_train, Y_train, encoders, shard_by, min_shard_rows, workers,
+    )
+
+    print("=" * 62)
+    print(f"SHARDED ({shard_by}) vs SINGLE MODEL — 20% holdout")
+    print("=" * 62)
+    print(f"\n  {'Model':<10}  {'R²':>8}  {'MAE (LSL)':>12}  {'Train wall (s)':>14}")
+    for name, model, wall in (("single", single, single_wall), ("sharded", router, sharded_wall)):
+        Y_pred = model.predict(X_test)
+        print(f"  {name:<10}  {r2_score(Y_test, Y_pred):>8.4f}  "
+              f"{mean_absolute_error(Y_test, Y_pred):>12,.0f}  {wall:>14.2f}")
+
+    print(f"\n  Single tree: depth {single.get_depth()}, {single.tree_.node_count} nodes\n")
+    print(f"  {'Shard':<28}  {'Rows':>6}  {'Depth':>5}  {'Nodes':>6}  {'Fit (s)':>7}")
+    for key, s in sorted(stats.items(), key=lambda kv: str(kv[0])):
+        label = shard_label(key, router, encoders)
+        depth = s["depth"] if s["depth"] is not None else "→ global"
+        print(f"  {label:<28}  {s['rows']:>6}  {depth!s:>5}  {s['nodes']:>6}  {s['seconds']:>7.2f}")
+    print()
+
+    return router
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COMMAND LINE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train per-shard funding models in parallel")
+    parser.add_argument("--csv", default="disaster_dataset.csv")
+    parser.add_argument("--shard-by", choices=sorted(SHARD_KEYS), default="type_severity")
+    parser.add_argument("--min-shard-rows", type=int, default=DEFAULT_MIN_SHARD_ROWS)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (default: one per core)")
+    parser.add_argument("--output", default="disaster_model_sharded.pkl")
+    args = parser.parse_args(argv)
+    if args.min_shard_rows < 2:
+        parser.error("--min-shard-rows must be at least 2 (shard depth is chosen by cross-validation)")
+
+    df             = load_data(args.csv)
+    X, Y, encoders = prepare_features(df)
+
+    compare_with_single(X, Y, encoders, args.shard_by, args.min_shard_rows, args.workers)
+
+    # Deployment model: every shard refit on the full dataset
+    router, _, wall = train_sharded(
+        X, Y, encoders, args.shard_by, args.min_shard_rows, args.workers,
+    )
+    with open(args.output, "wb") as f:
+        pickle.dump(router, f)
+
+    print(f"Saved {args.output} — {len(router.shard_models)} shard models "
+          f"+ global fallback, fitted in {wall:.2f}s\n")
+    return 0
+
+
+if __name__ == "__main__":
+    # Run through the importable module so the pickled ShardedModel refers to
+    # sharded_model.ShardedModel, not __main__.ShardedModel, and predict.py
+    # can load it
+    import sharded_model
+    sys.exit(sharded_model.main())
@@ -0,0 +1,341 @@
+"""
+tree_compaction.py
+==================
+Post-training compaction of the funding model's Decision Tree.
+Lesotho Disaster Management Authority.
+
+Two kinds of waste are removed, without changing any prediction a valid
+request can receive:
+
+  1. Unreachable branches. Valid inputs are far narrower than the nine raw
+     feature ranges:
+       - disaster type, severity and season only take their encoder codes
+       - num_households is a whole number at or above the SEVERITY_MINIMUMS
+         of the request's severity (predict.py clamps it up)
+       - avg_damage_level is clamped to 1.0–4.0
+       - the four vulnerability features only take the district profile
+         tuples that predict.py looks up (load_district_profiles)
+     Each split narrows this domain down the path. When one side of a split
+     holds no valid input, the split is replaced by its other child.
+  2. Equal-valued subtrees. A split whose reachable leaves all carry the
+     same value is collapsed into one leaf (bottom-up, so whole subtrees
+     fold at once).
+
+The surviving nodes are renumbered breadth-first, so the top levels that
+every request walks sit next to each other in the node array.
+
+Equivalence is checked exhaustively, not by sampling. On the valid domain
+the tree is piecewise constant, and it changes value only at its own
+thresholds. So one point on each side of every threshold covers every
+region:
+  - households: floor(t) and floor(t) + 1
+  - damage: the float32 just at and just above t
+Together with all category codes and every district tuple, this grid
+reaches every cell of the partition. Both trees must agree on all of it.
+
+The compacted model is only valid for the district form of predict.py.
+The 9-argument form with explicit vulnerability values lies outside the
+declared domain. Re-run after district_features.py publishes a new table.
+
+Usage:
+  python tree_compaction.py                                  # disaster_model.pkl → disaster_model_compact.pkl
+  python tree_compaction.py --model disaster_model.pkl --out disaster_model_compact.pkl
+  python tree_compaction.py --district-table feature_store/v0003.json
+"""
+
+import os
+import sys
+import time
+import pickle
+import argparse
+from itertools import product
+
+import numpy as np
+from sklearn.tree._tree import Tree, TREE_LEAF, TREE_UNDEFINED
+
+from predict import SEVERITY_MINIMUMS, PROFILE_FEATURES, DISTRICT_TABLE_PATH, load_district_profiles
+
+
+MODEL_PATH    = "disaster_model.pkl"
+ENCODERS_PATH = "disaster_encoders.pkl"
+COMPACT_PATH  = "disaster_model_compact.pkl"
+
+CATEGORICAL   = {"disaster_type_enc": "le_disaster_type",
+                 "severity_enc":      "le_severity",
+                 "season_enc":        "le_season"}
+DAMAGE_RANGE  = (1.0, 4.0)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 1: VALID INPUT DOMAIN
+# ─────────────────────────────────────────────────────────────────────────────
+
+class Domain:
+    """
+    The valid inputs that reach one node:
+      codes       : allowed codes of each categorical feature
+      households  : [low, high] whole numbers (high may be inf)
+      damage      : (low, high] on the float32 value
+      districts   : indices into the district tuples
+    """
+
+    def __init__(self, spec, codes, households, damage, districts):
+        self.spec       = spec
+        self.codes      = codes
+        self.households = households
+        self.damage     = damage
+        self.districts  = districts
+
+    @classmethod
+    def full(cls, spec):
+        codes = {f: frozenset(range(n)) for f, n in spec["categories"].items()}
+        return cls(spec, codes, (min(spec["minimums"].values()), np.inf),
+                   (-np.inf, np.inf), frozenset(range(len(spec["tuples"]))))
+
+    def split(self, f, t):
+        """(left, right) domains of the test x[f] <= t."""
+        spec = self.spec
+        if f in self.codes:
+            left  = {c for c in self.codes[f] if np.float32(c) <= t}
+            return (self._with(codes={**self.codes, f: frozenset(left)}),
+                    self._with(codes={**self.codes, f: self.codes[f] - left}))
+        if f == spec["households"]:
+            low, high = self.households
+            cut = np.floor(t)
+            return (self._with(households=(low, min(high, cut))),
+                    self._with(households=(max(low, cut + 1), high)))
+        if f == spec["damage"]:
+            low, high = self.damage
+            return (self._with(damage=(low, min(high, t))),
+                    self._with(damage=(max(low, t), high)))
+        column = spec["tuples"][:, spec["profile"].index(f)]
+        left   = {d for d in self.districts if column[d] <= t}
+        return (self._with(districts=frozenset(left)),
+                self._with(districts=self.districts - left))
+
+    def feasible(self):
+        spec = self.spec
+        if not self.districts or any(not codes for codes in self.codes.values()):
+            return False
+
+        # Households must clear the minimum of at least one allowed severity
+        floor = min(spec["minimums"][s] for s in self.codes[spec["severity"]])
+        low, high = self.households
+        if max(low, floor) > high:
+            return False
+
+        # Some float32 in [1, 4] must satisfy low < x <= high
+        low, high = self.damage
+        first = np.float32(DAMAGE_RANGE[0])
+        if first <= low:
+            first = np.float32(low)
+            if first <= low:
+                first = np.nextafter(first, np.float32(np.inf))
+        return float(first) <= min(high, DAMAGE_RANGE[1])
+
+    def _with(self, **changes):
+        fields = {"codes": self.codes, "households": self.households,
+                  "damage": self.damage, "districts": self.districts, **changes}
+        return Domain(self.spec, **fields)
+
+
+def domain_spec(encoders, profiles=None):
+    columns  = encoders["feature_columns"]
+    severity = list(encoders["le_severity"].classes_)
+    profiles = profiles or load_district_profiles()
+    return {
+        "categories": {columns.index(name): len(encoders[key].classes_) for name, key in CATEGORICAL.items()},
+        "severity":   columns.index("severity_enc"),
+        "minimums":   {severity.index(name): minimum for name, minimum in SEVERITY_MINIMUMS.items()},
+        "households": columns.index("num_households"),
+        "damage":     columns.index("avg_damage_level"),
+        "profile":    [columns.index(name) for name in PROFILE_FEATURES],
+        "districts":  list(profiles),
+        "tuples":     np.array([[p[name] for name in PROFILE_FEATURES] for p in profiles.values()],
+                               dtype=np.float32),
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 2: COMPACTION
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _compact(tree, node, domain, counts):
+    """Returns the compacted subtree as ("leaf", node, value) or ("split", node, left, right)."""
+    left, right = tree.children_left[node], tree.children_right[node]
+    if left == TREE_LEAF:
+        return ("leaf", node, float(tree.value[node].ravel()[0]))
+
+    left_domain, right_domain = domain.split(int(tree.feature[node]), float(tree.threshold[node]))
+    if not left_domain.feasible():
+        counts["unreachable"] += 1
+        return _compact(tree, right, right_domain, counts)
+    if not right_domain.feasible():
+        counts["unreachable"] += 1
+        return _compact(tree, left, left_domain, counts)
+
+    a = _compact(tree, left, left_domain, counts)
+    b = _compact(tree, right, right_domain, counts)
+    if a[0] == "leaf" and b[0] == "leaf" and a[2] == b[2]:
+        counts["collapsed"] += 1
+        return ("leaf", node, a[2])
+    return ("split", node, a, b)
+
+
+def _to_model(model, root):
+    """Writes the compacted subtree into a new DecisionTreeRegressor, breadth-first."""
+    source = model.tree_.__getstate__()
+    order  = [root]
+    for item in order:
+        if item[0] == "split":
+            order.extend(item[2:])
+    ids    = {id(item): i for i, item in enumerate(order)}
+
+    nodes  = np.zeros(len(order), dtype=source["nodes"].dtype)
+    values = np.zeros((len(order),) + source["values"].shape[1:], dtype=source["values"].dtype)
+    depth  = {id(root): 0}
+    for i, item in enumerate(order):
+        nodes[i]  = source["nodes"][item[1]]
+        values[i] = source["values"][item[1]]
+        if item[0] == "leaf":
+            nodes[i]["left_child"]  = TREE_LEAF
+            nodes[i]["right_child"] = TREE_LEAF
+            nodes[i]["feature"]     = TREE_UNDEFINED
+            nodes[i]["threshold"]   = TREE_UNDEFINED
+            values[i]               = item[2]
+        else:
+            nodes[i]["left_child"]  = ids[id(item[2])]
+            nodes[i]["right_child"] = ids[id(item[3])]
+            depth[id(item[2])] = depth[id(item[3])] = depth[id(item)] + 1
+
+    tree = Tree(model.n_features_in_, np.array([1], dtype=np.intp), 1)
+    tree.__setstate__({"max_depth": max(depth.values()), "node_count": len(order),
+                       "nodes": nodes, "values": values})
+    compact       = pickle.loads(pickle.dumps(model))
+    compact.tree_ = tree
+    return compact
+
+
+def compact_tree(model, encoders, profiles=None):
+    spec   = domain_spec(encoders, profiles)
+    counts = {"unreachable": 0, "collapsed": 0}
+    root   = _compact(model.tree_, 0, Domain.full(spec), counts)
+    return _to_model(model, root), counts
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 3: EQUIVALENCE ON THE VALID DOMAIN
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _thresholds(model, feature):
+    tree = model.tree_
+    return np.unique(tree.threshold[(tree.feature == feature) & (tree.children_left != TREE_LEAF)])
+
+
+def domain_grid(model, encoders, profiles=None):
+    """One input in every cell the tree's thresholds cut the valid domain into."""
+    spec = domain_spec(encoders, profiles)
+
+    cuts = np.floor(_thresholds(model, spec["households"]))
+    households = np.unique(np.concatenate([cuts, cuts + 1, list(spec["minimums"].values())]))
+
+    cuts   = _thresholds(model, spec["damage"]).astype(np.float64)
+    at     = cuts.astype(np.float32)
+    at     = np.where(at > cuts, np.nextafter(at, np.float32(-np.inf)), at)     # largest float32 <= t
+    above  = np.nextafter(at, np.float32(np.inf))                               # smallest float32 > t
+    damage = np.unique(np.clip(np.concatenate([at, above, DAMAGE_RANGE]), *DAMAGE_RANGE).astype(np.float32))
+
+    blocks = []
+    sizes  = [spec["categories"][f] for f in sorted(spec["categories"])]
+    for codes in product(*(range(n) for n in sizes)):
+        minimum = spec["minimums"][codes[sorted(spec["categories"]).index(spec["severity"])]]
+        valid   = households[households >= minimum]
+        h, d, t = np.meshgrid(valid, damage, np.arange(len(spec["tuples"])), indexing="ij")
+        block   = np.empty((h.size, model.n_features_in_), dtype=np.float32)
+        for f, code in zip(sorted(spec["categories"]), codes):
+            block[:, f] = code
+        block[:, spec["households"]] = h.ravel()
+        block[:, spec["damage"]]     = d.ravel()
+        block[:, spec["profile"]]    = spec["tuples"][t.ravel()]
+        blocks.append(block)
+    return np.vstack(blocks)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 4: REPORT
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _per_row_us(model, X, single=2000):
+    start = time.perf_counter()
+    for _ in range(5):
+        model.predict(X)
+    batch = (time.perf_counter() - start) / 5 / len(X) * 1e6
+    start = time.perf_counter()
+    for row in X[:single]:
+        model.predict(row[None, :])
+    one = (time.perf_counter() - start) / single * 1e6
+    return batch, one
+
+
+def run(model_path=MODEL_PATH, encoders_path=ENCODERS_PATH, out_path=COMPACT_PATH,
+        district_table=DISTRICT_TABLE_PATH):
+    with open(model_path, "rb") as f:
+        model = pickle.load(f)
+    with open(encoders_path, "rb") as f:
+        encoders = pickle.load(f)
+    profiles = load_district_profiles(district_table)
+
+    start           = time.perf_counter()
+    compact, counts = compact_tree(model, encoders, profiles)
+    took            = time.perf_counter() - start
+
+    X        = domain_grid(model, encoders, profiles)
+    before   = model.predict(X)
+    after    = compact.predict(X)
+    mismatch = int((before != after).sum())
+
+    print("=" * 62)
+    print("TREE COMPACTION")
+    print("=" * 62)
+    print(f"\n  Splits removed as unreachable : {counts['unreachable']}")
+    print(f"  Subtrees collapsed            : {counts['collapsed']}")
+    print(f"  Compaction time               : {took * 1000:.1f} ms\n")
+    print(f"  {'':<22} {'before':>10} {'after':>10}")
+    print(f"  {'Nodes':<22} {model.tree_.node_count:>10} {compact.tree_.node_count:>10}")
+    print(f"  {'Leaves':<22} {model.get_n_leaves():>10} {compact.get_n_leaves():>10}")
+    print(f"  {'Depth':<22} {model.get_depth():>10} {compact.get_depth():>10}")
+
+    rng    = np.random.default_rng(0)
+    sample = X[rng.integers(0, len(X), 200_000)]
+    b_batch, b_one = _per_row_us(model, sample)
+    a_batch, a_one = _per_row_us(compact, sample)
+    print(f"  {'µs/row (batch)':<22} {b_batch:>10.3f} {a_batch:>10.3f}")
+    print(f"  {'µs/request (1 row)':<22} {b_one:>10.1f} {a_one:>10.1f}")
+
+    print(f"\n  Equivalence grid : {len(X):,} inputs covering every cell of the valid domain")
+    print(f"  Districts        : {len(profiles)} profile tuples "
+          f"({district_table if os.path.exists(district_table) else 'DISTRICT_PROFILES defaults'})")
+    print(f"  Mismatches       : {mismatch}")
+    if mismatch:
+        print("  Result           : FAIL — compacted model not written\n")
+        return 1
+
+    with open(out_path, "wb") as f:
+        pickle.dump(compact, f)
+    print(f"  Result           : PASS — saved {out_path}\n")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact the funding model's Decision Tree")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--encoders", default=ENCODERS_PATH)
+    parser.add_argument("--out", default=COMPACT_PATH)
+    parser.add_argument("--district-table", default=DISTRICT_TABLE_PATH,
+                        help="Published district table whose profiles bound the domain")
+    args = parser.parse_args(argv)
+    return run(args.model, args.encoders, args.out, args.district_table)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,474 @@
+"""
+tree_explanations.py
+====================
+Leaf-indexed explanations for the funding model's predictions.
+Lesotho Disaster Management Authority.
+
+For every leaf of the deployed tree the path from the root is reduced to
+one condition per feature: repeated threshold tests on the same feature
+are merged into a single interval (the tightest "> t" and "<= t" seen on
+the path), and categorical codes are turned back into their labels. The
+sentence for each leaf is formatted once, at training time, and stored in
+disaster_explanations.json indexed by node id.
+
+At prediction time an explanation is one model.apply() and a list index,
+and the estimate is read from the same leaf, so explaining costs nothing
+over predicting. Works for single rows and batches alike.
+
+The table carries a fingerprint of the tree. If the deployed model no
+longer matches it (e.g. a model_refresh.py run without a retrain of the
+table), load_explanations() rebuilds it in memory from the loaded model.
+
+A ShardedModel (sharded_model.py) gets one leaf table per shard tree plus
+one for the global fallback; rows are routed exactly as in its predict(),
+and shard texts name the shard's disaster type and severity, which the
+shard tree itself never tests.
+
+Usage:
+  python tree_explanations.py build              # rewrite the table for disaster_model.pkl
+  python tree_explanations.py build --model disaster_model_sharded.pkl
+                                                 # → disaster_model_sharded_explanations.json
+  python tree_explanations.py show --limit 10
+  python tree_explanations.py verify             # merged rules select the same leaf as the tree
+  python tree_explanations.py verify --model disaster_model_sharded.pkl
+  python tree_explanations.py benchmark          # leaf lookup vs decision_path + formatting
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import argparse
+
+import numpy as np
+
+
+EXPLANATIONS_PATH = "disaster_explanations.json"
+MODEL_PATH        = "disaster_model.pkl"
+ENCODERS_PATH     = "disaster_encoders.pkl"
+
+CATEGORICAL = {"disaster_type_enc": ("le_disaster_type", "disaster type"),
+               "severity_enc":      ("le_severity",      "severity"),
+               "season_enc":        ("le_season",        "season")}
+
+# label, value format, whole numbers only
+NUMERIC = {
+    "num_households":     ("households",           "{:,.0f}",  True),
+    "avg_damage_level":   ("average damage level", "{:.2f}",   False),
+    "pct_elderly":        ("elderly share",        "{:.1%}",   False),
+    "pct_children_u5":    ("under-5 share",        "{:.1%}",   False),
+    "pct_disabled":       ("disabled share",       "{:.1%}",   False),
+    "avg_household_size": ("household size",       "{:.2f}",   False),
+}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 1: PATH SIMPLIFICATION
+# ─────────────────────────────────────────────────────────────────────────────
+
+def is_sharded(model):
+    """A ShardedModel, checked by shape to keep sharded_model out of the imports."""
+    return not hasattr(model, "tree_") and hasattr(model, "shard_models")
+
+
+def tree_fingerprint(model):
+    """Digest of the tree's structure and leaf values; for a ShardedModel, of its routing and every tree."""
+    h = hashlib.sha256()
+    if is_sharded(model):
+        h.update(json.dumps([model.shard_by, list(model.shard_columns),
+                             list(model.cardinalities)]).encode())
+        for key, tree_model in [("global", model.global_model)] + sorted(model.shard_models.items()):
+            h.update(f"{key}:{tree_fingerprint(tree_model)}".encode())
+        return h.hexdigest()
+    tree = model.tree_
+    for array in (tree.children_left, tree.children_right, tree.feature,
+                  tree.threshold, tree.value, tree.weighted_n_node_samples):
+        h.update(np.ascontiguousarray(array).tobytes())
+    return h.hexdigest()
+
+
+def leaf_bounds(model):
+    """
+    {leaf id: {feature index: [low, high]}} meaning low < x <= high, with
+    every test on the same feature along the path merged into one interval.
+    """
+    tree   = model.tree_
+    leaves = {}
+    stack  = [(0, {})]
+    while stack:
+        node, bounds = stack.pop()
+        left, right  = tree.children_left[node], tree.children_right[node]
+        if left == right:
+            leaves[node] = bounds
+            continue
+        f, t = int(tree.feature[node]), float(tree.threshold[node])
+        low, high = bounds.get(f, (-np.inf, np.inf))
+        stack.append((left,  {**bounds, f: (low, min(high, t))}))
+        stack.append((right, {**bounds, f: (max(low, t), high)}))
+    return leaves
+
+
+def _condition(name, low, high, encoders):
+    if name in CATEGORICAL:
+        encoder_key, label = CATEGORICAL[name]
+        classes = list(encoders[encoder_key].classes_)
+        chosen  = [c for code, c in enumerate(classes) if low < code <= high]
+        if len(chosen) == len(classes):
+            return None
+        return f"{label} {' or '.join(chosen)}"
+
+    label, fmt, whole = NUMERIC.get(name, (name, "{:.3g}", False))
+    if whole:
+        # x > 200.5 on a count means at least 201; x <= 450.5 means at most 450
+        first = int(np.floor(low)) + 1 if np.isfinite(low) else None
+        last  = int(np.floor(high)) if np.isfinite(high) else None
+        if first is not None and last is not None:
+            return f"{fmt.format(first)}–{fmt.format(last)} {label}"
+        if first is not None:
+            return f"at least {fmt.format(first)} {label}"
+        return f"at most {fmt.format(last)} {label}"
+
+    if np.isfinite(low) and np.isfinite(high):
+        return f"{label} over {fmt.format(low)} and up to {fmt.format(high)}"
+    if np.isfinite(low):
+        return f"{label} over {fmt.format(low)}"
+    return f"{label} up to {fmt.format(high)}"
+
+
+def _leaf_table(model, encoders, given=()):
+    """Entry i is None for split nodes; given conditions open every text."""
+    tree            = model.tree_
+    feature_columns = encoders["feature_columns"]
+    leaves          = [None] * tree.node_count
+
+    for node, bounds in leaf_bounds(model).items():
+        conditions = list(given)
+        for f in sorted(bounds):
+            text = _condition(feature_columns[f], *bounds[f], encoders)
+            if text:
+                conditions.append(text)
+        samples = int(round(tree.weighted_n_node_samples[node]))
+        value   = max(0.0, float(tree.value[node].ravel()[0]))
+        leaves[node] = {
+            "value":      value,
+            "samples":    samples,
+            "bounds":     {feature_columns[f]: [low, high] for f, (low, high) in bounds.items()},
+            "conditions": conditions,
+            "text":       (f"Average of {samples:,} comparable past events with "
+                           + ("; ".join(conditions) or "any inputs") + "."),
+        }
+    return leaves
+
+
+def _shard_conditions(model, key, encoders):
+    codes = np.unravel_index(key, model.cardinalities)
+    names = [encoders["feature_columns"][c] for c in model.shard_columns]
+    texts = [_condition(name, code - 1, code, encoders) for name, code in zip(names, codes)]
+    return [text for text in texts if text]
+
+
+def build_explanations(model, encoders):
+    """Leaf-indexed table; a ShardedModel gets one per shard tree, keyed by shard."""
+    table = {
+        "fingerprint":     tree_fingerprint(model),
+        "feature_columns": encoders["feature_columns"],
+    }
+    if is_sharded(model):
+        table["global"] = _leaf_table(model.global_model, encoders)
+        table["shards"] = {
+            str(key): _leaf_table(tree_model, encoders, _shard_conditions(model, key, encoders))
+            for key, tree_model in model.shard_models.items()
+        }
+    else:
+        table["leaves"] = _leaf_table(model, encoders)
+    return table
+
+
+def leaf_tables(model, table):
+    """(name, tree, leaves) for every tree the table explains."""
+    if "shards" not in table:
+        return [("tree", model, table["leaves"])]
+    return [("global", model.global_model, table["global"])] + [
+        (key, model.shard_models[int(key)], leaves) for key, leaves in table["shards"].items()
+    ]
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 2: TABLE I/O AND LOOKUP
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _finite(value):
+    return value if np.isfinite(value) else None
+
+
+def _finite_leaves(leaves):
+    return [
+        None if leaf is None else
+        {**leaf, "bounds": {k: [_finite(lo), _finite(hi)] for k, (lo, hi) in leaf["bounds"].items()}}
+        for leaf in leaves
+    ]
+
+
+def save_explanations(table, path=EXPLANATIONS_PATH):
+    # JSON has no infinity; open interval ends are stored as null
+    plain = dict(table)
+    if "shards" in table:
+        plain["global"] = _finite_leaves(table["global"])
+        plain["shards"] = {key: _finite_leaves(leaves) for key, leaves in table["shards"].items()}
+    else:
+        plain["leaves"] = _finite_leaves(table["leaves"])
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(plain, f)
+    os.replace(tmp, path)
+
+
+def explanations_path(model_path=MODEL_PATH):
+    """The table that goes with a model file: disaster_model.pkl keeps EXPLANATIONS_PATH."""
+    if os.path.normpath(model_path) == os.path.normpath(MODEL_PATH):
+        return EXPLANATIONS_PATH
+    return os.path.splitext(model_path)[0] + "_explanations.json"
+
+
+def load_explanations(model, encoders, path=EXPLANATIONS_PATH):
+    """The saved table if it matches model, else one rebuilt from model."""
+    if os.path.exists(path):
+        with open(path) as f:
+            table = json.load(f)
+        if table.get("fingerprint") == tree_fingerprint(model):
+            return table
+    return build_explanations(model, encoders)
+
+
+def _explain_tree(model, leaf_table, X):
+    leaves = model.apply(X)
+    texts  = [leaf_table[leaf]["text"] for leaf in leaves]
+    values = np.maximum(model.tree_.value[leaves, 0, 0], 0.0)
+    return values, texts
+
+
+def predict_explained(model, table, X):
+    """Estimates and explanation texts for every row of X."""
+    X = np.asarray(X, dtype=np.float32)
+    if "shards" not in table:
+        return _explain_tree(model, table["leaves"], X)
+
+    # Same grouping as ShardedModel.predict: one apply() per shard per batch
+    keys   = model.shard_keys(X)
+    values = np.empty(len(X), dtype=np.float64)
+    texts  = [None] * len(X)
+    for key in np.unique(keys):
+        rows = np.flatnonzero(keys == key)
+        if int(key) in model.shard_models:
+            tree_model, leaf_table = model.shard_models[int(key)], table["shards"][str(key)]
+        else:
+            tree_model, leaf_table = model.global_model, table["global"]
+        values[rows], shard_texts = _explain_tree(tree_model, leaf_table, X[rows])
+        for row, text in zip(rows, shard_texts):
+            texts[row] = text
+    return values, texts
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# SECTION 3: VERIFICATION AND BENCHMARK
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _load_deployed(model_path=MODEL_PATH):
+    with open(model_path, "rb") as f:
+        model = pickle.load(f)
+    with open(ENCODERS_PATH, "rb") as f:
+        encoders = pickle.load(f)
+    return model, encoders
+
+
+def _sample_rows(encoders, n, seed=0):
+    from disaster_funding_model import encode_features
+    import pandas as pd
+    df  = pd.read_csv("disaster_dataset.csv")
+    X   = encode_features(df, encoders)
+    rng = np.random.default_rng(seed)
+    # Training rows plus uniform noise across each feature's range
+    lo, hi = X.min(axis=0), X.max(axis=0)
+    noise  = rng.uniform(lo - 0.1 * (hi - lo), hi + 0.1 * (hi - lo), size=(n, X.shape[1]))
+    noise[:, :3] = rng.integers(0, [len(encoders[CATEGORICAL[c][0]].classes_)
+                                    for c in encoders["feature_columns"][:3]], size=(n, 3))
+    return np.vstack([X, noise])
+
+
+def _routed_rows(model, name, X):
+    """Rows of X the tree called name answers for."""
+    if not is_sharded(model):
+        return np.arange(len(X))
+    keys = model.shard_keys(X)
+    if name == "global":
+        return np.flatnonzero(~np.isin(keys, list(model.shard_models)))
+    return np.flatnonzero(keys == int(name))
+
+
+def verify(model, encoders, rows=50_000, title="deployed model"):
+    """
+    Every row satisfies exactly the merged bounds of the leaf its tree sends
+    it to, and predict_explained() returns model.predict() (floored at 0).
+    """
+    table      = build_explanations(model, encoders)
+    X32        = _sample_rows(encoders, rows).astype(np.float32)
+    trees      = leaf_tables(model, table)
+    mismatched = 0
+
+    for name, tree_model, leaf_table in trees:
+        X = X32[_routed_rows(model, name, X32)]
+        if not len(X):
+            continue
+        leaves = tree_model.apply(X)
+        owner  = np.full(len(X), -1)
+        for node, leaf in enumerate(leaf_table):
+            if leaf is None:
+                continue
+            inside = np.ones(len(X), dtype=bool)
+            for feature, (low, high) in leaf["bounds"].items():
+                column  = X[:, table["feature_columns"].index(feature)]
+                inside &= (column > low) & (column <= high)
+            if (owner[inside] != -1).any():
+                raise AssertionError(f"leaf {node} of {name} overlaps another leaf")
+            owner[inside] = node
+        mismatched += int((owner != leaves).sum())
+
+    values, texts = predict_explained(model, table, X32)
+    misses = int((~np.isclose(values, np.maximum(model.predict(X32), 0.0))).sum())
+    passed = mismatched == 0 and misses == 0 and all(texts)
+
+    print("=" * 62)
+    print(f"EXPLANATION TABLE VERIFICATION — {title}")
+    print("=" * 62)
+    print(f"\n  Trees            : {len(trees)}")
+    print(f"  Leaves           : {sum(leaf is not None for _, _, leaves in trees for leaf in leaves)}")
+    print(f"  Rows checked     : {len(X32):,}")
+    print(f"  Rule/leaf misses : {mismatched}")
+    print(f"  Estimate misses  : {misses}")
+    print(f"  Example          : {texts[0]}")
+    print(f"  Result           : {'PASS' if passed else 'FAIL'}\n")
+    return passed
+
+
+def _sharded_for_verify(encoders, workers=None):
+    """A ShardedModel trained on disaster_dataset.csv, so verify covers the sharded path."""
+    from disaster_funding_model import encode_features
+    from sharded_model import train_sharded
+    import pandas as pd
+    df = pd.read_csv("disaster_dataset.csv")
+    model, _, _ = train_sharded(encode_features(df, encoders), df["total_funding"].values,
+                                encoders, workers=workers)
+    return model
+
+
+def _explain_by_path(model, encoders, X):
+    """What the table replaces: decision_path and formatting per request."""
+    feature_columns = encoders["feature_columns"]
+    tree  = model.tree_
+    paths = model.decision_path(X)
+    texts = []
+    for i in range(len(X)):
+        bounds = {}
+        for node in paths.indices[paths.indptr[i]:paths.indptr[i + 1]]:
+            if tree.children_left[node] == tree.children_right[node]:
+                continue
+            f, t = tree.feature[node], tree.threshold[node]
+            low, high = bounds.get(f, (-np.inf, np.inf))
+            bounds[f] = (low, min(high, t)) if X[i, f] <= t else (max(low, t), high)
+        conditions = [c for c in (_condition(feature_columns[f], *bounds[f], encoders)
+                                  for f in sorted(bounds)) if c]
+        texts.append("; ".join(conditions))
+    return texts
+
+
+def run_benchmark(model, encoders, rows=20_000, path=EXPLANATIONS_PATH):
+    X     = _sample_rows(encoders, rows).astype(np.float32)
+    table = load_explanations(model, encoders, path)
+
+    start = time.perf_counter()
+    predict_explained(model, table, X)
+    batch = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for row in X[:1000]:
+        predict_explained(model, table, row[None, :])
+    single = (time.perf_counter() - start) / 1000
+
+    start = time.perf_counter()
+    for row in X[:1000]:
+        model.predict(row[None, :])
+    bare_single = (time.perf_counter() - start) / 1000
+
+    # decision_path needs a single tree
+    by_path = None
+    if not is_sharded(model):
+        start = time.perf_counter()
+        _explain_by_path(model, encoders, X)
+        by_path = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.predict(X)
+    bare = time.perf_counter() - start
+
+    print("=" * 62)
+    print("EXPLANATION BENCHMARK")
+    print("=" * 62)
+    print(f"\n  Rows                          : {len(X):,}")
+    print(f"  predict() only                : {bare * 1e6 / len(X):8.2f} µs/row")
+    print(f"  Leaf lookup (batch)           : {batch * 1e6 / len(X):8.2f} µs/row, estimate included")
+    print(f"  predict() one row a call      : {bare_single * 1e6:8.2f} µs/request")
+    print(f"  Leaf lookup (one row a call)  : {single * 1e6:8.2f} µs/request")
+    if by_path is not None:
+        print(f"  decision_path + formatting    : {by_path * 1e6 / len(X):8.2f} µs/row")
+    print()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# COMMAND LINE
+# ─────────────────────────────────────────────────────────────────────────────
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Leaf-indexed prediction explanations")
+    sub    = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("build")
+    p.add_argument("--out", default=None,
+                   help="Table path (default: derived from --model)")
+    p = sub.add_parser("show")
+    p.add_argument("--limit", type=int, default=10)
+    p = sub.add_parser("verify")
+    p.add_argument("--rows", type=int, default=50_000)
+    p = sub.add_parser("benchmark")
+    p.add_argument("--rows", type=int, default=20_000)
+    for p in sub.choices.values():
+        p.add_argument("--model", default=MODEL_PATH)
+    args = parser.parse_args(argv)
+
+    model, encoders = _load_deployed(args.model)
+    path            = getattr(args, "out", None) or explanations_path(args.model)
+
+    if args.command == "build":
+        table = build_explanations(model, encoders)
+        save_explanations(table, path)
+        count = sum(leaf is not None for _, _, leaves in leaf_tables(model, table) for leaf in leaves)
+        print(f"Saved {path} — {count} leaf explanations")
+    elif args.command == "show":
+        table  = load_explanations(model, encoders, path)
+        leaves = [(i, leaf) for _, _, leaf_table in leaf_tables(model, table)
+                  for i, leaf in enumerate(leaf_table) if leaf is not None]
+        for node, leaf in sorted(leaves, key=lambda item: -item[1]["samples"])[:args.limit]:
+            print(f"  leaf {node:>4}  LSL {leaf['value']:>12,.0f}  {leaf['text']}")
+    elif args.command == "verify":
+        passed = verify(model, encoders, args.rows, args.model)
+        if not is_sharded(model):
+            # The sharded predictor deploys as disaster_model.pkl too
+            passed &= verify(_sharded_for_verify(encoders), encoders, args.rows, "sharded model")
+        return 0 if passed else 1
+    else:
+        run_benchmark(model, encoders, args.rows, path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())